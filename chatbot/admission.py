@@ -0,0 +1,330 @@
+# chatbot/admission.py
+"""
+Admission control for chat turns.
+
+Each kind of turn has its own lane: "predict" turns run the model, "entry"
+turns only parse a value and write history. A lane admits up to `limit`
+turns at once and lets up to `queue_size` more wait, each for at most
+`timeout` seconds. Past that a turn is rejected straight away (503 with
+Retry-After) instead of piling up until every request times out.
+
+Fairness between sessions:
+- a session may have at most `per_session` turns admitted or waiting
+  (more are rejected with 429);
+- a waiting turn is only admitted while its session has nothing running
+  (its turns take turns on the session lock anyway), and free slots go to
+  waiting sessions round-robin, so one busy client can't starve the rest.
+
+AdmissionMiddleware applies this to the WSGI app, ahead of session loading
+and everything else Flask does per request, so a rejected turn costs next
+to nothing and an admitted one holds its slot for all of its work. Limits
+apply per process: each serve.py worker admits on its own.
+"""
+import io
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# "0" admits everything
+ADMISSION_ENABLED = os.environ.get("CHATBOT_ADMISSION", "1") != "0"
+PREDICT_LIMIT = int(os.environ.get("CHATBOT_ADMISSION_PREDICT_LIMIT", "4"))
+PREDICT_QUEUE = int(os.environ.get("CHATBOT_ADMISSION_PREDICT_QUEUE", "32"))
+ENTRY_LIMIT = int(os.environ.get("CHATBOT_ADMISSION_ENTRY_LIMIT", "16"))
+ENTRY_QUEUE = int(os.environ.get("CHATBOT_ADMISSION_ENTRY_QUEUE", "64"))
+# Longest a turn waits for a slot before it is rejected
+QUEUE_TIMEOUT = float(os.environ.get("CHATBOT_ADMISSION_TIMEOUT", "2.0"))
+# Turns one session may have admitted or waiting at once
+PER_SESSION = int(os.environ.get("CHATBOT_ADMISSION_PER_SESSION", "2"))
+
+# Request bodies up to this size are parsed to pick the lane
+_MAX_BODY_BYTES = 64 * 1024
+
+# Bounds of the Retry-After hint, in seconds
+_MIN_RETRY_AFTER = 1
+_MAX_RETRY_AFTER = 30
+
+
+class AdmissionRejected(Exception):
+    """A turn was not admitted; `status` and `retry_after` make up the HTTP answer"""
+
+    def __init__(self, lane, reason, status, retry_after):
+        super().__init__(f"{lane} turn rejected: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("session_id", "granted")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.granted = False
+
+
+class _Lane:
+    def __init__(self, name, limit, queue_size):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.active = 0
+        self.waiting = OrderedDict()  # session_id -> deque of tickets, in round-robin order
+        self.queued = 0
+
+        # Metrics
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "session_limit": 0, "timeout": 0}
+        self.max_queued = 0
+        self.waits = deque(maxlen=1000)
+        self.service_seconds = 0.05  # moving average of a turn's run time
+
+    def retry_after(self):
+        """Seconds until the queue ahead has likely drained"""
+        estimate = self.service_seconds * (self.queued + 1) / self.limit
+        return int(min(_MAX_RETRY_AFTER, max(_MIN_RETRY_AFTER, math.ceil(estimate))))
+
+
+class AdmissionController:
+    """Bounded admission with one lane per kind of turn (see module docstring)"""
+
+    def __init__(self, lanes, timeout=QUEUE_TIMEOUT, per_session=PER_SESSION):
+        # lanes: {name: (limit, queue_size)}
+        self.lanes = {name: _Lane(name, limit, queue) for name, (limit, queue) in lanes.items()}
+        self.timeout = max(0.0, timeout)
+        self.per_session = max(1, per_session)
+        self._cond = threading.Condition()
+        self._running = {}  # session_id -> admitted turns
+        self._holding = {}  # session_id -> admitted + waiting turns
+
+    def _reject(self, lane, reason, status):
+        lane.rejected[reason] += 1
+        return AdmissionRejected(lane.name, reason, status, lane.retry_after())
+
+    def _grant(self, lane, session_id):
+        lane.active += 1
+        lane.admitted += 1
+        self._running[session_id] = self._running.get(session_id, 0) + 1
+
+    def _dispatch(self):
+        """Hand free slots to waiting sessions round-robin (lock held)"""
+        granted = False
+        for lane in self.lanes.values():
+            while lane.active < lane.limit and lane.waiting:
+                session_id = next((s for s in lane.waiting if not self._running.get(s)), None)
+                if session_id is None:
+                    break
+                tickets = lane.waiting.pop(session_id)
+                ticket = tickets.popleft()
+                if tickets:
+                    lane.waiting[session_id] = tickets  # back of the rotation
+                lane.queued -= 1
+                ticket.granted = True
+                self._grant(lane, session_id)
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, lane_name, session_id):
+        """Wait for a slot in the lane; raises AdmissionRejected"""
+        lane = self.lanes[lane_name]
+        started = time.perf_counter()
+        with self._cond:
+            if self._holding.get(session_id, 0) >= self.per_session:
+                raise self._reject(lane, "session_limit", 429)
+
+            if lane.active < lane.limit and not lane.waiting and not self._running.get(session_id):
+                self._grant(lane, session_id)
+            else:
+                if lane.queued >= lane.queue_size:
+                    raise self._reject(lane, "queue_full", 503)
+                ticket = _Ticket(session_id)
+                lane.waiting.setdefault(session_id, deque()).append(ticket)
+                lane.queued += 1
+                lane.max_queued = max(lane.max_queued, lane.queued)
+                self._holding[session_id] = self._holding.get(session_id, 0) + 1
+                # A slot may be free with only blocked sessions ahead
+                self._dispatch()
+                deadline = started + self.timeout
+                while not ticket.granted:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._holding[session_id] -= 1
+                if not ticket.granted:
+                    tickets = lane.waiting[session_id]
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del lane.waiting[session_id]
+                    lane.queued -= 1
+                    self._forget(session_id)
+                    raise self._reject(lane, "timeout", 503)
+
+            self._holding[session_id] = self._holding.get(session_id, 0) + 1
+            lane.waits.append(time.perf_counter() - started)
+
+    def _forget(self, session_id):
+        if not self._holding.get(session_id):
+            self._holding.pop(session_id, None)
+        if not self._running.get(session_id):
+            self._running.pop(session_id, None)
+
+    def release(self, lane_name, session_id, seconds=None):
+        """Give back a slot taken by acquire()"""
+        lane = self.lanes[lane_name]
+        with self._cond:
+            lane.active -= 1
+            self._running[session_id] -= 1
+            self._holding[session_id] -= 1
+            self._forget(session_id)
+            # It has just been served: its next turn goes behind the others
+            if session_id in lane.waiting:
+                lane.waiting.move_to_end(session_id)
+            if seconds is not None:
+                lane.service_seconds = 0.8 * lane.service_seconds + 0.2 * seconds
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, lane_name, session_id):
+        """Hold a slot in the lane for the duration of the block"""
+        self.acquire(lane_name, session_id)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(lane_name, session_id, time.perf_counter() - started)
+
+    def stats(self):
+        """Per-lane load and rejection counters"""
+        with self._cond:
+            result = {}
+            for name, lane in self.lanes.items():
+                waits = sorted(lane.waits)
+                result[name] = {
+                    "limit": lane.limit,
+                    "active": lane.active,
+                    "queued": lane.queued,
+                    "queue_size": lane.queue_size,
+                    "max_queued": lane.max_queued,
+                    "waiting_sessions": len(lane.waiting),
+                    "admitted": lane.admitted,
+                    "rejected": dict(lane.rejected),
+                    "wait_ms": {
+                        "p50": waits[len(waits) // 2] * 1000.0 if waits else 0.0,
+                        "p99": waits[max(0, int(len(waits) * 0.99) - 1)] * 1000.0 if waits else 0.0,
+                    },
+                    "avg_service_ms": lane.service_seconds * 1000.0,
+                }
+            return {"enabled": ADMISSION_ENABLED, "timeout_seconds": self.timeout,
+                    "per_session": self.per_session, "lanes": result}
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission():
+    """The process-wide admission controller"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController({
+                    "predict": (PREDICT_LIMIT, PREDICT_QUEUE),
+                    "entry": (ENTRY_LIMIT, ENTRY_QUEUE),
+                })
+    return _controller
+
+
+class AdmissionMiddleware:
+    """
+    WSGI middleware admitting requests by lane.
+    lane_fn(path, json_body) names the lane of a POST (None: not controlled);
+    sessions are told apart by the session cookie (a request without one
+    counts as a session of its own).
+    """
+
+    def __init__(self, app, lane_fn, cookie_name="session"):
+        self.app = app
+        self.lane_fn = lane_fn
+        self.cookie_name = cookie_name
+
+    def _body(self, environ):
+        """JSON body of the request (put back for the app), or None"""
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return None
+        if length <= 0 or length > _MAX_BODY_BYTES:
+            return None
+        raw = environ["wsgi.input"].read(length)
+        environ["wsgi.input"] = io.BytesIO(raw)
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def _session_key(self, environ):
+        from werkzeug.http import parse_cookie
+        return parse_cookie(environ).get(self.cookie_name) or f"anonymous-{id(environ)}"
+
+    def __call__(self, environ, start_response):
+        if not ADMISSION_ENABLED or environ.get("REQUEST_METHOD") != "POST":
+            return self.app(environ, start_response)
+        lane = self.lane_fn(environ.get("PATH_INFO", ""), self._body(environ))
+        if lane is None:
+            return self.app(environ, start_response)
+
+        controller = get_admission()
+        session_key = self._session_key(environ)
+        try:
+            controller.acquire(lane, session_key)
+        except AdmissionRejected as e:
+            return _rejection(e, start_response)
+        started = time.perf_counter()
+        try:
+            iterable = self.app(environ, start_response)
+        except BaseException:
+            controller.release(lane, session_key, time.perf_counter() - started)
+            raise
+        # Held until the server has sent the response and closed it
+        return _AdmittedResponse(
+            iterable, lambda: controller.release(lane, session_key, time.perf_counter() - started))
+
+
+class _AdmittedResponse:
+    """The app's response iterable; close() closes it, then gives back the admission slot"""
+
+    def __init__(self, iterable, release):
+        self._iterable = iterable
+        self._release = release
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        release, self._release = self._release, None
+        try:
+            close = getattr(self._iterable, "close", None)
+            if close is not None:
+                close()
+        finally:
+            if release is not None:
+                release()
+
+
+def _rejection(error, start_response):
+    body = json.dumps({
+        "response": "⏳ I'm handling a lot of requests right now. Please try again in a moment.",
+        "error": error.reason,
+        "retry_after": error.retry_after,
+    }).encode("utf-8")
+    status = "429 Too Many Requests" if error.status == 429 else "503 Service Unavailable"
+    start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body))),
+                            ("Retry-After", str(error.retry_after))])
+    return [body]
@@ -0,0 +1,197 @@
+# chatbot/aggregate_cube.py
+import hashlib
+import os
+from itertools import combinations
+
+import numpy as np
+
+# Bump when the on-disk layout changes so stale cubes are rebuilt
+CUBE_FORMAT_VERSION = 1
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """sha256 of a file, used to key derived caches to their source"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CubeCell:
+    """Sufficient statistics for one combination of categorical filters"""
+
+    def __init__(self, cube, count, sums, sumsq, nvalid, value_counts):
+        self.cube = cube
+        self.count = int(count)
+        self.sums = sums
+        self.sumsq = sumsq
+        self.nvalid = nvalid
+        self.value_counts = value_counts
+
+    def column_means(self, columns):
+        """[(column, mean)] skipping NaNs"""
+        means = []
+        for col in columns:
+            i = self.cube.numeric_cols.index(col)
+            means.append((col, float(self.sums[i] / self.nvalid[i]) if self.nvalid[i] else float("nan")))
+        return means
+
+    def column_std(self, col):
+        """Population standard deviation of a numeric column within the cell"""
+        i = self.cube.numeric_cols.index(col)
+        if not self.nvalid[i]:
+            return float("nan")
+        mean = self.sums[i] / self.nvalid[i]
+        return float(np.sqrt(max(self.sumsq[i] / self.nvalid[i] - mean * mean, 0.0)))
+
+    def top_values(self, col, n=3):
+        """[(value, count)] of the n most frequent values of a categorical column"""
+        counts = self.value_counts[col]
+        labels = self.cube.labels[col]
+        order = np.argsort(-counts, kind="stable")[:n]
+        return [(labels[i], int(counts[i])) for i in order if counts[i] > 0]
+
+
+class AggregateCube:
+    """
+    Precomputed count / sum / sum-of-squares of every numeric column (Final_Bid
+    included) and value counts of every categorical column, for every subset
+    of categorical filters. A categorical-only query is a dictionary lookup.
+
+    The finest cells (one per combination of all categorical values) are
+    accumulated with np.bincount; each coarser subset is the finest table
+    summed over the dimensions it does not filter on.
+    """
+
+    def __init__(self, categorical_cols, numeric_cols, labels, folded, tables, source_checksum=None):
+        self.categorical_cols = categorical_cols
+        self.numeric_cols = numeric_cols
+        self.labels = labels
+        self.folded = folded
+        self.tables = tables
+        self.source_checksum = source_checksum
+
+    @classmethod
+    def build(cls, index, source_checksum=None):
+        """Build from a DatasetIndex"""
+        cat_cols = list(index.categorical_cols)
+        num_cols = list(index.numeric_cols)
+        n_rows = index.n_rows
+
+        # Case-folded code per row; the extra last bucket holds missing values
+        labels, folded, fine_codes, dims = {}, {}, [], []
+        for col in cat_cols:
+            labels[col] = list(index.labels(col))
+            folded_labels = []
+            for label in labels[col]:
+                if label.lower() not in folded_labels:
+                    folded_labels.append(label.lower())
+            folded[col] = {label: i for i, label in enumerate(folded_labels)}
+            to_folded = np.array([folded[col][label.lower()] for label in labels[col]] + [len(folded_labels)], dtype=np.int64)
+            fine_codes.append(to_folded[index.codes(col)])  # code -1 maps to the missing bucket
+            dims.append(len(folded_labels) + 1)
+
+        n_fine = int(np.prod(dims)) if dims else 1
+        cell = np.zeros(n_rows, dtype=np.int64)
+        for codes, dim in zip(fine_codes, dims):
+            cell = cell * dim + codes
+
+        count = np.bincount(cell, minlength=n_fine).astype(np.float64)
+        sums = np.empty((n_fine, len(num_cols)))
+        sumsq = np.empty((n_fine, len(num_cols)))
+        nvalid = np.empty((n_fine, len(num_cols)))
+        for j, col in enumerate(num_cols):
+            values = index.values(col)
+            valid = ~np.isnan(values)
+            clean = np.where(valid, values, 0.0)
+            sums[:, j] = np.bincount(cell, weights=clean, minlength=n_fine)
+            sumsq[:, j] = np.bincount(cell, weights=clean * clean, minlength=n_fine)
+            nvalid[:, j] = np.bincount(cell, weights=valid.astype(np.float64), minlength=n_fine)
+
+        value_counts = {}
+        for col in cat_cols:
+            codes = index.codes(col)
+            n_labels = max(len(labels[col]), 1)
+            present = codes >= 0
+            flat = np.bincount(cell[present] * n_labels + codes[present], minlength=n_fine * n_labels)
+            value_counts[col] = flat.reshape(n_fine, n_labels).astype(np.float64)
+
+        shape = tuple(dims)
+        fine = {
+            "count": count.reshape(shape),
+            "sums": sums.reshape(shape + (len(num_cols),)),
+            "sumsq": sumsq.reshape(shape + (len(num_cols),)),
+            "nvalid": nvalid.reshape(shape + (len(num_cols),)),
+        }
+        for col in cat_cols:
+            fine["vc:" + col] = value_counts[col].reshape(shape + (value_counts[col].shape[1],))
+
+        # Marginalize the finest table onto every subset of filter columns
+        tables = {}
+        for size in range(len(cat_cols) + 1):
+            for subset in combinations(range(len(cat_cols)), size):
+                drop = tuple(i for i in range(len(cat_cols)) if i not in subset)
+                tables[tuple(cat_cols[i] for i in subset)] = {
+                    name: (array.sum(axis=drop) if drop else array) for name, array in fine.items()
+                }
+
+        return cls(cat_cols, num_cols, labels, folded, tables, source_checksum)
+
+    def lookup(self, categorical):
+        """
+        Statistics for [(column, folded_value)] filters
+        Returns: CubeCell, or None when no row can match
+        """
+        wanted = dict(categorical)
+        subset = tuple(col for col in self.categorical_cols if col in wanted)
+        position = []
+        for col in subset:
+            code = self.folded[col].get(wanted[col])
+            if code is None:
+                return None
+            position.append(code)
+        position = tuple(position)
+
+        table = self.tables[subset]
+        count = table["count"][position]
+        if count == 0:
+            return None
+        return CubeCell(
+            self,
+            count,
+            table["sums"][position],
+            table["sumsq"][position],
+            table["nvalid"][position],
+            {col: table["vc:" + col][position] for col in self.categorical_cols},
+        )
+
+    def save(self, path):
+        # joblib is imported on use: file_checksum is needed at startup, joblib isn't
+        import joblib
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        joblib.dump({"version": CUBE_FORMAT_VERSION, "cube": self}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source_checksum=None):
+        """Load a persisted cube; None if missing, stale or unreadable"""
+        import joblib
+
+        if not os.path.exists(path):
+            return None
+        try:
+            payload = joblib.load(path)
+        except Exception as e:
+            print(f"[aggregate_cube] Failed to load cube: {e}")
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != CUBE_FORMAT_VERSION:
+            return None
+        cube = payload.get("cube")
+        if cube is None:
+            return None
+        if source_checksum is not None and cube.source_checksum != source_checksum:
+            return None
+        return cube
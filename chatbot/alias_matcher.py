@@ -0,0 +1,91 @@
+# chatbot/alias_matcher.py
+"""
+Variable mention detection over the alias tables of both chatbot flows.
+
+Aliases are compiled once into a single regular expression (an alternation
+ordered longest-first, anchored on word boundaries), so every mention in a
+message is found with its position in one left-to-right pass, however many
+aliases there are. Where matches overlap the leftmost wins, and among
+aliases starting at the same place the longest.
+"""
+import re
+
+# Union of the web flow (chatbot_logic) and CLI flow (main) alias tables;
+# covers every model feature name as well
+VARIABLE_ALIASES = {
+    "client_budget_min": "Client_Budget_Min",
+    "client budget min": "Client_Budget_Min",
+    "budget min": "Client_Budget_Min",
+    "min budget": "Client_Budget_Min",
+    "minimum budget": "Client_Budget_Min",
+    "client_budget_max": "Client_Budget_Max",
+    "client budget max": "Client_Budget_Max",
+    "budget max": "Client_Budget_Max",
+    "max budget": "Client_Budget_Max",
+    "maximum budget": "Client_Budget_Max",
+    "skills": "Skills_Required",
+    "skills_required": "Skills_Required",
+    "skill": "Skills_Required",
+    "avg_past_bids": "Avg_Past_Bids",
+    "average past bids": "Avg_Past_Bids",
+    "avg past bids": "Avg_Past_Bids",
+    "past bids": "Avg_Past_Bids",
+    "location": "Location",
+    "client_history": "Client_History",
+    "client history": "Client_History",
+    "history": "Client_History",
+    "freelancer_success_rate": "Freelancer_Success_Rate",
+    "success rate": "Freelancer_Success_Rate",
+    "success": "Freelancer_Success_Rate",
+    "duration": "Duration_Days",
+    "duration_days": "Duration_Days",
+    "days": "Duration_Days",
+    "urgency": "Urgency",
+    "freelancer_exp_years": "Freelancer_Exp_Years",
+    "experience": "Freelancer_Exp_Years",
+    "exp years": "Freelancer_Exp_Years",
+    "years": "Freelancer_Exp_Years",
+    "complexity": "Complexity",
+    "num_bidders": "Num_Bidders",
+    "bidders": "Num_Bidders",
+    "number of bidders": "Num_Bidders",
+    "bidders count": "Num_Bidders",
+}
+
+
+class AliasMatcher:
+    """
+    Matcher over {alias: value}; aliases match case-insensitively.
+    """
+
+    def __init__(self, aliases):
+        self.aliases = {str(k).lower(): v for k, v in aliases.items()}
+        alternation = "|".join(re.escape(a) for a in sorted(self.aliases, key=len, reverse=True))
+        self._pattern = re.compile(r'(?<![a-z0-9_])(?:' + alternation + r')(?![a-z0-9_])')
+
+    def find_all(self, text):
+        """Non-overlapping mentions as [(start, end, value, alias)] in text order"""
+        if not text:
+            return []
+        return [(m.start(), m.end(), self.aliases[m.group(0)], m.group(0))
+                for m in self._pattern.finditer(text.lower())]
+
+    def best(self, text):
+        """Value of the longest mention (earliest on ties), or None"""
+        mentions = self.find_all(text)
+        if not mentions:
+            return None
+        return max(mentions, key=lambda m: (m[1] - m[0], -m[0]))[2]
+
+
+_matchers = {}
+
+
+def get_matcher(aliases=None):
+    """Shared matcher for an alias table (built once per table)"""
+    aliases = VARIABLE_ALIASES if aliases is None else aliases
+    cached = _matchers.get(id(aliases))
+    if cached is None or cached[0] is not aliases:
+        cached = (aliases, AliasMatcher(aliases))
+        _matchers[id(aliases)] = cached
+    return cached[1]
@@ -4,7 +4,13 @@ import uuid
 from flask import Flask, render_template, request, jsonify, session
 from flask_session import Session
 from datetime import timedelta
-from chatbot_logic import handle_message, get_greeting_message
+from chatbot_logic import handle_message, handle_form, get_greeting_message, is_prediction_turn
+from ml_interface import (predict_many, find_comparables, get_inference_backend, get_prediction_cache_stats,
+                          get_readiness, start_warmup, start_model_watcher, get_model_version, get_model_stats)
+from inference_scheduler import get_scheduler
+from inference_executor import get_executor
+from admission import AdmissionMiddleware, get_admission
+from utils.history_manager import get_history_stats, session_lock, start_janitor
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
@@ -17,6 +23,37 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
 Session(app)
 
 
+def chat_lane(path, body):
+    """Admission lane of a request, or None for routes that aren't admission-controlled"""
+    if path == "/chat":
+        message = body.get("message") if isinstance(body, dict) else None
+        return "predict" if is_prediction_turn(message) else "entry"
+    if path == "/chat/form":
+        # A form may complete the inputs and predict
+        return "predict"
+    return None
+
+
+# Admit chat turns before the session is even loaded, so shedding load costs
+# next to nothing (see admission.py)
+app.wsgi_app = AdmissionMiddleware(app.wsgi_app, chat_lane, app.config.get("SESSION_COOKIE_NAME", "session"))
+
+# Upper bound on records accepted by /predict/batch in one request
+MAX_BATCH_SIZE = int(os.environ.get("CHATBOT_MAX_BATCH_SIZE", "1000"))
+
+# Upper bound on k for /comparables
+MAX_COMPARABLES = 50
+
+# Load the model and dataset in the background so the port is bound right
+# away, watch for new model versions, and expire / archive idle session
+# history (under serve.py the master loads before forking and the workers
+# start the watcher and the janitor instead)
+if os.environ.get("CHATBOT_PREFORK") != "1":
+    start_warmup()
+    start_model_watcher()
+    start_janitor()
+
+
 @app.route("/")
 def index():
     # Generate or get session ID
@@ -36,13 +73,16 @@ def chat():
         session_id = session.get('session_id', str(uuid.uuid4()))
         session['session_id'] = session_id
         
-        # Handle the message using chatbot logic
-        response_text, user_state, awaiting_variable = handle_message(user_message, session_id)
+        # Handle the message using chatbot logic; concurrent requests from
+        # one session take turns so neither reads state the other is changing
+        with session_lock(session_id):
+            response_text, user_state, awaiting_variable = handle_message(user_message, session_id)
         
         return jsonify({
             "response": response_text,
             "session_id": session_id,
-            "awaiting_variable": awaiting_variable
+            "awaiting_variable": awaiting_variable,
+            "model_version": get_model_version()
         })
         
     except Exception as e:
@@ -53,6 +93,76 @@ def chat():
         }), 500
 
 
+@app.route("/chat/form", methods=["POST"])
+def chat_form():
+    """Submit several feature values at once; predicts when the form is complete"""
+    try:
+        data = request.get_json(silent=True) or {}
+        values = data.get("values")
+        if not isinstance(values, dict) or not values:
+            return jsonify({"error": "Expected a JSON object with a non-empty 'values' object."}), 400
+
+        session_id = session.get('session_id', str(uuid.uuid4()))
+        session['session_id'] = session_id
+
+        with session_lock(session_id):
+            result = handle_form(values, session_id)
+
+        result["session_id"] = session_id
+        return jsonify(result), (422 if result["errors"] else 200)
+
+    except Exception as e:
+        print(f"[app.py] Error in chat form endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """Score many records in one request"""
+    try:
+        data = request.get_json(silent=True) or {}
+        records = data.get("records")
+        if not isinstance(records, list):
+            return jsonify({"error": "Expected a JSON object with a 'records' list."}), 400
+        if len(records) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Too many records (max {MAX_BATCH_SIZE})."}), 413
+
+        results = predict_many(records)
+        succeeded = sum(1 for r in results if r["success"])
+
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        })
+
+    except Exception as e:
+        print(f"[app.py] Error in batch prediction endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/comparables", methods=["POST"])
+def comparables():
+    """Most similar historical projects for a (partial) set of feature values"""
+    try:
+        data = request.get_json(silent=True) or {}
+        values = data.get("values")
+        if not isinstance(values, dict):
+            return jsonify({"error": "Expected a JSON object with a 'values' object."}), 400
+        try:
+            k = min(max(int(data.get("k", 5)), 1), MAX_COMPARABLES)
+        except (TypeError, ValueError):
+            return jsonify({"error": "'k' must be an integer."}), 400
+
+        projects = find_comparables(values, k)
+        return jsonify({"comparables": projects, "count": len(projects)})
+
+    except Exception as e:
+        print(f"[app.py] Error in comparables endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/greeting")
 def greeting():
     """Get initial greeting message"""
@@ -69,40 +179,55 @@ def status():
     """Get current status"""
     try:
         session_id = session.get('session_id', str(uuid.uuid4()))
-        from utils.history_manager import get_user_history
+        from utils.history_manager import get_user_history, get_recent_conversation
         user_state = get_user_history(session_id)
         
+        # Only the tail of the conversation log is read
+        recent_limit = request.args.get("recent", default=10, type=int)
+        
         return jsonify({
             "session_id": session_id,
-            "user_state": user_state
+            "user_state": user_state,
+            "recent_conversation": get_recent_conversation(session_id, recent_limit)
         })
     except Exception as e:
         print(f"[app.py] Error in status endpoint: {e}")
         return jsonify({"error": str(e)}), 500
 
 
-if __name__ == "__main__":
-    print("🤖 Starting Freelance Bid Prediction Chatbot...")
-    print("📊 Loading ML model and dataset...")
-    
-    # Test model loading
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: the model and dataset are loaded"""
+    readiness = get_readiness()
+    return jsonify(readiness), (200 if readiness["ready"] else 503)
+
+
+@app.route("/metrics")
+def metrics():
+    """Inference metrics for throughput / latency tuning"""
     try:
-        from ml_interface import load_model, load_dataset
-        model = load_model()
-        dataset = load_dataset()
-        
-        if model:
-            print("✅ ML model loaded successfully")
-        else:
-            print("⚠️ ML model not found - predictions will be limited")
-            
-        if dataset is not None:
-            print(f"✅ Dataset loaded successfully ({len(dataset)} rows)")
-        else:
-            print("⚠️ Dataset not found - suggestions will be limited")
-            
+        return jsonify({
+            "backend": get_inference_backend(),
+            "scheduler": get_scheduler().metrics(),
+            "executor": get_executor().metrics(),
+            "prediction_cache": get_prediction_cache_stats(),
+            "model": get_model_stats(),
+            "admission": get_admission().stats(),
+            "history": get_history_stats()
+        })
     except Exception as e:
-        print(f"⚠️ Error loading model/dataset: {e}")
-    
+        print(f"[app.py] Error in metrics endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+if __name__ == "__main__":
+    print("🤖 Starting Freelance Bid Prediction Chatbot...")
+    print("📊 Loading ML model and dataset in the background (see /readyz)...")
     print("🚀 Server starting at http://127.0.0.1:5000")
     app.run(host="127.0.0.1", port=5000, debug=True)
@@ -0,0 +1,207 @@
+# chatbot/category_resolver.py
+"""
+Typo-tolerant resolution of free text to a canonical categorical option.
+
+Every option name and synonym is indexed once with the symmetric-delete
+scheme: each term is stored under all variants with up to N characters
+deleted, and a query only generates its own delete variants and looks them
+up, so resolving a value costs a handful of dict lookups rather than a
+similarity scan over every option. Candidates are then ranked by true
+edit distance into a confidence score.
+"""
+import re
+
+# Extra spellings per variable -> canonical option
+CATEGORY_SYNONYMS = {
+    "Skills_Required": {
+        "Web Dev": ["web", "web development", "web developer", "website", "frontend", "front end",
+                    "backend", "back end", "full stack", "fullstack", "webdev"],
+        "Data Science": ["data", "ml", "machine learning", "ai", "analytics", "data analysis",
+                         "data scientist", "deep learning"],
+        "Graphic Design": ["design", "graphics", "graphic", "logo", "ui", "ux", "ui ux", "illustration"],
+        "Writing": ["content", "copywriting", "blog", "article", "articles", "writer", "translation"],
+        "Mobile Dev": ["mobile", "android", "ios", "app", "mobile app", "mobile development"],
+        "Marketing": ["seo", "social media", "ads", "advertising", "digital marketing"],
+        "Other": ["others", "misc", "something else"],
+    },
+    "Location": {
+        "USA": ["us", "u s", "u s a", "united states", "america", "states"],
+        "India": ["ind", "indian", "bharat"],
+        "Europe": ["eu", "european", "uk", "germany", "france", "spain", "italy", "netherlands"],
+        "Other": ["others", "elsewhere", "rest of world", "worldwide"],
+    },
+    "Client_History": {
+        "New": ["new client", "first time", "first", "fresh"],
+        "Repeat": ["repeat client", "returning", "existing", "regular", "old client", "recurring"],
+    },
+    "Urgency": {
+        "Low": ["not urgent", "relaxed", "flexible", "whenever"],
+        "Normal": ["medium", "moderate", "standard", "average", "usual"],
+        "High": ["urgent", "asap", "rush", "critical", "immediately", "very urgent"],
+    },
+    "Complexity": {
+        "Low": ["simple", "easy", "basic", "trivial"],
+        "Medium": ["moderate", "average", "intermediate", "normal"],
+        "High": ["hard", "difficult", "complex", "advanced", "very complex"],
+    },
+}
+
+# Filler words dropped before matching
+_FILLER = re.compile(
+    r"\b(?:maybe|around|approximately|approx|about|roughly|i think|i m thinking|probably|not sure|kind of|kinda|value|the|a|an|is)\b"
+)
+_NON_WORD = re.compile(r'[^a-z0-9 ]+')
+
+# Longest phrase (in words) tried inside a longer message
+_MAX_NGRAM = 3
+# Words of a long message that are looked at
+_MAX_TOKENS = 12
+# Confidence factor for a match on only part of the message
+_PARTIAL_WEIGHT = 0.9
+
+
+def _normalize(text):
+    text = _NON_WORD.sub(' ', str(text).lower())
+    text = _FILLER.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def _max_distance(length):
+    """Edits tolerated for a term of this length"""
+    if length <= 3:
+        return 0
+    if length <= 5:
+        return 1
+    return 2
+
+
+def _deletes(term, distance):
+    """term with every combination of up to `distance` characters removed"""
+    variants = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+def _edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (Levenshtein plus transpositions);
+    anything above `limit` is reported as limit + 1
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        ai = a[i - 1]
+        for j in range(1, len(b) + 1):
+            bj = b[j - 1]
+            best = prev[j - 1] + (ai != bj)
+            if prev[j] + 1 < best:
+                best = prev[j] + 1
+            if cur[j - 1] + 1 < best:
+                best = cur[j - 1] + 1
+            if i > 1 and j > 1 and ai == b[j - 2] and a[i - 2] == bj and prev2[j - 2] + 1 < best:
+                best = prev2[j - 2] + 1
+            cur[j] = best
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[len(b)]
+
+
+class CategoryResolver:
+    """
+    {variable: [options]} -> resolve(variable, text) = (option, confidence)
+
+    confidence is 1.0 for an exact option name, 0.95 for an exact synonym,
+    lower with each edit, and discounted when the match is only part of a
+    longer message; below `min_confidence` nothing is returned.
+    """
+
+    def __init__(self, categories, synonyms=None, min_confidence=0.6):
+        self.min_confidence = min_confidence
+        synonyms = CATEGORY_SYNONYMS if synonyms is None else synonyms
+        self._terms = {}    # variable -> {term: (option, base_confidence)}
+        self._index = {}    # variable -> {delete variant: [term]}
+        self._longest = {}  # variable -> longest term length
+        for variable, options in categories.items():
+            terms = {}
+            for option, extra in synonyms.get(variable, {}).items():
+                if option in options:
+                    for term in extra:
+                        terms.setdefault(_normalize(term), (option, 0.95))
+            for option in options:
+                terms[_normalize(option)] = (option, 1.0)
+            index = {}
+            for term in terms:
+                for variant in _deletes(term, _max_distance(len(term))):
+                    index.setdefault(variant, []).append(term)
+            self._terms[variable] = terms
+            self._index[variable] = index
+            self._longest[variable] = max((len(t) for t in terms), default=0)
+
+    def _lookup(self, variable, phrase):
+        """Best (option, confidence) for one phrase"""
+        terms, index = self._terms[variable], self._index[variable]
+        exact = terms.get(phrase)
+        if exact is not None:
+            return exact
+        if len(phrase) > self._longest[variable] + 2:
+            return None, 0.0
+
+        best = (None, 0.0)
+        seen = set()
+        # Terms within reach share a variant with at most this many deletions
+        for variant in _deletes(phrase, _max_distance(len(phrase))):
+            for term in index.get(variant, ()):
+                if term in seen:
+                    continue
+                seen.add(term)
+                limit = min(_max_distance(len(term)), _max_distance(len(phrase)))
+                distance = _edit_distance(phrase, term, limit)
+                if distance > limit:
+                    continue
+                option, base = terms[term]
+                confidence = base * (1.0 - distance / max(len(term), len(phrase)))
+                if confidence > best[1]:
+                    best = (option, confidence)
+        return best
+
+    def resolve(self, variable, text):
+        """(canonical option, confidence) for free text, or (None, 0.0)"""
+        if variable not in self._terms:
+            return None, 0.0
+        phrase = _normalize(text)
+        if not phrase:
+            return None, 0.0
+
+        best = self._lookup(variable, phrase)
+        # Otherwise look for the option inside a longer message (a partial
+        # match is discounted, so it can't beat a close whole-phrase match)
+        words = phrase.split()[:_MAX_TOKENS]
+        if best[1] < _PARTIAL_WEIGHT and len(words) > 1:
+            for n in range(min(_MAX_NGRAM, len(words) - 1), 0, -1):
+                for i in range(len(words) - n + 1):
+                    option, confidence = self._lookup(variable, ' '.join(words[i:i + n]))
+                    confidence *= _PARTIAL_WEIGHT
+                    if confidence > best[1]:
+                        best = (option, confidence)
+
+        if best[1] < self.min_confidence:
+            return None, 0.0
+        return best[0], round(best[1], 3)
+
+
+_resolvers = {}
+
+
+def get_resolver(categories):
+    """Resolver for a categories table, built once per table"""
+    cached = _resolvers.get(id(categories))
+    if cached is None or cached[0] is not categories:
+        cached = (categories, CategoryResolver(categories))
+        _resolvers[id(categories)] = cached
+    return cached[1]
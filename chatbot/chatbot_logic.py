@@ -1,11 +1,14 @@
 # chatbot/chatbot_logic.py
 import re
-import difflib
 from datetime import datetime
-from utils.history_manager import save_user_input, get_user_history, save_conversation, clear_history
-from ml_interface import predict_from_model, get_model_features, suggest_outcomes
+from utils.history_manager import save_user_input, save_user_inputs, get_user_history, save_conversation, clear_history
+from ml_interface import get_model_features, suggest_outcomes
+from inference_scheduler import scheduled_predict
+from slot_parser import fill_slots
+from alias_matcher import VARIABLE_ALIASES, get_matcher
+from category_resolver import get_resolver
 
-# Model features and validation rules
+# Model features (from the model manifest; the model itself is loaded by the warm-up)
 FEATURES = get_model_features()
 
 # Categorical variables with their valid options
@@ -33,6 +36,12 @@ WARNING_MESSAGES = {
     "Num_Bidders": "⚠️ Number of bidders should be a positive integer. Please enter a valid value.",
 }
 
+# Messages that run the model
+PREDICT_COMMANDS = ["predict", "run prediction", "run model", "predict anyway"]
+
+# Common filler words stripped from answers
+FILLER_PATTERN = re.compile(r'\b(?:maybe|around|approximately|approx|about|roughly|i think|i\'m thinking|probably|not sure|kind of|kinda|value|years|yrs|yr)\b', flags=re.I)
+
 def extract_number_from_text(text):
     """Extract numeric value from text"""
     if text is None:
@@ -52,8 +61,7 @@ def clean_user_value(value, expected_type, variable_name):
     val = str(value).strip()
     
     # Remove common filler words
-    filler_pattern = re.compile(r'\b(?:maybe|around|approximately|approx|about|roughly|i think|i\'m thinking|probably|not sure|kind of|kinda|value|years|yrs|yr)\b', flags=re.I)
-    val = filler_pattern.sub(' ', val).strip()
+    val = FILLER_PATTERN.sub(' ', val).strip()
     val = re.sub(r'\s+', ' ', val)
     
     if expected_type == "numeric":
@@ -84,87 +92,20 @@ def clean_user_value(value, expected_type, variable_name):
         if not options:
             return cleaned.title(), True, None
         
-        # Exact match (case-insensitive)
-        for option in options:
-            if cleaned.lower() == option.lower():
-                return option, True, None
-        
-        # Close match using difflib
-        lower_options = [opt.lower() for opt in options]
-        matches = difflib.get_close_matches(cleaned.lower(), lower_options, n=1, cutoff=0.6)
-        if matches:
-            idx = lower_options.index(matches[0])
-            return options[idx], True, None
-        
-        # Token containment
-        tokens = cleaned.lower().split()
-        for option in options:
-            if any(token in option.lower() for token in tokens):
-                return option, True, None
+        # Exact, synonym ("US", "frontend") or close (typo) match
+        option, _ = get_resolver(CATEGORIES).resolve(variable_name, cleaned)
+        if option is not None:
+            return option, True, None
         
         return None, False, f"Invalid option. Expected one of: {', '.join(options)}"
     
     return val, True, None
 
 def find_variable_by_mention(text):
-    """Find which variable the user is referring to"""
+    """Find which variable the user is referring to (longest alias mentioned)"""
     if not text:
         return None
-    
-    text_lower = text.lower()
-    
-    # Variable name mappings
-    mappings = {
-        "client_budget_min": "Client_Budget_Min",
-        "client budget min": "Client_Budget_Min",
-        "budget min": "Client_Budget_Min",
-        "min budget": "Client_Budget_Min",
-        "minimum budget": "Client_Budget_Min",
-        "client_budget_max": "Client_Budget_Max",
-        "client budget max": "Client_Budget_Max",
-        "budget max": "Client_Budget_Max",
-        "max budget": "Client_Budget_Max",
-        "maximum budget": "Client_Budget_Max",
-        "skills": "Skills_Required",
-        "skills_required": "Skills_Required",
-        "skill": "Skills_Required",
-        "avg_past_bids": "Avg_Past_Bids",
-        "average past bids": "Avg_Past_Bids",
-        "avg past bids": "Avg_Past_Bids",
-        "past bids": "Avg_Past_Bids",
-        "location": "Location",
-        "client_history": "Client_History",
-        "client history": "Client_History",
-        "history": "Client_History",
-        "freelancer_success_rate": "Freelancer_Success_Rate",
-        "success rate": "Freelancer_Success_Rate",
-        "success": "Freelancer_Success_Rate",
-        "duration": "Duration_Days",
-        "duration_days": "Duration_Days",
-        "days": "Duration_Days",
-        "urgency": "Urgency",
-        "freelancer_exp_years": "Freelancer_Exp_Years",
-        "experience": "Freelancer_Exp_Years",
-        "exp years": "Freelancer_Exp_Years",
-        "years": "Freelancer_Exp_Years",
-        "complexity": "Complexity",
-        "num_bidders": "Num_Bidders",
-        "bidders": "Num_Bidders",
-        "number of bidders": "Num_Bidders",
-        "bidders count": "Num_Bidders",
-    }
-    
-    # Check mappings
-    for key, variable in mappings.items():
-        if key in text_lower:
-            return variable
-    
-    # Check direct feature names
-    for feature in FEATURES:
-        if feature.lower() in text_lower:
-            return feature
-    
-    return None
+    return get_matcher(VARIABLE_ALIASES).best(text)
 
 def get_next_missing_variable(user_state):
     """Get the next variable that needs to be filled"""
@@ -191,6 +132,10 @@ def build_status_message(user_state):
     
     return status
 
+def is_prediction_turn(message):
+    """True if the message asks for a prediction (admitted in the "predict" lane)"""
+    return isinstance(message, str) and message.strip().lower() in PREDICT_COMMANDS
+
 def handle_message(message, session_id):
     """
     Main message handler for the chatbot
@@ -230,7 +175,7 @@ def handle_message(message, session_id):
         save_conversation(session_id, "bot", response)
         return response, user_state, next_var
     
-    if message_lower in ["predict", "run prediction", "run model", "predict anyway"]:
+    if message_lower in PREDICT_COMMANDS:
         missing = [f for f in FEATURES if user_state.get(f) in [None, ""]]
         
         if missing:
@@ -238,8 +183,8 @@ def handle_message(message, session_id):
             suggestions = suggest_outcomes(user_state)
             response = f"⚠️ Missing {len(missing)} variables: {', '.join(missing)}\n\n{suggestions}\n\nPlease fill all variables for accurate prediction."
         else:
-            # Full prediction
-            result = predict_from_model(user_state)
+            # Full prediction (batched with concurrent sessions)
+            result = scheduled_predict(user_state)
             if result["success"]:
                 response = f"🎯 **Prediction Result:** {result['prediction']:.2f}\n\nAll variables collected successfully!"
             else:
@@ -248,6 +193,11 @@ def handle_message(message, session_id):
         save_conversation(session_id, "bot", response)
         return response, user_state, None
     
+    # Several variables in one message ("Web Dev, budget 2000-4000, 30 days")
+    slot_values, slot_errors = fill_slots(message, CATEGORIES, clean_user_value, VARIABLE_ALIASES)
+    if len(slot_values) + len(slot_errors) > 1:
+        return handle_slots(session_id, user_state, slot_values, slot_errors)
+    
     # Check if user mentioned a specific variable
     mentioned_var = find_variable_by_mention(message)
     
@@ -292,6 +242,109 @@ def handle_message(message, session_id):
     save_conversation(session_id, "bot", response)
     return response, user_state, next_var
 
+def handle_slots(session_id, user_state, slot_values, slot_errors):
+    """
+    Store every variable parsed from one message with a single write
+    Returns: (response_text, updated_user_state, updated_awaiting_variable)
+    """
+    if slot_values:
+        save_user_inputs(session_id, slot_values)
+        user_state.update(slot_values)
+        response = f"✅ Got it! Filled {len(slot_values)} variables:\n" + "\n".join(
+            [f"• **{k}** = {v}" for k, v in slot_values.items()]
+        )
+    else:
+        response = "I couldn't use any of those values."
+    
+    for variable in slot_errors:
+        response += "\n\n" + WARNING_MESSAGES.get(variable, f"Invalid input for {variable}.")
+    
+    # Re-ask for a rejected value first, then continue with what's missing
+    next_var = next(iter(slot_errors), None) or get_next_missing_variable(user_state)
+    if next_var:
+        response += f"\n\nNext, please enter a value for **{next_var}**:"
+    else:
+        response += "\n\n🎉 All variables collected! Type 'predict' to run the model."
+    
+    save_conversation(session_id, "bot", response)
+    return response, user_state, next_var
+
+def validate_form(values, current=None):
+    """
+    Validate a whole {variable: value} form with the chat rules
+    current: the values already stored for the session; the budget range is
+    checked on them merged with the form
+    Returns: ({variable: cleaned_value}, {variable: error_message})
+    """
+    cleaned, errors = {}, {}
+    for variable, value in values.items():
+        if variable not in FEATURES:
+            errors[variable] = f"Unknown variable. Expected one of: {', '.join(FEATURES)}"
+            continue
+        if isinstance(value, (dict, list, bool)):
+            errors[variable] = WARNING_MESSAGES.get(variable, f"Invalid input for {variable}.")
+            continue
+        expected_type = "categorical" if variable in CATEGORIES else "numeric"
+        cleaned_value, is_valid, _ = clean_user_value(value, expected_type, variable)
+        if is_valid:
+            cleaned[variable] = cleaned_value
+        else:
+            errors[variable] = WARNING_MESSAGES.get(variable, f"Invalid input for {variable}.")
+
+    merged = dict(current or {})
+    merged.update(cleaned)
+    try:
+        low, high = float(merged.get("Client_Budget_Min")), float(merged.get("Client_Budget_Max"))
+    except (TypeError, ValueError):
+        low = high = None  # an end is missing
+    if low is not None and low > high:
+        # Blame the end this form changed (the maximum if it sent both)
+        if "Client_Budget_Max" in cleaned:
+            errors["Client_Budget_Max"] = WARNING_MESSAGES["Client_Budget_Max"]
+            del cleaned["Client_Budget_Max"]
+        else:
+            errors["Client_Budget_Min"] = f"⚠️ The minimum budget must not be above the maximum budget ({high:g})."
+            del cleaned["Client_Budget_Min"]
+    return cleaned, errors
+
+def handle_form(values, session_id):
+    """
+    Structured submission of several variables at once (form UI).
+    Nothing is stored if any value is invalid; otherwise the values are
+    merged into the session with one write and, once every variable is
+    filled, the prediction is returned.
+    Returns: result dict with "success", "user_state", "missing", "errors"
+    and "prediction" with "model_version" (or "message")
+    """
+    user_state = get_user_history(session_id)
+    cleaned, errors = validate_form(values, user_state)
+    if errors:
+        return {"success": False, "errors": errors, "user_state": user_state,
+                "missing": [f for f in FEATURES if user_state.get(f) in [None, ""]],
+                "message": "Some values are invalid; nothing was saved."}
+
+    user_state.update(cleaned)
+    missing = [f for f in FEATURES if user_state.get(f) in [None, ""]]
+    result = {"success": True, "errors": {}, "user_state": user_state, "missing": missing}
+    if missing:
+        response = f"✅ Got it! Filled {len(cleaned)} variables. Still need: {', '.join(missing)}"
+    else:
+        prediction = scheduled_predict(user_state)
+        if prediction["success"]:
+            result["prediction"] = prediction["prediction"]
+            result["model_version"] = prediction.get("model_version")
+            response = f"🎯 **Prediction Result:** {prediction['prediction']:.2f}\n\nAll variables collected successfully!"
+        else:
+            result["success"] = False
+            result["message"] = prediction["message"]
+            response = f"❌ Prediction failed: {prediction['message']}"
+    result["response"] = response
+
+    # Inputs and the matching conversation turn go out in one write
+    summary = ", ".join(f"{k}={v}" for k, v in cleaned.items())
+    save_user_inputs(session_id, cleaned, [("user", f"[form] {summary}"), ("bot", response)])
+    return result
+
 def get_greeting_message():
     """Get the initial greeting message"""
     return f"""🤖 **Welcome to the Freelance Bid Prediction Chatbot!**
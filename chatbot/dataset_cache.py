@@ -0,0 +1,139 @@
+# chatbot/dataset_cache.py
+"""
+Typed columnar cache of the training dataset.
+
+The CSV is parsed once into one .npy file per column:
+- text columns as integer category codes, with their labels in the
+  manifest;
+- integer columns in the narrowest integer type that holds their range;
+- float columns as float32 where every value survives the round trip
+  exactly, float64 otherwise.
+
+The cache directory is named after the CSV checksum, so an edited CSV is
+cached again rather than served stale. Columns are opened with
+np.load(mmap_mode="r"), so loading parses nothing and the column data is
+read from the page cache.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from aggregate_cube import file_checksum
+
+CACHE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+# Numeric columns get at least int16 so everyday arithmetic on them can't
+# wrap around; category codes may use int8
+_INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def _smallest_int(low, high, floor=np.int8):
+    for dtype in _INT_TYPES[_INT_TYPES.index(floor):]:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+def _narrow(values):
+    """values in the smallest dtype that represents every one of them exactly"""
+    if values.dtype.kind in "iu":
+        if len(values) == 0:
+            return values.astype(np.int16)
+        return values.astype(_smallest_int(int(values.min()), int(values.max()), floor=np.int16))
+    values = values.astype(np.float64)
+    as_float32 = values.astype(np.float32)
+    if np.array_equal(as_float32.astype(np.float64), values, equal_nan=True):
+        return as_float32
+    return values
+
+
+def cache_dir(csv_path, cache_root, checksum=None):
+    """Cache directory for a CSV (named after its checksum)"""
+    checksum = checksum or file_checksum(csv_path)
+    return os.path.join(cache_root, f"dataset_{checksum[:16]}")
+
+
+def read_manifest(directory):
+    """Parsed manifest of a cache directory, or None if there isn't a usable one"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("format") == CACHE_FORMAT else None
+
+
+def build_cache(csv_path, directory, checksum=None):
+    """
+    Parse the CSV and write its typed columns into `directory` (written
+    next to it and renamed into place)
+    Returns: the manifest
+    """
+    import pandas as pd
+
+    checksum = checksum or file_checksum(csv_path)
+    frame = pd.read_csv(csv_path)
+    tmp = f"{os.path.normpath(directory)}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = []
+    for position, name in enumerate(frame.columns):
+        series = frame[name]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            values = _narrow(series.to_numpy())
+            column = {"name": str(name), "kind": "numeric"}
+        else:
+            # Labels keep first-appearance order, like pd.factorize on the CSV
+            codes, labels = pd.factorize(series)
+            values = codes.astype(_smallest_int(-1, len(labels)))
+            column = {"name": str(name), "kind": "category", "labels": [str(label) for label in labels]}
+        column["dtype"] = values.dtype.name
+        np.save(os.path.join(tmp, f"{position:03d}.npy"), values)
+        columns.append(column)
+
+    manifest = {"format": CACHE_FORMAT, "source_checksum": checksum, "rows": len(frame), "columns": columns}
+    with open(os.path.join(tmp, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        # Another process cached the same CSV first
+        shutil.rmtree(tmp, ignore_errors=True)
+        if read_manifest(directory) is None:
+            raise
+    return manifest
+
+
+def load_frame(directory, mmap_mode="r"):
+    """DataFrame over the cached columns (category codes become pandas Categoricals)"""
+    import pandas as pd
+
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"No dataset cache at {directory}")
+    data = {}
+    for position, column in enumerate(manifest["columns"]):
+        values = np.load(os.path.join(directory, f"{position:03d}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+        if column["kind"] == "category":
+            data[column["name"]] = pd.Categorical.from_codes(values, categories=column["labels"])
+        else:
+            data[column["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def load_dataset_cached(csv_path, cache_root, mmap_mode="r"):
+    """The dataset from its typed cache, building the cache on first use"""
+    checksum = file_checksum(csv_path)
+    directory = cache_dir(csv_path, cache_root, checksum)
+    manifest = read_manifest(directory)
+    if manifest is None or manifest.get("source_checksum") != checksum:
+        os.makedirs(cache_root, exist_ok=True)
+        shutil.rmtree(directory, ignore_errors=True)
+        build_cache(csv_path, directory, checksum)
+    return load_frame(directory, mmap_mode)
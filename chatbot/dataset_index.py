@@ -0,0 +1,150 @@
+# chatbot/dataset_index.py
+import numpy as np
+import pandas as pd
+
+# Numeric filters match values within this fraction of the requested value
+NUMERIC_TOLERANCE = 0.2
+
+
+class RowSelection:
+    """Rows matched by a query, with the statistics suggest_outcomes needs"""
+
+    def __init__(self, index, rows):
+        self.index = index
+        self.rows = rows
+        self.count = len(rows)
+
+    def column_means(self, columns):
+        return self.index.column_means(self.rows, columns)
+
+    def top_values(self, col, n=3):
+        return self.index.top_values(self.rows, col, n)
+
+
+class DatasetIndex:
+    """
+    Read-only query index over the bids dataset.
+
+    Categorical columns are dictionary-encoded and keep one packed bitmap per
+    (case-folded) value; numeric columns keep a sorted copy plus the row order
+    so a range filter is two binary searches. Categorical filters combine by
+    AND-ing bitmaps and numeric ranges then only look at the matching rows,
+    so the frame is never copied or rescanned per query.
+    """
+
+    def __init__(self, frame):
+        self.n_rows = len(frame)
+        self.columns = list(frame.columns)
+        self.numeric_cols = list(frame.select_dtypes(include=[np.number]).columns)
+        self.categorical_cols = [c for c in self.columns if c not in self.numeric_cols]
+
+        self._numeric = {}
+        self._sorted = {}
+        for col in self.numeric_cols:
+            values = frame[col].to_numpy(dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            self._numeric[col] = values
+            self._sorted[col] = (values[order], order)
+
+        self._codes = {}
+        self._labels = {}
+        self._bitmaps = {}
+        for col in self.categorical_cols:
+            # factorize keeps first-appearance order, which breaks count ties
+            # the same way pandas value_counts does
+            codes, labels = pd.factorize(frame[col])
+            self._codes[col] = codes.astype(np.int32)
+            self._labels[col] = [str(label) for label in labels]
+            bitmaps = {}
+            for code, label in enumerate(self._labels[col]):
+                bits = np.packbits(codes == code)
+                key = label.lower()
+                bitmaps[key] = bits if key not in bitmaps else (bitmaps[key] | bits)
+            self._bitmaps[col] = bitmaps
+
+        self._none = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+
+    def parse_filters(self, filters):
+        """
+        Split {feature: value} filters into categorical and numeric-range parts
+        Categorical values match case-insensitively; numeric values match within
+        NUMERIC_TOLERANCE. Unknown features and unparsable numbers are ignored.
+        Returns: ([(column, folded_value)], [(column, low, high)])
+        """
+        categorical, numeric = [], []
+        for feature, value in filters.items():
+            if value is None:
+                continue
+            if feature in self._bitmaps:
+                categorical.append((feature, str(value).lower()))
+            elif feature in self._sorted:
+                try:
+                    num = float(value)
+                except (TypeError, ValueError):
+                    continue
+                tolerance = abs(num) * NUMERIC_TOLERANCE
+                numeric.append((feature, num - tolerance, num + tolerance))
+        return categorical, numeric
+
+    def categorical_rows(self, categorical):
+        """Row ids matching every categorical filter (None means all rows)"""
+        if not categorical:
+            return None
+        combined = None
+        for col, value in categorical:
+            bits = self._bitmaps[col].get(value, self._none)
+            combined = bits if combined is None else (combined & bits)
+        return np.flatnonzero(np.unpackbits(combined, count=self.n_rows))
+
+    def refine(self, rows, numeric):
+        """
+        Narrow candidate rows by numeric ranges. With no candidates yet the first
+        range is answered by binary search; afterwards only candidate values are
+        gathered, so the cost tracks the candidate set rather than the table.
+        """
+        for col, low, high in numeric:
+            if rows is None:
+                sorted_values, order = self._sorted[col]
+                start = np.searchsorted(sorted_values, low, side="left")
+                stop = np.searchsorted(sorted_values, high, side="right")
+                rows = np.sort(order[start:stop])
+            else:
+                values = self._numeric[col][rows]
+                rows = rows[(values >= low) & (values <= high)]
+        return np.arange(self.n_rows) if rows is None else rows
+
+    def query(self, filters):
+        """Row ids matching every filter, in dataset order"""
+        categorical, numeric = self.parse_filters(filters)
+        return self.refine(self.categorical_rows(categorical), numeric)
+
+    def select(self, categorical, numeric):
+        """RowSelection for already parsed filters"""
+        return RowSelection(self, self.refine(self.categorical_rows(categorical), numeric))
+
+    def column_means(self, rows, columns):
+        """[(column, mean)] over the given rows, skipping NaNs"""
+        means = []
+        for col in columns:
+            values = self._numeric[col][rows]
+            means.append((col, float(np.nanmean(values)) if len(values) else float("nan")))
+        return means
+
+    def top_values(self, rows, col, n=3):
+        """[(value, count)] of the n most frequent values of col over the given rows"""
+        codes = self._codes[col][rows]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self._labels[col]))
+        order = np.argsort(-counts, kind="stable")[:n]
+        return [(self._labels[col][i], int(counts[i])) for i in order if counts[i] > 0]
+
+    def codes(self, col):
+        """Dictionary codes of a categorical column (-1 for missing)"""
+        return self._codes[col]
+
+    def labels(self, col):
+        """Labels of a categorical column, indexed by code"""
+        return self._labels[col]
+
+    def values(self, col):
+        """float64 values of a numeric column"""
+        return self._numeric[col]
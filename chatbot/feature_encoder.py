@@ -0,0 +1,176 @@
+# chatbot/feature_encoder.py
+import numpy as np
+
+
+class UnsupportedPipelineError(ValueError):
+    """Raised when a pipeline uses a step the encoder cannot reproduce exactly"""
+
+
+def _column_names(columns, feature_names):
+    """ColumnTransformer columns may be names or positions"""
+    if isinstance(columns, slice):
+        return list(feature_names[columns])
+    names = []
+    for col in columns:
+        if isinstance(col, (int, np.integer)):
+            names.append(str(feature_names[col]))
+        else:
+            names.append(str(col))
+    return names
+
+
+def _compile_step(name, transformer, columns, start):
+    """Translate one fitted ColumnTransformer step into plain lookup tables"""
+    kind = type(transformer).__name__
+
+    if isinstance(transformer, str) and transformer == "passthrough":
+        return [{"kind": "passthrough", "feature": f, "index": start + i} for i, f in enumerate(columns)]
+
+    if kind == "StandardScaler":
+        means = transformer.mean_ if transformer.with_mean else None
+        scales = transformer.scale_ if transformer.with_std else None
+        return [{
+            "kind": "numeric",
+            "feature": f,
+            "index": start + i,
+            "mean": None if means is None else float(means[i]),
+            "scale": None if scales is None else float(scales[i]),
+        } for i, f in enumerate(columns)]
+
+    if kind == "OrdinalEncoder":
+        if transformer.handle_unknown not in ["error", "use_encoded_value"]:
+            raise UnsupportedPipelineError(f"{name}: handle_unknown={transformer.handle_unknown}")
+        if getattr(transformer, "_infrequent_enabled", False):
+            raise UnsupportedPipelineError(f"{name}: infrequent categories are not supported")
+        unknown = transformer.unknown_value if transformer.handle_unknown == "use_encoded_value" else None
+        return [{
+            "kind": "ordinal",
+            "feature": f,
+            "index": start + i,
+            "codes": {str(c): float(j) for j, c in enumerate(cats)},
+            "unknown_value": None if unknown is None else float(unknown),
+        } for i, (f, cats) in enumerate(zip(columns, transformer.categories_))]
+
+    if kind == "OneHotEncoder":
+        if transformer.drop_idx_ is not None:
+            raise UnsupportedPipelineError(f"{name}: drop is not supported")
+        if getattr(transformer, "_infrequent_enabled", False):
+            raise UnsupportedPipelineError(f"{name}: infrequent categories are not supported")
+        fields, offset = [], start
+        for f, cats in zip(columns, transformer.categories_):
+            fields.append({
+                "kind": "onehot",
+                "feature": f,
+                "index": offset,
+                "codes": {str(c): j for j, c in enumerate(cats)},
+                "ignore_unknown": transformer.handle_unknown != "error",
+            })
+            offset += len(cats)
+        return fields
+
+    raise UnsupportedPipelineError(f"{name}: unsupported transformer {kind}")
+
+
+class FeatureEncoder:
+    """
+    Pandas-free replacement for a fitted ColumnTransformer.
+    Maps a feature dict straight to the numeric vector the regressor expects,
+    using the same float64 arithmetic as sklearn so predictions stay identical.
+    """
+
+    def __init__(self, fields, n_outputs):
+        self.fields = fields
+        self.n_outputs = n_outputs
+        self.features = sorted({field["feature"] for field in fields})
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        """Compile a fitted ColumnTransformer"""
+        if type(preprocessor).__name__ != "ColumnTransformer":
+            raise UnsupportedPipelineError(f"unsupported preprocessor {type(preprocessor).__name__}")
+
+        feature_names = np.asarray(getattr(preprocessor, "feature_names_in_", []), dtype=object)
+        fields, n_outputs = [], 0
+        for name, transformer, columns in preprocessor.transformers_:
+            out = preprocessor.output_indices_.get(name, slice(0, 0))
+            if (isinstance(transformer, str) and transformer == "drop") or out.stop == out.start:
+                continue
+            fields.extend(_compile_step(name, transformer, _column_names(columns, feature_names), out.start))
+            n_outputs = max(n_outputs, out.stop)
+        return cls(fields, n_outputs)
+
+    def _value(self, field, record):
+        value = record[field["feature"]]
+        kind = field["kind"]
+
+        if kind == "numeric":
+            x = float(value)
+            if field["mean"] is not None:
+                x -= field["mean"]
+            if field["scale"] is not None:
+                x /= field["scale"]
+            return x
+
+        if kind == "ordinal":
+            code = field["codes"].get(str(value))
+            if code is None:
+                if field["unknown_value"] is None:
+                    raise ValueError(f"Found unknown category '{value}' for {field['feature']}")
+                return field["unknown_value"]
+            return code
+
+        return float(value)
+
+    def encode(self, record):
+        """Encode one feature dict into a 1-D float64 vector"""
+        row = np.zeros(self.n_outputs, dtype=np.float64)
+        for field in self.fields:
+            if field["kind"] == "onehot":
+                code = field["codes"].get(str(record[field["feature"]]))
+                if code is None:
+                    if not field["ignore_unknown"]:
+                        raise ValueError(f"Found unknown category '{record[field['feature']]}' for {field['feature']}")
+                    continue
+                row[field["index"] + code] = 1.0
+            else:
+                row[field["index"]] = self._value(field, record)
+        return row
+
+    def encode_many(self, records):
+        """Encode a list of feature dicts into a 2-D float64 matrix"""
+        X = np.zeros((len(records), self.n_outputs), dtype=np.float64)
+        for i, record in enumerate(records):
+            X[i] = self.encode(record)
+        return X
+
+
+def compile_pipeline(pipeline):
+    """
+    Split a fitted (ColumnTransformer, regressor) Pipeline into a FeatureEncoder
+    and the bare regressor. Raises UnsupportedPipelineError for other layouts.
+    """
+    steps = getattr(pipeline, "steps", None)
+    if not steps or len(steps) != 2:
+        raise UnsupportedPipelineError("expected a two-step (preprocessor, regressor) pipeline")
+    encoder = FeatureEncoder.from_preprocessor(steps[0][1])
+    regressor = steps[1][1]
+    if getattr(regressor, "n_features_in_", encoder.n_outputs) != encoder.n_outputs:
+        raise UnsupportedPipelineError("encoder output width does not match the regressor")
+    return encoder, regressor
+
+
+def verify_parity(pipeline, frame, batch_size=1000):
+    """
+    Compare encoder + regressor against the full pipeline on every row of `frame`
+    Returns: dict with 'rows', 'mismatches' and 'max_abs_diff'
+    """
+    encoder, regressor = compile_pipeline(pipeline)
+    records = frame.to_dict("records")
+    mismatches, max_diff = 0, 0.0
+    for start in range(0, len(records), batch_size):
+        chunk = frame.iloc[start:start + batch_size]
+        expected = pipeline.predict(chunk)
+        actual = regressor.predict(encoder.encode_many(records[start:start + batch_size]))
+        mismatches += int(np.sum(expected != actual))
+        max_diff = max(max_diff, float(np.max(np.abs(expected - actual))))
+    return {"rows": len(records), "mismatches": mismatches, "max_abs_diff": max_diff}
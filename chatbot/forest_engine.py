@@ -0,0 +1,142 @@
+# chatbot/forest_engine.py
+import os
+
+import numpy as np
+
+# Rows walked per chunk; bounds the (rows x trees) index matrices
+_CHUNK_ROWS = 4096
+
+# Node table arrays on disk: index arrays are shared by every dtype, split
+# thresholds and leaf values are stored once per dtype
+_INDEX_ARRAYS = ("feature", "left", "right", "roots")
+_VALUE_ARRAYS = ("threshold", "value")
+
+
+class FlatForest:
+    """
+    Tree ensemble flattened into contiguous NumPy arrays.
+
+    All trees share one node table (feature, threshold, left, right, value);
+    leaves point to themselves so a fixed number of vectorized steps walks
+    every tree for every row at once, without joblib or per-tree dispatch.
+
+    sklearn compares float32 inputs against float64 thresholds. float64 mode
+    does the same and reproduces its predictions exactly. float32 mode rounds
+    every threshold down to the nearest float32, which keeps each split
+    decision identical, and stores leaf values as float32, so predictions
+    differ from sklearn only by float32 rounding of the leaf values.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def dtype(self):
+        return self.threshold.dtype
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_estimator(cls, estimator, dtype=np.float64):
+        """Flatten a fitted single-output RandomForest/ExtraTrees regressor"""
+        trees = [est.tree_ for est in getattr(estimator, "estimators_", [])]
+        if not trees:
+            raise ValueError("Estimator has no fitted trees")
+        if any(t.n_outputs != 1 for t in trees):
+            raise ValueError("Only single-output regressors are supported")
+
+        n_nodes = np.array([t.node_count for t in trees])
+        roots = np.concatenate([[0], np.cumsum(n_nodes)[:-1]]).astype(np.int64)
+        total = int(n_nodes.sum())
+
+        feature = np.empty(total, dtype=np.int32)
+        threshold = np.empty(total, dtype=dtype)
+        left = np.empty(total, dtype=np.int64)
+        right = np.empty(total, dtype=np.int64)
+        value = np.empty(total, dtype=dtype)
+
+        for tree, offset in zip(trees, roots):
+            sl = slice(offset, offset + tree.node_count)
+            own = np.arange(offset, offset + tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            feature[sl] = np.where(is_leaf, 0, tree.feature)
+            threshold[sl] = np.where(is_leaf, 0.0, tree.threshold)
+            left[sl] = np.where(is_leaf, own, tree.children_left + offset)
+            right[sl] = np.where(is_leaf, own, tree.children_right + offset)
+            value[sl] = tree.value[:, 0, 0]
+
+        if threshold.dtype == np.float32:
+            # x <= t for float32 x holds exactly when x <= (largest float32 <= t)
+            exact = np.concatenate([np.where(t.children_left == -1, 0.0, t.threshold) for t in trees])
+            threshold = np.where(threshold > exact, np.nextafter(threshold, np.float32(-np.inf)), threshold)
+
+        return cls(
+            feature, threshold, left, right, value, roots,
+            max_depth=max(t.max_depth for t in trees),
+            n_features=estimator.n_features_in_,
+        )
+
+    def save(self, directory):
+        """
+        Write the node table as raw .npy files into `directory`
+        Returns: the {"max_depth", "n_features"} needed by load()
+        """
+        for name in _INDEX_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        for name in _VALUE_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.{self.dtype.name}.npy"), getattr(self, name))
+        return {"max_depth": self.max_depth, "n_features": self.n_features}
+
+    @classmethod
+    def load(cls, directory, max_depth, n_features, dtype=np.float64, mmap_mode="r"):
+        """
+        Open a node table written by save(); with mmap_mode the arrays are
+        mapped from the files instead of read into memory
+        """
+        def array(filename):
+            return np.load(os.path.join(directory, filename), mmap_mode=mmap_mode, allow_pickle=False)
+
+        tag = np.dtype(dtype).name
+        arrays = {name: array(f"{name}.npy") for name in _INDEX_ARRAYS}
+        arrays.update({name: array(f"{name}.{tag}.npy") for name in _VALUE_ARRAYS})
+        return cls(max_depth=max_depth, n_features=n_features, **arrays)
+
+    def _leaves(self, X):
+        """Leaf node index for every (row, tree) pair"""
+        nodes = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        flat_X = np.ascontiguousarray(X).ravel()
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, np.newaxis]
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_offsets + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict(self, X):
+        """Predict for a 2-D array of encoded rows"""
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input with {self.n_features} features")
+
+        # sklearn evaluates trees on float32 inputs; round the same way
+        X = X.astype(np.float32).astype(self.dtype)
+
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), _CHUNK_ROWS):
+            chunk = X[start:start + _CHUNK_ROWS]
+            leaf_values = self.value[self._leaves(chunk)]
+            # Accumulate tree by tree like sklearn so float64 sums match
+            total = np.zeros(len(chunk), dtype=np.float64)
+            for t in range(self.n_trees):
+                total += leaf_values[:, t]
+            out[start:start + len(chunk)] = total / self.n_trees
+        return out
@@ -0,0 +1,195 @@
+# chatbot/inference_executor.py
+"""
+Owner of the inference thread budget.
+
+The pickled forest was trained with n_jobs=-1, so every predict call would
+fan out over all cores through joblib; with many request threads (and
+several pre-fork workers) calling it at once the machine runs far more
+threads than cores. Instead the estimator is pinned to MODEL_N_JOBS when it
+is loaded (pin_n_jobs) and every prediction runs on one bounded pool of
+INFERENCE_THREADS threads:
+- a batch of at least SPLIT_ROWS rows is split into one chunk per thread
+  (parallelism inside the request);
+- anything smaller runs as one task, so concurrent requests share the pool
+  (parallelism across requests) and never run more than INFERENCE_THREADS
+  predictions at a time.
+The tree engines release the GIL while traversing, so the threads do run
+in parallel.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Inference threads per process (0 = one per available CPU; serve.py divides
+# the CPUs between its workers)
+INFERENCE_THREADS = int(os.environ.get("CHATBOT_INFERENCE_THREADS", "0"))
+# n_jobs every estimator is pinned to when the model is loaded
+MODEL_N_JOBS = int(os.environ.get("CHATBOT_MODEL_N_JOBS", "1"))
+# Batches with at least this many rows are split across the pool
+SPLIT_ROWS = int(os.environ.get("CHATBOT_INFERENCE_SPLIT_ROWS", "256"))
+
+
+def available_cpus():
+    """CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+def default_threads(processes=1):
+    """Per-process share of the CPUs when `processes` processes serve together"""
+    return max(1, available_cpus() // max(1, processes))
+
+
+def pin_n_jobs(model, n_jobs=None):
+    """
+    Set n_jobs on the model and every estimator inside it (pipeline steps,
+    column transformers, ensembles)
+    Returns: list of (estimator class name, previous n_jobs) that were changed
+    """
+    n_jobs = MODEL_N_JOBS if n_jobs is None else n_jobs
+    changed, seen, stack = [], set(), [model]
+    while stack:
+        est = stack.pop()
+        if est is None or id(est) in seen:
+            continue
+        seen.add(id(est))
+        if hasattr(est, "get_params") and "n_jobs" in est.get_params(deep=False):
+            previous = est.get_params(deep=False)["n_jobs"]
+            if previous != n_jobs:
+                est.set_params(n_jobs=n_jobs)
+                changed.append((type(est).__name__, previous))
+        for step in getattr(est, "steps", None) or []:
+            stack.append(step[1])
+        for transformer in getattr(est, "transformers_", None) or []:
+            stack.append(transformer[1])
+        for sub in getattr(est, "estimators_", None) or []:
+            if hasattr(sub, "get_params"):
+                stack.append(sub)
+    return changed
+
+
+def _rows(X, start, stop):
+    return X.iloc[start:stop] if hasattr(X, "iloc") else X[start:stop]
+
+
+class InferenceExecutor:
+    """
+    Runs prediction functions on a pool of `threads` threads.
+    run(fn, X) returns fn(X); fn must predict row by row, so that a large X
+    can be split into chunks and the results concatenated.
+    """
+
+    def __init__(self, threads=None, split_rows=SPLIT_ROWS):
+        self.threads = max(1, int(threads or INFERENCE_THREADS or default_threads()))
+        self.split_rows = max(1, int(split_rows))
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="inference")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._tasks = 0
+        self._split_requests = 0
+        self._inline = 0
+        self._active = 0
+        self._max_active = 0
+        self._waits = deque(maxlen=1000)
+
+    def _task(self, fn, X, submitted):
+        started = time.perf_counter()
+        with self._lock:
+            self._tasks += 1
+            self._active += 1
+            self._max_active = max(self._max_active, self._active)
+            self._waits.append(started - submitted)
+        self._local.in_pool = True
+        try:
+            return fn(X)
+        finally:
+            self._local.in_pool = False
+            with self._lock:
+                self._active -= 1
+
+    def run(self, fn, X):
+        """fn(X) on the pool; split into one chunk per thread when X is large"""
+        if getattr(self._local, "in_pool", False):
+            # Already on a pool thread: waiting on the pool could deadlock
+            with self._lock:
+                self._inline += 1
+            return fn(X)
+
+        submitted = time.perf_counter()
+        n = len(X)
+        if self.threads == 1 or n < self.split_rows:
+            return self._pool.submit(self._task, fn, X, submitted).result()
+
+        with self._lock:
+            self._split_requests += 1
+        bounds = np.linspace(0, n, min(self.threads, n) + 1).astype(int)
+        futures = [self._pool.submit(self._task, fn, _rows(X, start, stop), submitted)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate([np.asarray(f.result()) for f in futures])
+
+    def metrics(self):
+        """Pool size, task counts and time spent waiting for a thread"""
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "threads": self.threads,
+                "split_rows": self.split_rows,
+                "model_n_jobs": MODEL_N_JOBS,
+                "tasks": self._tasks,
+                "split_requests": self._split_requests,
+                "inline": self._inline,
+                "active": self._active,
+                "max_active": self._max_active,
+                "pool_wait_ms": {
+                    "p50": waits[len(waits) // 2] * 1000.0 if waits else 0.0,
+                    "max": waits[-1] * 1000.0 if waits else 0.0,
+                },
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def configure(threads=None, split_rows=None):
+    """Override the settings before the executor is first used (serve.py does this before forking)"""
+    global INFERENCE_THREADS, SPLIT_ROWS, _executor
+    with _executor_lock:
+        if threads is not None:
+            INFERENCE_THREADS = int(threads)
+        if split_rows is not None:
+            SPLIT_ROWS = int(split_rows)
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def get_executor():
+    """Get the process-wide executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = InferenceExecutor(INFERENCE_THREADS, SPLIT_ROWS)
+    return _executor
+
+
+def _reset_after_fork():
+    # Pool threads don't survive a fork; the child starts its own pool
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
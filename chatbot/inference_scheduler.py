@@ -0,0 +1,176 @@
+# chatbot/inference_scheduler.py
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from ml_interface import predict_many
+
+# Scheduler settings
+WINDOW_MS = float(os.environ.get("CHATBOT_MICROBATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.environ.get("CHATBOT_MICROBATCH_MAX_SIZE", "32"))
+# Longest scheduled_predict waits for its result, in seconds
+PREDICT_TIMEOUT = float(os.environ.get("CHATBOT_MICROBATCH_TIMEOUT", "30"))
+
+# Batch size histogram buckets (upper bounds, inclusive)
+_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[idx]
+
+
+class MicroBatchScheduler:
+    """
+    Collects prediction requests from many threads and runs them through one
+    batched model call. A batch is dispatched when `max_batch_size` requests
+    are queued or `window_ms` has passed since the oldest one arrived.
+    """
+
+    def __init__(self, predict_fn=predict_many, window_ms=WINDOW_MS, max_batch_size=MAX_BATCH_SIZE):
+        self.predict_fn = predict_fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        # Metrics
+        self._batches = 0
+        self._requests = 0
+        self._max_batch = 0
+        self._size_hist = {str(b): 0 for b in _SIZE_BUCKETS}
+        self._size_hist["inf"] = 0
+        self._delays = deque(maxlen=1000)
+        self._total_delay = 0.0
+
+        self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, record):
+        """Queue one record; returns a Future resolving to its prediction dict"""
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Scheduler is shut down")
+            self._queue.append((record, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def predict(self, record, timeout=None):
+        """Blocking helper with the same return shape as predict_from_model"""
+        try:
+            return self.submit(record).result(timeout=timeout)
+        except TimeoutError:
+            return {"success": False, "message": f"Prediction timed out after {timeout:g}s"}
+        except Exception as e:
+            return {"success": False, "message": f"Prediction error: {str(e)}"}
+
+    def _next_batch(self):
+        """Wait for the batch window to close and pop up to max_batch_size items"""
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if not self._queue:
+                return []
+
+            deadline = self._queue[0][2] + self.window
+            while len(self._queue) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            try:
+                results = list(self.predict_fn([record for record, _, _ in batch]))
+                if len(results) != len(batch):
+                    raise ValueError(f"predict_fn returned {len(results)} results for {len(batch)} records")
+            except Exception as e:
+                results = [{"success": False, "message": f"Prediction error: {str(e)}"}] * len(batch)
+
+            try:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            finally:
+                # Never leave a caller waiting on a future nobody will resolve
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Prediction was not completed"))
+
+            self._record(len(batch), [started - enqueued for _, _, enqueued in batch])
+
+    def _record(self, size, delays):
+        with self._cond:
+            self._batches += 1
+            self._requests += size
+            self._max_batch = max(self._max_batch, size)
+            bucket = next((str(b) for b in _SIZE_BUCKETS if size <= b), "inf")
+            self._size_hist[bucket] += 1
+            self._delays.extend(delays)
+            self._total_delay += sum(delays)
+
+    def metrics(self):
+        """Batch size and queueing delay statistics"""
+        with self._cond:
+            delays = sorted(self._delays)
+            return {
+                "window_ms": self.window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "queued": len(self._queue),
+                "batches": self._batches,
+                "requests": self._requests,
+                "avg_batch_size": (self._requests / self._batches) if self._batches else 0.0,
+                "max_observed_batch_size": self._max_batch,
+                "batch_size_histogram": dict(self._size_hist),
+                "queue_delay_ms": {
+                    "avg": (self._total_delay / self._requests * 1000.0) if self._requests else 0.0,
+                    "p50": _percentile(delays, 50) * 1000.0,
+                    "p99": _percentile(delays, 99) * 1000.0,
+                    "max": (delays[-1] * 1000.0) if delays else 0.0,
+                },
+            }
+
+    def shutdown(self):
+        """Stop accepting work; queued requests are still dispatched"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._worker.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Get the process-wide scheduler, starting it on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = MicroBatchScheduler()
+    return _scheduler
+
+
+def scheduled_predict(input_dict, timeout=PREDICT_TIMEOUT):
+    """
+    Drop-in replacement for predict_from_model that shares model calls with
+    other sessions predicting at the same moment
+    """
+    return get_scheduler().predict(input_dict, timeout=timeout)
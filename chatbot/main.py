@@ -1,10 +1,12 @@
 # chatbot/main.py
 import re
-import os
 import json
-from difflib import get_close_matches
 from datetime import datetime
-from model_handler import predict_from_model, load_model, load_dataset
+from model_handler import predict_from_model, load_model, load_neighbour_index
+from utils.history_manager import TRANSCRIPTS
+from slot_parser import fill_slots
+from alias_matcher import VARIABLE_ALIASES, get_matcher
+from category_resolver import get_resolver
 
 # FEATURES and categorical reference (case-sensitive)
 FEATURES = [
@@ -30,25 +32,23 @@ CATEGORIES = {
     "Complexity": ['Low', 'Medium', 'High'],
 }
 
-# history save dir
-HISTORY_DIR = os.path.join(os.path.dirname(__file__), "user_history")
-os.makedirs(HISTORY_DIR, exist_ok=True)
+# Completed transcripts go to rotating gzip segments in
+# history_manager.TRANSCRIPT_DIR (user_history/), expired by the janitor
 
 
 def save_history(session_id, conversation_history, user_state):
+    """Archive a completed transcript; returns its id (None on failure)"""
     try:
-        safe = re.sub(r'[^a-zA-Z0-9_-]', '_', str(session_id))
-        fname = os.path.join(HISTORY_DIR, f"{safe}_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json")
         payload = {
             "session_id": session_id,
             "timestamp": datetime.utcnow().isoformat(),
             "conversation_history": conversation_history,
             "user_state": user_state
         }
-        with open(fname, "w", encoding="utf-8") as fh:
-            json.dump(payload, fh, indent=2)
+        return TRANSCRIPTS.append(session_id, payload)
     except Exception as e:
         print(f"[main.save_history] {e}")
+        return None
 
 # ---------------- utility cleaners ----------------
 def extract_number_from_text(text):
@@ -89,21 +89,10 @@ def clean_user_value(value, expected_type, variable_name):
         if not options:
             # fallback: title-case the cleaned string
             return cleaned.title(), True, None
-        # exact match case-insensitive
-        for opt in options:
-            if cleaned.lower() == opt.lower():
-                return opt, True, None
-        # close match
-        lower_options = [o.lower() for o in options]
-        matches = get_close_matches(cleaned.lower(), lower_options, n=1, cutoff=0.6)
-        if matches:
-            idx = lower_options.index(matches[0])
-            return options[idx], True, None
-        # token containment
-        tokens = cleaned.lower().split()
-        for opt in options:
-            if any(tok in opt.lower() for tok in tokens):
-                return opt, True, None
+        # exact, synonym or close (typo) match
+        opt, _ = get_resolver(CATEGORIES).resolve(variable_name, cleaned)
+        if opt is not None:
+            return opt, True, None
         return None, False, f"Unrecognized. Expected one of: {', '.join(options)}"
     # fallback
     return val, True, None
@@ -112,43 +101,7 @@ def clean_user_value(value, expected_type, variable_name):
 def find_variable_by_mention(text):
     if not text:
         return None
-    t = text.lower()
-    mapping = {
-        "client_budget_min": "Client_Budget_Min",
-        "client budget min": "Client_Budget_Min",
-        "budget min": "Client_Budget_Min",
-        "min budget": "Client_Budget_Min",
-        "client_budget_max": "Client_Budget_Max",
-        "client budget max": "Client_Budget_Max",
-        "budget max": "Client_Budget_Max",
-        "skills": "Skills_Required",
-        "skills_required": "Skills_Required",
-        "skill": "Skills_Required",
-        "avg_past_bids": "Avg_Past_Bids",
-        "average past bids": "Avg_Past_Bids",
-        "avg past bids": "Avg_Past_Bids",
-        "location": "Location",
-        "client_history": "Client_History",
-        "client history": "Client_History",
-        "freelancer_success_rate": "Freelancer_Success_Rate",
-        "success rate": "Freelancer_Success_Rate",
-        "duration": "Duration_Days",
-        "duration_days": "Duration_Days",
-        "urgency": "Urgency",
-        "freelancer_exp_years": "Freelancer_Exp_Years",
-        "experience": "Freelancer_Exp_Years",
-        "complexity": "Complexity",
-        "num_bidders": "Num_Bidders",
-        "bidders": "Num_Bidders",
-        "number of bidders": "Num_Bidders",
-    }
-    for key, var in mapping.items():
-        if key in t:
-            return var
-    for feat in FEATURES:
-        if feat.lower() in t:
-            return feat
-    return None
+    return get_matcher(VARIABLE_ALIASES).best(text)
 
 def get_next_missing_variable(user_state):
     for feat in FEATURES:
@@ -171,49 +124,19 @@ def partial_prediction_hint(user_state, top_n=5):
     Use dataset to find matching rows for provided subset and, if model loaded, predict on them.
     Otherwise, return summary stats of numeric columns.
     """
-    df = load_dataset()
-    if df is None:
+    index = load_neighbour_index()
+    if index is None:
         return "Partial prediction not available (dataset missing)."
 
-    # build mask for categorical equality for those provided
-    mask = None
-    provided = {}
-    for k, v in user_state.items():
-        if v not in [None, ""] and k in CATEGORIES:
-            provided[k] = v
-            if k in df.columns:
-                cond = df[k].astype(str).str.lower() == str(v).lower()
-                mask = cond if mask is None else (mask & cond)
-
-    # for numeric provided, compute distance measure
-    numeric_provided = {}
-    for k, v in user_state.items():
-        if v not in [None, ""] and k not in CATEGORIES:
-            if k in df.columns:
-                try:
-                    numeric_provided[k] = float(v)
-                except:
-                    pass
-
-    filtered = df[mask] if mask is not None else df.copy()
-
-    if numeric_provided:
-        # compute euclidean-like distance on common numeric columns
-        common_nums = [c for c in numeric_provided.keys() if c in filtered.columns]
-        if common_nums:
-            import numpy as np
-            def row_dist(r):
-                s = 0.0
-                for c in common_nums:
-                    try:
-                        s += (float(r[c]) - numeric_provided[c])**2
-                    except:
-                        s += 0.0
-                return s
-            filtered['__dist'] = filtered.apply(row_dist, axis=1)
-            filtered = filtered.sort_values('__dist').drop(columns=['__dist'])
-    # limit
-    sample = filtered.head(top_n)
+    # categorical values select partitions; numeric values rank rows by
+    # standardized distance
+    categorical, numeric = index.split_filters(user_state)
+    categorical = {k: v for k, v in categorical.items() if k in CATEGORIES}
+    numeric = {k: v for k, v in numeric.items() if k not in CATEGORIES}
+
+    rows, _ = index.query(categorical, numeric, top_n)
+    sample = index.frame.iloc[rows]
+
     # If model available, run predictions on these rows (if relevant features exist)
     model = load_model()
     if model is not None:
@@ -302,6 +225,35 @@ def get_chatbot_response(user_input, user_state, awaiting_variable, conversation
         awaiting_variable = None
         return resp, user_state, awaiting_variable, conversation_history
 
+    # several variables in one message ("Web Dev, budget 2000-4000, 30 days")
+    slot_values, slot_errors = fill_slots(user_input, CATEGORIES, clean_user_value, VARIABLE_ALIASES)
+    if len(slot_values) + len(slot_errors) > 1:
+        user_state.update(slot_values)
+        parts = []
+        if slot_values:
+            parts.append("Got it. " + ", ".join(f"{k} = {v}" for k, v in slot_values.items()))
+        parts += [f"I couldn't understand that for {k}. {msg}" for k, msg in slot_errors.items()]
+        ack = "\n".join(parts)
+        conversation_history.append({"role": "bot", "message": ack, "timestamp": datetime.utcnow().isoformat()})
+        next_var = next(iter(slot_errors), None) or get_next_missing_variable(user_state)
+        awaiting_variable = next_var
+        if next_var:
+            prompt = f"Now, please enter value for {next_var}:"
+            conversation_history.append({"role": "bot", "message": prompt, "timestamp": datetime.utcnow().isoformat()})
+            return f"{ack}\n{prompt}", user_state, awaiting_variable, conversation_history
+        model_input = {f: user_state.get(f) for f in FEATURES}
+        res = predict_from_model(model_input)
+        if res.get("success"):
+            resp = f"All inputs received. Predicted output: {res.get('prediction')}"
+        else:
+            resp = f"Prediction failed: {res.get('message')}"
+        conversation_history.append({"role": "bot", "message": resp, "timestamp": datetime.utcnow().isoformat()})
+        save_history(session_id=datetime.utcnow().strftime("%Y%m%dT%H%M%S"), conversation_history=conversation_history, user_state=user_state)
+        for f in FEATURES:
+            user_state[f] = ""
+        awaiting_variable = None
+        return f"{ack}\n{resp}", user_state, awaiting_variable, conversation_history
+
     # detect if user explicitly mentions a variable
     mentioned = find_variable_by_mention(user_input)
     is_plain_number = re.fullmatch(r'\s*-?\d+(\.\d+)?\s*', user_input.strip()) is not None
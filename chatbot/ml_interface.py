@@ -1,40 +1,182 @@
 # chatbot/ml_interface.py
+import functools
 import os
-import joblib
-import pandas as pd
+import threading
+import time
 import numpy as np
+from model_artifact import read_manifest
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from aggregate_cube import file_checksum
+from dataset_cache import load_dataset_cached
+# pandas, joblib/sklearn and the dataset indexes are imported where they are
+# first used, so importing this module (and binding the port) stays cheap
 
 # Paths
 BASE_DIR = os.path.dirname(__file__)
 MODEL_PATH = os.path.join(BASE_DIR, "..", "models", "model_pipeline.pkl")
 CSV_PATH = os.path.join(BASE_DIR, "..", "models", "freelance_bids_dataset_10000.csv")
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+
+# Memory-mapped copy of the pickle (tools/convert_model.py); used instead of
+# the pickle while it is current. Empty disables it.
+MODEL_ARTIFACT_DIR = os.environ.get("CHATBOT_MODEL_ARTIFACT", os.path.join(BASE_DIR, "..", "models", "model_flat"))
+
+# Seconds between checks for a new model on disk (0 disables hot reload)
+MODEL_RELOAD_INTERVAL = float(os.environ.get("CHATBOT_MODEL_RELOAD_INTERVAL", "5"))
+
+# Parse the CSV once into a typed, memory-mapped column cache in CACHE_DIR
+# ("0" reads the CSV every time)
+DATASET_CACHE = os.environ.get("CHATBOT_DATASET_CACHE", "1") != "0"
+
+# Categorical model inputs; every other feature is numeric
+CATEGORICAL_FEATURES = ["Skills_Required", "Location", "Client_History", "Urgency", "Complexity"]
+
+# Feature list used when neither the model nor its manifest is available
+DEFAULT_FEATURES = [
+    "Client_Budget_Min",
+    "Client_Budget_Max",
+    "Skills_Required",
+    "Avg_Past_Bids",
+    "Location",
+    "Client_History",
+    "Freelancer_Success_Rate",
+    "Duration_Days",
+    "Urgency",
+    "Freelancer_Exp_Years",
+    "Complexity",
+    "Num_Bidders"
+]
+
+# Known-good input a newly loaded model must predict a finite value for
+# before it replaces the current one
+PROBE_RECORD = {
+    "Client_Budget_Min": 1000,
+    "Client_Budget_Max": 3000,
+    "Skills_Required": "Web Dev",
+    "Avg_Past_Bids": 12,
+    "Location": "USA",
+    "Client_History": "Repeat",
+    "Freelancer_Success_Rate": 0.85,
+    "Duration_Days": 30,
+    "Urgency": "High",
+    "Freelancer_Exp_Years": 5,
+    "Complexity": "Medium",
+    "Num_Bidders": 10
+}
+
+# Inference backend: "sklearn" (the pickled regressor), or the flattened
+# NumPy tree engine in float64 ("flat") or float32 ("flat32") mode
+INFERENCE_BACKENDS = ["sklearn", "flat", "flat32"]
+INFERENCE_BACKEND = os.environ.get("CHATBOT_INFERENCE_BACKEND", "sklearn")
+
+# Prediction result cache (size 0 disables it)
+PREDICTION_CACHE_SIZE = int(os.environ.get("CHATBOT_PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_TTL = float(os.environ.get("CHATBOT_PREDICTION_CACHE_TTL", "600"))
 
 # Global variables for caching
-_model = None
+_registry = None
 _dataset = None
-_feature_order = None
+_dataset_index = None
+_aggregate_cube = None
+_neighbour_index = None
 
-def load_model():
-    """Load the ML model from pickle file"""
-    global _model, _feature_order
-    if _model is not None:
-        return _model
-    
-    if not os.path.exists(MODEL_PATH):
-        print(f"[ml_interface] Model file not found at: {MODEL_PATH}")
-        return None
-    
+# Held while loading so a request arriving during warm-up waits for the load
+# in progress instead of starting a second one
+_load_lock = threading.RLock()
+
+# Background warm-up state (see start_warmup)
+_warmup_thread = None
+_warmup = {"state": "idle", "started_at": None, "seconds": None, "error": None}
+
+def _serialized(loader):
+    """Run a loader under the load lock"""
+    @functools.wraps(loader)
+    def wrapper(*args, **kwargs):
+        with _load_lock:
+            return loader(*args, **kwargs)
+    return wrapper
+
+def _validate_version(candidate, current):
+    """
+    Smoke test for a newly loaded model before it is swapped in
+    Returns an error message, or None if it may serve
+    """
+    features = candidate.features or get_model_features()
+    if current is not None and current.features and set(features) != set(current.features):
+        return "its input features differ from the running model's; restart to deploy it"
     try:
-        _model = joblib.load(MODEL_PATH)
-        # Try to get feature order from the model
-        _feature_order = getattr(_model, "feature_names_in_", None)
-        print(f"[ml_interface] Model loaded successfully")
-        return _model
+        # Also builds the forest for the active backend before the swap
+        value = candidate.predict_one({f: PROBE_RECORD.get(f) for f in features}, INFERENCE_BACKEND)
     except Exception as e:
-        print(f"[ml_interface] Failed to load model: {e}")
-        _model = None
+        return f"smoke prediction failed: {e}"
+    if not np.isfinite(value):
+        return f"smoke prediction is not finite ({value})"
+    return None
+
+def get_registry():
+    """The process-wide model registry (created on first use)"""
+    global _registry
+    if _registry is None:
+        with _load_lock:
+            if _registry is None:
+                _registry = ModelRegistry(MODEL_PATH, MODEL_ARTIFACT_DIR, validate=_validate_version,
+                                          interval=MODEL_RELOAD_INTERVAL)
+    return _registry
+
+def _loaded_version():
+    """The current model version, without creating the registry or loading anything"""
+    return _registry.peek() if _registry is not None else None
+
+def get_model_version():
+    """Id of the model serving new requests, without loading it (None until loaded)"""
+    version = _loaded_version()
+    return version.version_id if version is not None else None
+
+def start_model_watcher():
+    """Start checking for new model files in the background, once per process"""
+    return get_registry().start_watcher()
+
+def get_model_stats():
+    """Current model version and hot-reload counters"""
+    return get_registry().stats()
+
+_prediction_cache = PredictionCache(
+    max_size=PREDICTION_CACHE_SIZE,
+    ttl_seconds=PREDICTION_CACHE_TTL,
+    signature_fn=get_model_version,
+)
+
+def get_prediction_cache_stats():
+    """Hit/miss counters of the prediction cache"""
+    return _prediction_cache.stats()
+
+def set_inference_backend(name):
+    """Switch between the sklearn and flattened tree backends at runtime"""
+    global INFERENCE_BACKEND
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name}. Expected one of: {', '.join(INFERENCE_BACKENDS)}")
+    INFERENCE_BACKEND = name
+    version = _loaded_version()
+    if version is not None:
+        version.forest(name)
+    # float32 results differ slightly, so don't serve answers from another backend
+    _prediction_cache.clear()
+
+def get_inference_backend():
+    """Name of the backend actually serving predictions"""
+    version = _loaded_version()
+    return version.backend_name(INFERENCE_BACKEND) if version is not None else "sklearn"
+
+def load_model():
+    """Load the ML model (the memory-mapped artifact or the pickle) once"""
+    version = get_registry().current()
+    if version is None:
         return None
+    version.forest(INFERENCE_BACKEND)
+    return version.model
 
+@_serialized
 def load_dataset():
     """Load the dataset from CSV file"""
     global _dataset
@@ -45,7 +187,16 @@ def load_dataset():
         print(f"[ml_interface] Dataset file not found at: {CSV_PATH}")
         return None
     
+    if DATASET_CACHE:
+        try:
+            _dataset = load_dataset_cached(CSV_PATH, CACHE_DIR)
+            print(f"[ml_interface] Dataset loaded from typed cache with {len(_dataset)} rows")
+            return _dataset
+        except Exception as e:
+            print(f"[ml_interface] Dataset cache unavailable, parsing CSV: {e}")
+    
     try:
+        import pandas as pd
         _dataset = pd.read_csv(CSV_PATH)
         print(f"[ml_interface] Dataset loaded successfully with {len(_dataset)} rows")
         return _dataset
@@ -57,141 +208,288 @@ def load_dataset():
 def get_model_features():
     """
     Get list of model input variables
-    Returns list of feature names
-    """
-    model = load_model()
-    if model is None:
-        # Fallback to common features if model not available
-        return [
-            "Client_Budget_Min",
-            "Client_Budget_Max", 
-            "Skills_Required",
-            "Avg_Past_Bids",
-            "Location",
-            "Client_History",
-            "Freelancer_Success_Rate",
-            "Duration_Days",
-            "Urgency",
-            "Freelancer_Exp_Years",
-            "Complexity",
-            "Num_Bidders"
-        ]
-    
-    # Try to get feature names from model
-    if hasattr(model, 'feature_names_in_'):
-        return list(model.feature_names_in_)
-    elif hasattr(model, 'get_feature_names'):
-        return list(model.get_feature_names())
-    else:
-        # Fallback
-        return [
-            "Client_Budget_Min",
-            "Client_Budget_Max",
-            "Skills_Required", 
-            "Avg_Past_Bids",
-            "Location",
-            "Client_History",
-            "Freelancer_Success_Rate",
-            "Duration_Days",
-            "Urgency",
-            "Freelancer_Exp_Years",
-            "Complexity",
-            "Num_Bidders"
-        ]
+    Returns list of feature names, without loading the model: from the
+    loaded model if there is one, else the artifact manifest, else the defaults
+    """
+    version = _loaded_version()
+    if version is not None:
+        if version.features is not None:
+            return version.features
+        if hasattr(version.model, 'get_feature_names'):
+            return list(version.model.get_feature_names())
+    manifest = read_manifest(MODEL_ARTIFACT_DIR) if MODEL_ARTIFACT_DIR else None
+    if manifest and manifest.get("feature_names"):
+        return list(manifest["feature_names"])
+    return list(DEFAULT_FEATURES)
+
+def _model_features(version):
+    """Feature names in the order `version` expects"""
+    return version.features if version.features is not None else get_model_features()
 
 def predict_from_model(input_dict):
     """
     Make prediction using the loaded model
     input_dict: dictionary with feature names as keys and values
-    Returns: dict with 'success', 'prediction' or 'message'
+    Returns: dict with 'success', 'prediction' and 'model_version', or 'message'
     """
-    model = load_model()
-    if model is None:
+    # One version for the whole request, even if a reload lands meanwhile
+    version = get_registry().current()
+    if version is None:
         return {"success": False, "message": "Model not available"}
-    
+
+    # Canonicalize complete inputs so equivalent requests share a cache entry;
+    # incomplete ones go straight to the model to get its error message
+    features = _model_features(version)
+    row, _ = _validate_record(input_dict, features)
+    if row is None:
+        return _predict_one(version, input_dict)
+
+    key = (version.version_id,) + tuple(row[f] for f in features)
+    cached = _prediction_cache.get(key)
+    if cached is not None:
+        return {"success": True, "prediction": cached, "model_version": version.version_id}
+
+    result = _predict_one(version, row)
+    if result["success"]:
+        _prediction_cache.put(key, result["prediction"])
+    return result
+
+def _predict_one(version, input_dict):
+    """Uncached single-row prediction"""
     try:
-        # Create DataFrame from input dictionary
-        df = pd.DataFrame([input_dict])
-        
-        # Reorder columns if model expects specific order
-        if _feature_order is not None:
-            available_features = [f for f in _feature_order if f in df.columns]
-            df = df[available_features]
-        
-        # Make prediction
-        prediction = model.predict(df)
-        
-        # Handle different prediction formats
-        if hasattr(prediction, '__len__') and len(prediction) > 0:
-            pred_value = prediction[0]
-        else:
-            pred_value = prediction
-        
-        return {"success": True, "prediction": float(pred_value)}
-        
+        pred_value = version.predict_one(input_dict, INFERENCE_BACKEND)
+        return {"success": True, "prediction": pred_value, "model_version": version.version_id}
     except Exception as e:
         return {"success": False, "message": f"Prediction error: {str(e)}"}
 
+def _validate_record(record, features):
+    """
+    Check one record against the feature schema
+    Returns: (row_dict, error_message)
+    """
+    if not isinstance(record, dict):
+        return None, "Record must be an object of feature values"
+
+    missing = [f for f in features if record.get(f) in [None, ""]]
+    if missing:
+        return None, f"Missing features: {', '.join(missing)}"
+
+    row = {}
+    for feature in features:
+        value = record[feature]
+        if feature in CATEGORICAL_FEATURES:
+            if not isinstance(value, str) or not value.strip():
+                return None, f"{feature} must be a non-empty string"
+            row[feature] = value.strip()
+        else:
+            try:
+                num = float(value)
+            except (TypeError, ValueError):
+                return None, f"{feature} must be numeric"
+            if not np.isfinite(num):
+                return None, f"{feature} must be a finite number"
+            row[feature] = num
+    return row, None
+
+def predict_many(records):
+    """
+    Make predictions for many records with a single model call
+    records: list of dictionaries with feature names as keys
+    Returns: list of dicts (one per record, same order) with 'success',
+    'prediction' and 'model_version', or 'message'
+    """
+    version = get_registry().current()
+    if version is None:
+        return [{"success": False, "message": "Model not available"} for _ in records]
+
+    features = _model_features(version)
+    results = [None] * len(records)
+    rows, positions, keys = [], [], []
+    for i, record in enumerate(records):
+        row, error = _validate_record(record, features)
+        if error:
+            results[i] = {"success": False, "message": error}
+            continue
+        key = (version.version_id,) + tuple(row[f] for f in features)
+        cached = _prediction_cache.get(key)
+        if cached is not None:
+            results[i] = {"success": True, "prediction": cached, "model_version": version.version_id}
+        else:
+            rows.append(row)
+            positions.append(i)
+            keys.append(key)
+
+    if not rows:
+        return results
+
+    import pandas as pd
+    try:
+        if version.encoder is not None:
+            predictions = version.predict_encoded(version.encoder.encode_many(rows), INFERENCE_BACKEND)
+        else:
+            predictions = version.predict_frame(pd.DataFrame(rows, columns=features))
+        for i, key, pred_value in zip(positions, keys, predictions):
+            results[i] = {"success": True, "prediction": float(pred_value), "model_version": version.version_id}
+            _prediction_cache.put(key, float(pred_value))
+    except Exception:
+        # One row the pipeline rejects (e.g. an unknown ordinal level) fails the
+        # whole vectorized call, so fall back to isolating the bad rows
+        for i, key, row in zip(positions, keys, rows):
+            try:
+                pred_value = version.predict_frame(pd.DataFrame([row], columns=features))[0]
+                results[i] = {"success": True, "prediction": float(pred_value), "model_version": version.version_id}
+                _prediction_cache.put(key, float(pred_value))
+            except Exception as e:
+                results[i] = {"success": False, "message": f"Prediction error: {str(e)}"}
+
+    return results
+
+@_serialized
+def load_dataset_index():
+    """Build (once) the query index used for suggestions"""
+    global _dataset_index
+    if _dataset_index is not None:
+        return _dataset_index
+
+    dataset = load_dataset()
+    if dataset is None:
+        return None
+
+    try:
+        from dataset_index import DatasetIndex
+        _dataset_index = DatasetIndex(dataset)
+        return _dataset_index
+    except Exception as e:
+        print(f"[ml_interface] Failed to build dataset index: {e}")
+        return None
+
+@_serialized
+def load_aggregate_cube():
+    """
+    Load the precomputed statistics cube for the dataset, building and
+    persisting it on first use (keyed by the CSV checksum)
+    """
+    global _aggregate_cube
+    if _aggregate_cube is not None:
+        return _aggregate_cube
+
+    if not os.path.exists(CSV_PATH):
+        return None
+
+    try:
+        from aggregate_cube import AggregateCube
+        checksum = file_checksum(CSV_PATH)
+        cube_path = os.path.join(CACHE_DIR, f"aggregate_cube_{checksum[:16]}.pkl")
+        cube = AggregateCube.load(cube_path, checksum)
+        if cube is None:
+            index = load_dataset_index()
+            if index is None:
+                return None
+            cube = AggregateCube.build(index, checksum)
+            try:
+                cube.save(cube_path)
+            except OSError as e:
+                print(f"[ml_interface] Could not persist aggregate cube: {e}")
+        _aggregate_cube = cube
+        return _aggregate_cube
+    except Exception as e:
+        print(f"[ml_interface] Failed to build aggregate cube: {e}")
+        return None
+
 def suggest_outcomes(partial_input_dict):
     """
     Use dataset to suggest possible outcomes based on partial inputs
     partial_input_dict: dictionary with some feature values
     Returns: string with suggestions
     """
-    dataset = load_dataset()
-    if dataset is None:
+    index = load_dataset_index()
+    if index is None:
         return "Dataset not available for suggestions"
     
     try:
-        # Filter dataset based on categorical matches
-        filtered_df = dataset.copy()
+        # Categorical values match exactly (case-insensitive), numerics within 20%
+        categorical, numeric = index.parse_filters(partial_input_dict)
         
-        # Apply categorical filters
-        for feature, value in partial_input_dict.items():
-            if feature in dataset.columns and value is not None:
-                if dataset[feature].dtype == 'object':  # Categorical
-                    filtered_df = filtered_df[filtered_df[feature].astype(str).str.lower() == str(value).lower()]
-                else:  # Numeric - find similar values
-                    try:
-                        num_value = float(value)
-                        # Find values within 20% range
-                        tolerance = abs(num_value) * 0.2
-                        filtered_df = filtered_df[
-                            (filtered_df[feature] >= num_value - tolerance) & 
-                            (filtered_df[feature] <= num_value + tolerance)
-                        ]
-                    except:
-                        continue
+        # Categorical-only filters are answered from precomputed statistics;
+        # numeric ranges refine the rows of the matching categorical cell
+        cube = load_aggregate_cube() if not numeric else None
+        if cube is not None:
+            selection = cube.lookup(categorical)
+        else:
+            selection = index.select(categorical, numeric)
         
-        if len(filtered_df) == 0:
+        if selection is None or selection.count == 0:
             return "No similar records found in dataset"
         
-        # Get statistics for numeric columns
-        numeric_cols = filtered_df.select_dtypes(include=[np.number]).columns
         suggestions = []
         
-        if len(numeric_cols) > 0:
-            stats = filtered_df[numeric_cols].describe()
-            for col in numeric_cols[:5]:  # Limit to first 5 numeric columns
-                mean_val = stats.loc['mean', col]
-                suggestions.append(f"{col}: avg {mean_val:.2f}")
+        # Averages of the first 5 numeric columns
+        for col, mean_val in selection.column_means(index.numeric_cols[:5]):
+            suggestions.append(f"{col}: avg {mean_val:.2f}")
         
-        # Get most common categorical values
-        categorical_cols = filtered_df.select_dtypes(include=['object']).columns
-        for col in categorical_cols[:3]:  # Limit to first 3 categorical columns
-            if col in filtered_df.columns:
-                most_common = filtered_df[col].value_counts().head(3)
-                if len(most_common) > 0:
-                    suggestions.append(f"{col}: {', '.join([f'{val}({count})' for val, count in most_common.items()])}")
+        # Most common values of the first 3 categorical columns
+        for col in index.categorical_cols[:3]:
+            most_common = selection.top_values(col, 3)
+            if len(most_common) > 0:
+                suggestions.append(f"{col}: {', '.join([f'{val}({count})' for val, count in most_common])}")
         
         if suggestions:
-            return f"Based on {len(filtered_df)} similar records: " + "; ".join(suggestions)
+            return f"Based on {selection.count} similar records: " + "; ".join(suggestions)
         else:
-            return f"Found {len(filtered_df)} similar records but no clear patterns"
+            return f"Found {selection.count} similar records but no clear patterns"
             
     except Exception as e:
         return f"Error generating suggestions: {str(e)}"
 
+@_serialized
+def load_neighbour_index():
+    """Build (once) the similar-project index"""
+    global _neighbour_index
+    if _neighbour_index is not None:
+        return _neighbour_index
+
+    dataset = load_dataset()
+    if dataset is None:
+        return None
+
+    try:
+        from neighbour_index import NeighbourIndex
+        _neighbour_index = NeighbourIndex(dataset)
+        return _neighbour_index
+    except Exception as e:
+        print(f"[ml_interface] Failed to build neighbour index: {e}")
+        return None
+
+def find_comparables(partial_input_dict, k=5):
+    """
+    Find the k most similar historical projects
+    Categorical values must match; numeric values rank rows by standardized distance
+    Returns: list of dicts with the project's features, 'Final_Bid', 'predicted_bid' and 'distance'
+    """
+    index = load_neighbour_index()
+    if index is None:
+        return []
+
+    categorical, numeric = index.split_filters(partial_input_dict)
+    rows, distances = index.query(categorical, numeric, k)
+    if len(rows) == 0:
+        return []
+
+    records = index.frame.iloc[rows].to_dict("records")
+    version = get_registry().current()
+    features = _model_features(version) if version is not None else []
+    predictions = predict_many([{f: r.get(f) for f in features} for r in records]) if features else []
+
+    comparables = []
+    for i, (record, distance) in enumerate(zip(records, distances)):
+        item = {key: (value.item() if hasattr(value, "item") else value) for key, value in record.items()}
+        item["distance"] = float(distance)
+        predicted = predictions[i] if predictions and predictions[i]["success"] else None
+        item["predicted_bid"] = predicted["prediction"] if predicted else None
+        item["model_version"] = predicted["model_version"] if predicted else None
+        comparables.append(item)
+    return comparables
+
 def get_dataset_sample(n=5):
     """
     Get a sample of the dataset for reference
@@ -201,3 +499,47 @@ def get_dataset_sample(n=5):
         return None
     
     return dataset.head(n).to_dict('records')
+
+def warm_up():
+    """
+    Load the model, the dataset and its lookup indexes
+    Returns True when the model and dataset are both available
+    """
+    _warmup.update(state="loading", started_at=time.time(), error=None)
+    started = time.perf_counter()
+    try:
+        load_model()
+        if load_dataset() is not None:
+            load_dataset_index()
+            load_aggregate_cube()
+            load_neighbour_index()
+    except Exception as e:
+        print(f"[ml_interface] Warm-up failed: {e}")
+        _warmup["error"] = str(e)
+    _warmup["seconds"] = round(time.perf_counter() - started, 3)
+    _warmup["state"] = "ready" if is_ready() else "failed"
+    return is_ready()
+
+def start_warmup():
+    """Run warm_up() in a background thread, once per process"""
+    global _warmup_thread
+    with _load_lock:
+        if _warmup_thread is None:
+            _warmup["state"] = "pending"
+            _warmup_thread = threading.Thread(target=warm_up, name="model-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+def is_ready():
+    """True once the model and the dataset are loaded"""
+    return _loaded_version() is not None and _dataset is not None
+
+def get_readiness():
+    """Readiness details for /readyz"""
+    return {
+        "ready": is_ready(),
+        "model": _loaded_version() is not None,
+        "model_version": get_model_version(),
+        "dataset": _dataset is not None,
+        "warmup": dict(_warmup),
+    }
@@ -0,0 +1,154 @@
+# chatbot/model_artifact.py
+"""
+Memory-mapped model artifact.
+
+The fitted pipeline is stored as a directory of raw .npy node tables (the
+flattened forest, see forest_engine.FlatForest) and a JSON manifest holding
+the compiled feature encoder. Loading maps the arrays read-only with
+np.load(mmap_mode="r") instead of unpickling, so start-up parses and copies
+nothing, and every process that opens the artifact (serve.py workers, batch
+jobs) reads the same pages from the page cache.
+
+Build one from the pickle with tools/convert_model.py.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from aggregate_cube import file_checksum
+from feature_encoder import FeatureEncoder, compile_pipeline
+from forest_engine import FlatForest
+
+ARTIFACT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+# Leaf / threshold precisions written by default: float64 reproduces sklearn
+# exactly, float32 serves the "flat32" backend
+DTYPES = {"float64": np.float64, "float32": np.float32}
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def read_manifest(directory):
+    """Parsed manifest of an artifact directory, or None if there isn't one"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def artifact_is_current(directory, source_path):
+    """
+    True when the artifact exists and was built from the pickle at
+    source_path (or the pickle isn't deployed at all). Size and mtime are
+    compared first; the checksum only when they differ, e.g. after a copy.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None or manifest.get("format") != ARTIFACT_FORMAT:
+        return False
+    source = manifest.get("source") or {}
+    try:
+        stamp = _source_stamp(source_path)
+    except OSError:
+        return True
+    if stamp["size"] != source.get("size"):
+        return False
+    if stamp["mtime_ns"] == source.get("mtime_ns"):
+        return True
+    return file_checksum(source_path) == source.get("sha256")
+
+
+class MappedModel:
+    """
+    Stand-in for the fitted pipeline, backed by a memory-mapped artifact.
+    feature_names_in_ and predict(DataFrame) behave like the pipeline's.
+    """
+
+    def __init__(self, directory, manifest, mmap_mode="r"):
+        self.directory = directory
+        self.manifest = manifest
+        self.mmap_mode = mmap_mode
+        self.encoder = FeatureEncoder(manifest["encoder"]["fields"], manifest["encoder"]["n_outputs"])
+        self.feature_names_in_ = np.asarray(manifest["feature_names"], dtype=object)
+        self._forests = {}
+
+    @property
+    def dtypes(self):
+        return list(self.manifest["dtypes"])
+
+    def forest(self, dtype=np.float64):
+        """FlatForest over the mapped node tables for one precision"""
+        name = np.dtype(dtype).name
+        if name not in self._forests:
+            if name not in self.manifest["dtypes"]:
+                raise ValueError(f"Artifact has no {name} tables (has: {', '.join(self.dtypes)})")
+            self._forests[name] = FlatForest.load(
+                self.directory, self.manifest["max_depth"], self.manifest["n_features"],
+                dtype=dtype, mmap_mode=self.mmap_mode,
+            )
+        return self._forests[name]
+
+    def predict(self, X):
+        """Predict for a DataFrame (or list of feature dicts) with the float64 tables"""
+        records = X.to_dict("records") if hasattr(X, "to_dict") else list(X)
+        return self.forest(np.float64).predict(self.encoder.encode_many(records))
+
+
+def load_artifact(directory, mmap_mode="r"):
+    """Open an artifact directory; raises ValueError if it isn't a usable one"""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"No model artifact at {directory}")
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported model artifact format {manifest.get('format')}")
+    return MappedModel(directory, manifest, mmap_mode=mmap_mode)
+
+
+def save_artifact(pipeline, directory, source_path=None, dtypes=tuple(DTYPES)):
+    """
+    Flatten a fitted (ColumnTransformer, forest) pipeline into `directory`.
+    The artifact is written next to it and swapped in with a rename, so
+    processes that already mapped the previous version keep working.
+    Returns: the manifest
+    """
+    encoder, regressor = compile_pipeline(pipeline)
+    feature_names = getattr(pipeline, "feature_names_in_", None)
+    if feature_names is None:
+        feature_names = encoder.features
+
+    directory = os.path.normpath(directory)
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    shape = {}
+    for name in dtypes:
+        shape = FlatForest.from_estimator(regressor, dtype=DTYPES[name]).save(tmp)
+
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "feature_names": [str(f) for f in feature_names],
+        "dtypes": list(dtypes),
+        "max_depth": shape["max_depth"],
+        "n_features": shape["n_features"],
+        "n_trees": len(regressor.estimators_),
+        "encoder": {"fields": encoder.fields, "n_outputs": encoder.n_outputs},
+        "source": None,
+    }
+    if source_path is not None:
+        manifest["source"] = dict(_source_stamp(source_path), sha256=file_checksum(source_path))
+    with open(os.path.join(tmp, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old = f"{directory}.old-{os.getpid()}"
+    if os.path.exists(directory):
+        os.rename(directory, old)
+    os.rename(tmp, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
@@ -1,61 +1,32 @@
 # chatbot/model_handler.py
-import os
-import joblib
-import pandas as pd
+import ml_interface
 
-BASE_DIR = os.path.dirname(__file__)
-MODEL_PATH = os.path.join(BASE_DIR, "models", "model_pipeline.pkl")
-CSV_PATH = os.path.join(BASE_DIR, "models", "freelance_bids_dataset_10000.csv")
-
-_model = None
-_feature_order = None
+# The dataset lives next to the model, in <repo>/models
+CSV_PATH = ml_interface.CSV_PATH
 
 def load_model():
-    global _model, _feature_order
-    if _model is not None:
-        return _model
-    if not os.path.exists(MODEL_PATH):
-        _model = None
-        return None
-    try:
-        _model = joblib.load(MODEL_PATH)
-        # Try to infer feature order
-        _feature_order = getattr(_model, "feature_names_in_", None)
-        return _model
-    except Exception as e:
-        print(f"[model_handler] Failed to load model: {e}")
-        _model = None
-        return None
+    """The model from the registry shared with the web app (loaded once)"""
+    version = ml_interface.get_registry().current()
+    return version.model if version is not None else None
 
 def predict_from_model(input_dict):
     """
     input_dict: {feature_name: value}
-    Returns: dict with keys 'success' (bool), 'prediction' or 'message'
+    Returns: dict with keys 'success' (bool), 'prediction' and 'model_version', or 'message'
     """
-    model = load_model()
-    if model is None:
+    version = ml_interface.get_registry().current()
+    if version is None:
         return {"success": False, "message": "Model not found."}
     try:
-        import pandas as pd
-        df = pd.DataFrame([input_dict])
-        # reorder if model expects certain order
-        if _feature_order is not None:
-            cols = [c for c in _feature_order if c in df.columns]
-            df = df[cols]
-        pred = model.predict(df)
-        if hasattr(pred, "__len__"):
-            pred_val = pred[0]
-        else:
-            pred_val = pred
-        return {"success": True, "prediction": pred_val}
+        pred_val = version.predict_one(input_dict, ml_interface.INFERENCE_BACKEND)
+        return {"success": True, "prediction": pred_val, "model_version": version.version_id}
     except Exception as e:
         return {"success": False, "message": f"Prediction error: {e}"}
 
 def load_dataset():
-    if os.path.exists(CSV_PATH):
-        try:
-            return pd.read_csv(CSV_PATH)
-        except Exception as e:
-            print(f"[model_handler] Failed to load CSV: {e}")
-            return None
-    return None
+    """The dataset frame shared with the web app (loaded once, from the typed column cache when possible)"""
+    return ml_interface.load_dataset()
+
+def load_neighbour_index():
+    """Similar-project index shared with the web app (built once, at warm-up under the app)"""
+    return ml_interface.load_neighbour_index()
@@ -0,0 +1,291 @@
+# chatbot/model_registry.py
+"""
+Single owner of the loaded model, shared by ml_interface and model_handler.
+
+A ModelVersion is one loaded model (the pickled pipeline or the
+memory-mapped artifact) with its compiled encoder and flattened forests; it
+never changes once published. Callers take the current version once per
+request and use it throughout, so a reload never swaps the model under a
+request in flight: it only changes which version the next request gets.
+
+The watcher thread polls the pickle and the artifact manifest (mtime and
+size). A change is loaded once it has stayed the same for a full poll
+interval (so a file still being copied isn't picked up), checked by the
+`validate` callback with a smoke prediction, and swapped in. A version that
+fails to load or validate is logged and the current one keeps serving.
+"""
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from aggregate_cube import file_checksum
+from feature_encoder import compile_pipeline, UnsupportedPipelineError
+from forest_engine import FlatForest
+from inference_executor import get_executor, pin_n_jobs
+from model_artifact import MappedModel, MANIFEST_NAME, artifact_is_current, load_artifact
+
+
+class ModelVersion:
+    """
+    One loaded model. version_id is the first 12 hex digits of the pickle's
+    sha256 (an artifact carries the checksum of the pickle it was built from).
+    """
+
+    def __init__(self, version_id, model, source, encoder=None, regressor=None):
+        self.version_id = version_id
+        self.model = model
+        self.source = source  # "artifact" or "pickle"
+        self.encoder = encoder
+        self.regressor = regressor
+        self.feature_order = getattr(model, "feature_names_in_", None)
+        self.loaded_at = datetime.utcnow().isoformat()
+        self._forests = {}
+        self._lock = threading.Lock()
+
+    @property
+    def features(self):
+        """Feature names in the order the model expects, or None if it doesn't say"""
+        return list(self.feature_order) if self.feature_order is not None else None
+
+    def _build_forest(self, backend):
+        dtype = np.float32 if backend == "flat32" else np.float64
+        if isinstance(self.model, MappedModel):
+            # There's no sklearn regressor behind an artifact; its float64
+            # tables give the same predictions
+            try:
+                return self.model.forest(dtype)
+            except ValueError as e:
+                print(f"[model_registry] {e}; using float64 tables")
+                return self.model.forest(np.float64)
+        if backend == "sklearn" or self.regressor is None:
+            return None
+        try:
+            return FlatForest.from_estimator(self.regressor, dtype=dtype)
+        except Exception as e:
+            print(f"[model_registry] Flat tree engine unavailable, using sklearn: {e}")
+            return None
+
+    def forest(self, backend):
+        """Flattened forest serving `backend` (built once), or None for the sklearn regressor"""
+        if backend not in self._forests:
+            with self._lock:
+                if backend not in self._forests:
+                    self._forests[backend] = self._build_forest(backend)
+        return self._forests[backend]
+
+    def backend_name(self, backend):
+        """Name of the engine that actually serves `backend`"""
+        forest = self.forest(backend)
+        if forest is None:
+            return "sklearn"
+        return "flat32" if forest.dtype == np.float32 else "flat"
+
+    def predict_encoded(self, X, backend):
+        """Run encoded rows through the engine serving `backend` on the inference pool"""
+        forest = self.forest(backend)
+        engine = forest if forest is not None else self.regressor
+        return get_executor().run(engine.predict, X)
+
+    def predict_frame(self, frame):
+        """Run a DataFrame through the full model on the inference pool"""
+        return get_executor().run(self.model.predict, frame)
+
+    def predict_one(self, record, backend):
+        """Prediction for one feature dict; bad input raises the full pipeline's error"""
+        if self.encoder is not None:
+            try:
+                return float(self.predict_encoded(self.encoder.encode(record).reshape(1, -1), backend)[0])
+            except Exception:
+                pass  # let the full pipeline produce the canonical error
+
+        import pandas as pd
+        frame = pd.DataFrame([record])
+        if self.feature_order is not None:
+            frame = frame[[f for f in self.feature_order if f in frame.columns]]
+        prediction = self.predict_frame(frame)
+        if hasattr(prediction, "__len__") and len(prediction) > 0:
+            return float(prediction[0])
+        return float(prediction)
+
+    def describe(self):
+        return {"version": self.version_id, "source": self.source, "loaded_at": self.loaded_at}
+
+
+def load_version(model_path, artifact_dir=None):
+    """
+    Load what is deployed: the artifact while it matches the pickle (or the
+    pickle is absent), otherwise the pickle. None if there is neither.
+    """
+    if artifact_dir and artifact_is_current(artifact_dir, model_path):
+        try:
+            model = load_artifact(artifact_dir)
+            checksum = (model.manifest.get("source") or {}).get("sha256")
+            checksum = checksum or file_checksum(os.path.join(artifact_dir, MANIFEST_NAME))
+            print(f"[model_registry] Model {checksum[:12]} loaded from memory-mapped artifact")
+            return ModelVersion(checksum[:12], model, "artifact", encoder=model.encoder)
+        except Exception as e:
+            print(f"[model_registry] Failed to load model artifact, using pickle: {e}")
+
+    if not os.path.exists(model_path):
+        print(f"[model_registry] Model file not found at: {model_path}")
+        return None
+
+    import joblib
+    checksum = file_checksum(model_path)
+    model = joblib.load(model_path)
+    # Trained with n_jobs=-1; the inference executor owns the parallelism
+    for name, previous in pin_n_jobs(model):
+        print(f"[model_registry] Pinned {name}.n_jobs (was {previous})")
+    # Compile a pandas-free encoder for the preprocessing step if possible
+    try:
+        encoder, regressor = compile_pipeline(model)
+    except UnsupportedPipelineError as e:
+        print(f"[model_registry] Fast encoder unavailable, using full pipeline: {e}")
+        encoder, regressor = None, None
+    print(f"[model_registry] Model {checksum[:12]} loaded successfully")
+    return ModelVersion(checksum[:12], model, "pickle", encoder, regressor)
+
+
+class ModelRegistry:
+    """
+    Holds the current ModelVersion and reloads it when the files change.
+    validate(candidate, current) returns an error message to reject a
+    candidate, or None to accept it.
+    """
+
+    def __init__(self, model_path, artifact_dir=None, validate=None, interval=5.0):
+        self.model_path = model_path
+        self.artifact_dir = artifact_dir
+        self.validate = validate
+        self.interval = float(interval)
+
+        self._current = None
+        self._attempted = False
+        self._signature = None  # file stamps of what was last loaded
+        self._pending = None    # changed stamps waiting to settle
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.reloads = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_check = None
+
+    def signature(self):
+        """(mtime, size) of the pickle and the artifact manifest (None where missing)"""
+        stamps = []
+        paths = [self.model_path]
+        if self.artifact_dir:
+            paths.append(os.path.join(self.artifact_dir, MANIFEST_NAME))
+        for path in paths:
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def peek(self):
+        """The current version without loading anything (None before the first load)"""
+        return self._current
+
+    def current(self):
+        """The version serving new requests; the first call loads it"""
+        version = self._current
+        if version is None and (not self._attempted or self.signature() != self._signature):
+            with self._load_lock:
+                if self._current is None:
+                    self._signature = self.signature()
+                    try:
+                        self._current = load_version(self.model_path, self.artifact_dir)
+                    except Exception as e:
+                        print(f"[model_registry] Failed to load model: {e}")
+                        self.last_error = str(e)
+                    self._attempted = True
+            version = self._current
+        return version
+
+    def check(self):
+        """Poll the files once; returns True if a new version was swapped in"""
+        self.last_check = datetime.utcnow().isoformat()
+        signature = self.signature()
+        if signature == self._signature:
+            self._pending = None
+            return False
+        if signature != self._pending:
+            # Let a file that is still being written settle for one poll
+            self._pending = signature
+            return False
+        self._pending = None
+        return self.reload(signature)
+
+    def reload(self, signature=None):
+        """Load, validate and publish whatever is deployed now; True if swapped in"""
+        with self._load_lock:
+            self._signature = signature or self.signature()
+            current = self._current
+            try:
+                candidate = load_version(self.model_path, self.artifact_dir)
+            except Exception as e:
+                candidate, self.last_error = None, f"load failed: {e!r}"
+            if candidate is None:
+                self.rejected += 1
+                print(f"[model_registry] Keeping model {current.version_id if current else None}: {self.last_error or 'nothing to load'}")
+                return False
+            if current is not None and (candidate.version_id, candidate.source) == (current.version_id, current.source):
+                return False
+
+            error = self.validate(candidate, current) if self.validate else None
+            if error:
+                self.rejected += 1
+                self.last_error = f"model {candidate.version_id} rejected: {error}"
+                print(f"[model_registry] {self.last_error}")
+                return False
+
+            # Requests already holding the old version finish on it
+            self._current = candidate
+            self._attempted = True
+            self.reloads += 1
+            self.last_error = None
+            print(f"[model_registry] Now serving model {candidate.version_id} "
+                  f"(was {current.version_id if current else None})")
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[model_registry] Reload check failed: {e}")
+
+    def start_watcher(self):
+        """Poll for new model files in a background thread (no-op if interval <= 0)"""
+        if self.interval <= 0 or self._thread is not None:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        """Current version and reload counters"""
+        current = self._current
+        return {
+            "current": current.describe() if current else None,
+            "reloads": self.reloads,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+            "watching": self._thread is not None,
+            "interval_seconds": self.interval,
+        }
@@ -0,0 +1,145 @@
+# chatbot/neighbour_index.py
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Candidate rows scored per block in the brute-force scan
+_BLOCK_ROWS = 1 << 16
+
+# Remembered candidate sets for recent categorical filter combinations
+_MAX_CACHED_FILTERS = 256
+
+
+class NeighbourIndex:
+    """
+    Top-k similar historical projects.
+
+    Rows are partitioned by their (case-folded) categorical values, so a
+    categorical filter selects whole partitions instead of scanning columns.
+    Numeric columns are standardized once; similarity is the Euclidean
+    distance over whichever numeric features the caller supplied, scored in
+    blocks with NumPy and reduced with argpartition.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.n_rows = len(frame)
+        self.numeric_cols = list(frame.select_dtypes(include=[np.number]).columns)
+        self.categorical_cols = [c for c in frame.columns if c not in self.numeric_cols]
+
+        values = frame[self.numeric_cols].to_numpy(dtype=np.float64)
+        self.means = np.nanmean(values, axis=0) if self.n_rows else np.zeros(len(self.numeric_cols))
+        stds = np.nanstd(values, axis=0) if self.n_rows else np.ones(len(self.numeric_cols))
+        self.stds = np.where(stds > 0, stds, 1.0)
+        self.scaled = np.nan_to_num((values - self.means) / self.stds, nan=0.0)
+
+        # Partition rows by the full combination of folded categorical values
+        self._folded = {}
+        cell = np.zeros(self.n_rows, dtype=np.int64)
+        codes_per_col = []
+        for col in self.categorical_cols:
+            codes, labels = pd.factorize(frame[col].astype(str).str.lower())
+            self._folded[col] = {label: i for i, label in enumerate(labels)}
+            codes_per_col.append(codes)
+            cell = cell * (len(labels) + 1) + codes
+
+        order = np.argsort(cell, kind="stable")
+        _, starts = np.unique(cell[order], return_index=True)
+        bounds = list(starts[1:]) + [self.n_rows]
+        self._partitions = []
+        for start, stop in zip(starts, bounds):
+            row_ids = order[start:stop]
+            key = tuple(int(codes[row_ids[0]]) for codes in codes_per_col)
+            self._partitions.append((key, row_ids))
+
+        # Shared by request threads: every access holds the lock
+        self._candidate_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def candidates(self, categorical):
+        """Row ids (dataset order) matching {column: value} categorical filters"""
+        wanted = []
+        for col, value in categorical.items():
+            if col not in self._folded:
+                continue
+            code = self._folded[col].get(str(value).lower())
+            if code is None:
+                return np.empty(0, dtype=np.int64)
+            wanted.append((self.categorical_cols.index(col), code))
+
+        if not wanted:
+            return np.arange(self.n_rows)
+
+        cache_key = tuple(sorted(wanted))
+        with self._cache_lock:
+            cached = self._candidate_cache.get(cache_key)
+            if cached is not None:
+                self._candidate_cache.move_to_end(cache_key)
+                return cached
+
+        parts = [rows for key, rows in self._partitions if all(key[i] == code for i, code in wanted)]
+        rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+        with self._cache_lock:
+            self._candidate_cache[cache_key] = rows
+            if len(self._candidate_cache) > _MAX_CACHED_FILTERS:
+                self._candidate_cache.popitem(last=False)
+        return rows
+
+    def split_filters(self, values):
+        """Split {feature: value} into categorical filters and numeric targets"""
+        categorical, numeric = {}, {}
+        for feature, value in values.items():
+            if value in [None, ""]:
+                continue
+            if feature in self._folded:
+                categorical[feature] = value
+            elif feature in self.numeric_cols:
+                try:
+                    numeric[feature] = float(value)
+                except (TypeError, ValueError):
+                    pass
+        return categorical, numeric
+
+    def query(self, categorical, numeric, k=5):
+        """
+        Most similar rows to the given filters
+        categorical: {column: value} exact (case-insensitive) matches
+        numeric: {column: number} targets for the distance
+        Returns: (row_ids, distances), nearest first; without numeric targets
+        the first k matching rows in dataset order and zero distances
+        """
+        rows = self.candidates(categorical)
+        dims = [self.numeric_cols.index(c) for c in numeric if c in self.numeric_cols]
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if not dims or len(rows) == 0:
+            rows = rows[:k]
+            return rows, np.zeros(len(rows))
+
+        target = np.array([(numeric[self.numeric_cols[d]] - self.means[d]) / self.stds[d] for d in dims])
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_dist = np.empty(0, dtype=np.float64)
+        for start in range(0, len(rows), _BLOCK_ROWS):
+            block = rows[start:start + _BLOCK_ROWS]
+            diff = self.scaled[np.ix_(block, dims)] - target
+            dist = np.einsum("ij,ij->i", diff, diff)
+            best_rows, best_dist = _smallest(
+                np.concatenate([best_rows, block]), np.concatenate([best_dist, dist]), k
+            )
+
+        # Nearest first; equal distances keep dataset order
+        order = np.lexsort((best_rows, best_dist))[:k]
+        return best_rows[order], np.sqrt(best_dist[order])
+
+
+def _smallest(rows, dist, k):
+    """Rows whose distance is within the k smallest, keeping every tie at the cutoff"""
+    if len(rows) <= k:
+        return rows, dist
+    cutoff = dist[np.argpartition(dist, k - 1)[:k]].max()
+    keep = dist <= cutoff
+    return rows[keep], dist[keep]
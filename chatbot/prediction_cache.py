@@ -0,0 +1,102 @@
+# chatbot/prediction_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of prediction results with a per-entry TTL.
+
+    Keys are canonical feature tuples (see ml_interface._validate_record).
+    `signature_fn` returns a token identifying the model artifact; when it
+    changes the whole cache is dropped. It is polled at most once every
+    `check_interval` seconds so lookups do not stat the file every time.
+    """
+
+    def __init__(self, max_size=4096, ttl_seconds=600.0, signature_fn=None, check_interval=1.0):
+        self.max_size = max(0, int(max_size))
+        self.ttl = float(ttl_seconds)
+        self.signature_fn = signature_fn
+        self.check_interval = check_interval
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._signature = signature_fn() if signature_fn else None
+        self._last_check = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _check_signature(self, now):
+        """Drop everything if the model artifact changed (lock held)"""
+        if self.signature_fn is None or now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        signature = self.signature_fn()
+        if signature != self._signature:
+            self._signature = signature
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def get(self, key):
+        """Cached value for key, or None"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._check_signature(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
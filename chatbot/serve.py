@@ -0,0 +1,243 @@
+# chatbot/serve.py
+"""
+Pre-fork production entry point.
+
+The master process imports the app and loads the model, the dataset and
+the lookup indexes once, then freezes everything it allocated (gc.freeze)
+so the garbage collector never writes to those objects, and forks the
+workers. Workers accept on the master's listening socket and share its
+memory pages copy-on-write instead of each loading their own copy.
+Background threads (inference scheduler, history flusher, janitor, model
+watcher) only start inside workers, after the fork. Each worker reloads a
+new model version on its own, so after a reload that version is no longer
+shared between workers until the server restarts (a memory-mapped artifact
+still is, through the page cache).
+
+A session's turns may land on any worker: they are serialized with a
+cross-process file lock, and each worker's session cache revalidates its
+entries against the history store (see utils/session_cache.py).
+
+Run from the chatbot directory:
+    python serve.py [--workers N] [--host HOST] [--port PORT] [--memory-report SECONDS]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Nothing is collected while the shared state is being built, so it isn't
+# promoted between generations (and written to) before the fork
+gc.disable()
+
+# app.py leaves model loading to the master and the janitor to the workers
+os.environ["CHATBOT_PREFORK"] = "1"
+
+# Workers (0 = one per available CPU)
+WORKERS = int(os.environ.get("CHATBOT_WORKERS", "0"))
+HOST = os.environ.get("CHATBOT_HOST", "127.0.0.1")
+PORT = int(os.environ.get("CHATBOT_PORT", "5000"))
+# Seconds between per-worker memory reports (0 disables)
+MEMORY_REPORT_INTERVAL = float(os.environ.get("CHATBOT_MEMORY_REPORT", "60"))
+
+# A worker dying sooner than this after starting is respawned with a delay
+_MIN_WORKER_LIFETIME = 1.0
+
+
+def default_workers():
+    """One worker per CPU this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+def memory_usage(pid):
+    """
+    Memory of a process in KiB from /proc/<pid>/smaps_rollup:
+    {"rss", "pss", "shared", "private"}, or None where unavailable.
+    PSS charges every shared page to its sharers in equal parts, so the PSS
+    of all workers adds up to what they really cost together.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def memory_report(workers):
+    """Printable per-worker memory table with the copy-on-write saving"""
+    rows = []
+    for index, pid in sorted((index, pid) for pid, (index, _) in workers.items()):
+        usage = memory_usage(pid)
+        if usage is not None:
+            rows.append((f"worker {index}", pid, usage))
+    master = memory_usage(os.getpid())
+    if master is None or not rows:
+        return "[serve] Memory report unavailable (needs /proc/<pid>/smaps_rollup)"
+
+    mib = lambda kib: f"{kib / 1024.0:8.1f}"
+    lines = [f"{'process':<10} {'pid':>7} {'rss MiB':>8} {'pss MiB':>8} {'shared':>8} {'private':>8}"]
+    for name, pid, usage in [("master", os.getpid(), master)] + rows:
+        lines.append(f"{name:<10} {pid:>7} {mib(usage['rss'])} {mib(usage['pss'])} "
+                     f"{mib(usage['shared'])} {mib(usage['private'])}")
+    rss = sum(usage["rss"] for _, _, usage in rows)
+    pss = sum(usage["pss"] for _, _, usage in rows)
+    lines.append(f"{len(rows)} workers: {rss / 1024.0:.1f} MiB if loaded separately (sum of RSS), "
+                 f"{pss / 1024.0:.1f} MiB actually used (sum of PSS), "
+                 f"{(rss - pss) / 1024.0:.1f} MiB saved by sharing")
+    return "\n".join(lines)
+
+
+def preload():
+    """Load everything workers read but never modify into the master"""
+    from ml_interface import warm_up, get_readiness
+
+    warm_up()
+    print(f"[serve] Model and dataset loaded in {get_readiness()['warmup']['seconds']:.2f}s")
+
+
+def _run_worker(index, listener, app):
+    """Serve requests on the shared socket until told to stop; never returns"""
+    from werkzeug.serving import make_server
+    from utils.history_manager import start_janitor, close_store
+    from ml_interface import start_model_watcher
+
+    code = 0
+    try:
+        # Ctrl-C reaches the whole process group; the master decides
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        gc.enable()
+
+        # One janitor is enough for the shared history directory
+        if index == 0:
+            start_janitor()
+        start_model_watcher()
+
+        server = make_server(listener.getsockname()[0], listener.getsockname()[1], app,
+                             threaded=True, fd=listener.fileno())
+        print(f"[serve] Worker {index} (pid {os.getpid()}) ready")
+        server.serve_forever()
+    except SystemExit:
+        pass
+    except Exception as e:
+        print(f"[serve] Worker {index} failed: {e}")
+        code = 1
+    finally:
+        close_store()
+        sys.stdout.flush()
+        os._exit(code)
+
+
+def _spawn(index, listener, app, workers):
+    pid = os.fork()
+    if pid == 0:
+        _run_worker(index, listener, app)
+    workers[pid] = (index, time.monotonic())
+
+
+def serve(workers=None, host=HOST, port=PORT, memory_report_interval=MEMORY_REPORT_INTERVAL):
+    """Load once, fork `workers` processes on one socket and supervise them"""
+    from app import app
+
+    workers = workers or WORKERS or default_workers()
+    if not hasattr(os, "fork"):
+        # No fork (Windows): one threaded process
+        from utils.history_manager import start_janitor
+        from ml_interface import start_model_watcher
+        gc.enable()
+        start_model_watcher()
+        start_janitor()
+        print(f"[serve] os.fork unavailable; serving in a single process at http://{host}:{port}")
+        app.run(host=host, port=port, threaded=True, debug=False)
+        return 0
+
+    # Split the CPUs between the workers' inference pools instead of letting
+    # each one size its pool for the whole machine
+    import inference_executor
+    if not inference_executor.INFERENCE_THREADS:
+        inference_executor.configure(threads=inference_executor.default_threads(workers))
+
+    preload()
+    listener = socket.create_server((host, port), backlog=128)
+    listener.set_inheritable(True)
+
+    # Everything allocated so far is shared with the workers: keep it out of
+    # every future collection so refcount-free pages stay untouched
+    gc.collect()
+    gc.freeze()
+
+    stopping = []
+
+    def _stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    children = {}  # pid -> (worker index, start time)
+    for index in range(workers):
+        _spawn(index, listener, app, children)
+    print(f"[serve] {workers} workers serving at http://{host}:{port}")
+
+    next_report = time.monotonic() + min(memory_report_interval, 10.0) if memory_report_interval > 0 else None
+    signalled = False
+    while children:
+        if stopping and not signalled:
+            print("[serve] Shutting down workers...")
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            signalled = True
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if next_report is not None and time.monotonic() >= next_report:
+                print(memory_report(children))
+                next_report = time.monotonic() + memory_report_interval
+            time.sleep(0.2)
+            continue
+
+        index, started = children.pop(pid)
+        if stopping:
+            continue
+        print(f"[serve] Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+        if time.monotonic() - started < _MIN_WORKER_LIFETIME:
+            time.sleep(_MIN_WORKER_LIFETIME)
+        _spawn(index, listener, app, children)
+
+    listener.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork multi-worker server for the chatbot")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (0 = one per CPU)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--memory-report", type=float, default=MEMORY_REPORT_INTERVAL,
+                        help="seconds between memory reports (0 disables)")
+    args = parser.parse_args()
+    return serve(args.workers, args.host, args.port, args.memory_report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
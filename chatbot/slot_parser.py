@@ -0,0 +1,220 @@
+# chatbot/slot_parser.py
+"""
+One-pass extraction of every recognizable variable/value pair from a free
+text message, e.g.
+
+    "Web Dev, high complexity, budget 2000-4000, 30 days, 15 bidders, USA"
+
+The message is split into clauses; in each clause variable mentions and
+values (numbers, ranges, percentages, category options) are located by
+position and paired with their nearest counterpart. Once a message talks
+about the budget, "min"/"max" on their own bind to the number after them:
+
+    "budget min 1000 and max 3000"
+"""
+import re
+
+from alias_matcher import AliasMatcher
+
+# Mentioning "budget" with a range fills both ends
+BUDGET_PAIR = ("Client_Budget_Min", "Client_Budget_Max")
+BUDGET = "Client_Budget"
+
+# Mentions understood by the parser on top of the caller's alias table
+SLOT_HINTS = {
+    "budget": BUDGET,
+    "price range": BUDGET,
+    "day": "Duration_Days",
+    "days": "Duration_Days",
+    "week": "Duration_Days",
+    "weeks": "Duration_Days",
+    "bidder": "Num_Bidders",
+    "bidders": "Num_Bidders",
+    "bids": "Avg_Past_Bids",
+    "past bids": "Avg_Past_Bids",
+    "year": "Freelancer_Exp_Years",
+    "years": "Freelancer_Exp_Years",
+    "yrs": "Freelancer_Exp_Years",
+    "experience": "Freelancer_Exp_Years",
+    "success": "Freelancer_Success_Rate",
+    "success rate": "Freelancer_Success_Rate",
+    "complexity": "Complexity",
+    "urgency": "Urgency",
+    "location": "Location",
+    "client": "Client_History",
+    "skill": "Skills_Required",
+    "skills": "Skills_Required",
+}
+
+# Bare bound keywords, understood only in a message that mentions the budget
+BUDGET_BOUNDS = {
+    "min": BUDGET_PAIR[0],
+    "minimum": BUDGET_PAIR[0],
+    "max": BUDGET_PAIR[1],
+    "maximum": BUDGET_PAIR[1],
+}
+_bounds_matcher = AliasMatcher(BUDGET_BOUNDS)
+
+# Option words too generic to assign without a mention of their variable
+_NEEDS_MENTION = {"new", "repeat", "other", "low", "high", "normal", "medium"}
+
+# Clause boundaries: commas (but not thousands separators), semicolons,
+# newlines and "and"
+_CLAUSE_SPLIT = re.compile(r',(?!\d{3}(?!\d))|;|\n|\band\b', re.I)
+
+_NUMBER = r'(\$)?\s*(\d+(?:,\d{3})*(?:\.\d+)?)\s*(k\b)?'
+_VALUE = re.compile(
+    r'(?<![\w.])' + _NUMBER + r'(?:\s*(?:-|–|to)\s*' + r'\$?\s*(\d+(?:,\d{3})*(?:\.\d+)?)\s*(k\b)?' + r')?\s*(%)?',
+    re.I,
+)
+
+_matchers = {}
+
+
+def _matchers_for(categories, aliases):
+    """(mention matcher, option matcher, {option: [(variable, option)]}), built once per table pair"""
+    key = (id(categories), id(aliases))
+    cached = _matchers.get(key)
+    if cached is None or cached[0] is not categories or cached[1] is not aliases:
+        table = dict(SLOT_HINTS)
+        table.update({k.lower(): v for k, v in (aliases or {}).items()})
+        for variable in categories:
+            table.setdefault(variable.lower(), variable)
+        option_table = {}
+        for variable, options in categories.items():
+            for option in options:
+                option_table.setdefault(option.lower(), []).append((variable, option))
+        cached = (categories, aliases, AliasMatcher(table), AliasMatcher({o: o for o in option_table}), option_table)
+        _matchers[key] = cached
+    return cached[2:]
+
+
+def _number(digits, thousands):
+    value = float(digits.replace(',', ''))
+    return value * 1000 if thousands else value
+
+
+def _values(clause):
+    """[(start, end, low, high_or_None, is_percent, is_dollar)]"""
+    found = []
+    for m in _VALUE.finditer(clause):
+        low = _number(m.group(2), m.group(3))
+        high = _number(m.group(4), m.group(5)) if m.group(4) else None
+        found.append((m.start(2) if not m.group(1) else m.start(1), m.end(), low, high, bool(m.group(6)), bool(m.group(1))))
+    return found
+
+
+def _gap(a, b):
+    """Characters between two (start, end) spans"""
+    return max(a[0] - b[1], b[0] - a[1], 0)
+
+
+def extract_slots(text, categories, aliases=None):
+    """
+    Raw {variable: value} pairs found in text, in order of appearance.
+    categories: {variable: [options]} for categorical variables
+    aliases: {alias: variable} mention table (merged with SLOT_HINTS)
+    Values are numbers or category option strings; callers validate them.
+    """
+    if not text:
+        return {}
+    mention_matcher, option_matcher, option_table = _matchers_for(categories, aliases)
+
+    budget_variables = {BUDGET, *BUDGET_PAIR}
+    talks_budget = any(variable in budget_variables for _, _, variable, _ in mention_matcher.find_all(text))
+
+    slots = {}
+    for clause in _CLAUSE_SPLIT.split(text):
+        clause = clause.lower()
+        if not clause.strip():
+            continue
+        mentions = [(start, end, variable) for start, end, variable, _ in mention_matcher.find_all(clause)]
+        mentioned = {variable for _, _, variable in mentions}
+        # (start, end) of mentions that bind to the value after them
+        forward = set()
+        if talks_budget:
+            for start, end, variable, _ in _bounds_matcher.find_all(clause):
+                if variable not in slots and not any(s < end and start < e for s, e, _ in mentions):
+                    mentions.append((start, end, variable))
+                    forward.add((start, end))
+            mentions.sort()
+
+        # Category options: unique ones directly, generic ones only next to
+        # a mention of their variable
+        option_spans = []
+        for start, end, word, _ in option_matcher.find_all(clause):
+            candidates = [(v, o) for v, o in option_table[word] if v not in slots]
+            chosen = [(v, o) for v, o in candidates if v in mentioned]
+            if not chosen and word not in _NEEDS_MENTION and len(candidates) == 1:
+                chosen = candidates
+            if len(chosen) == 1:
+                slots[chosen[0][0]] = chosen[0][1]
+                option_spans.append((start, end))
+
+        # Numbers: pair numeric mentions with their nearest value
+        numeric_mentions = [
+            (start, end, variable) for start, end, variable in mentions
+            if variable not in categories
+            and not any(s <= start < e for s, e in option_spans)
+        ]
+        values = [v for v in _values(clause) if not any(s <= v[0] < e for s, e in option_spans)]
+        # A bound keyword takes the value after it, and loses ties to a
+        # variable's own mention ("min 5 years")
+        pairs = sorted(
+            ((_gap((ms, me), (vs, ve)) + (len(clause) if (ms, me) in forward and vs < ms else 0),
+              (ms, me) in forward, i, j)
+             for i, (ms, me, _) in enumerate(numeric_mentions)
+             for j, (vs, ve, *_rest) in enumerate(values)),
+        )
+        used_mentions, used_values = set(), set()
+        for _, _, i, j in pairs:
+            if i in used_mentions or j in used_values:
+                continue
+            variable = numeric_mentions[i][2]
+            _, _, low, high, _, _ = values[j]
+            if variable in [BUDGET, *BUDGET_PAIR] and high is not None:
+                slots.setdefault(BUDGET_PAIR[0], low)
+                slots.setdefault(BUDGET_PAIR[1], high)
+            elif variable == BUDGET or high is not None:
+                continue  # a lone budget number or a range for a single value is ambiguous
+            elif variable not in slots:
+                # "2 weeks" means 14 days
+                clause_text = clause[numeric_mentions[i][0]:numeric_mentions[i][1]]
+                slots[variable] = low * 7 if clause_text in ("week", "weeks") else low
+            used_mentions.add(i)
+            used_values.add(j)
+
+        # Unlabelled values that still say what they are
+        for j, (_, _, low, high, is_percent, is_dollar) in enumerate(values):
+            if j in used_values:
+                continue
+            if is_percent and high is None:
+                slots.setdefault("Freelancer_Success_Rate", low)
+            elif is_dollar and high is not None:
+                slots.setdefault(BUDGET_PAIR[0], low)
+                slots.setdefault(BUDGET_PAIR[1], high)
+    return slots
+
+
+def fill_slots(text, categories, clean_fn, aliases=None):
+    """
+    Extract and validate every slot in text.
+    clean_fn: clean_user_value(value, expected_type, variable_name)
+    Returns: ({variable: cleaned_value}, {variable: error_message})
+    """
+    values, errors = {}, {}
+    for variable, raw in extract_slots(text, categories, aliases).items():
+        if isinstance(raw, float) and raw.is_integer():
+            raw = int(raw)
+        expected_type = "categorical" if variable in categories else "numeric"
+        cleaned, ok, message = clean_fn(str(raw), expected_type, variable)
+        if ok:
+            values[variable] = cleaned
+        else:
+            errors[variable] = message
+
+    low, high = values.get(BUDGET_PAIR[0]), values.get(BUDGET_PAIR[1])
+    if low is not None and high is not None and low > high:
+        errors[BUDGET_PAIR[1]] = "Maximum budget must not be below the minimum."
+        del values[BUDGET_PAIR[1]]
+    return values, errors
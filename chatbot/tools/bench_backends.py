@@ -0,0 +1,52 @@
+# chatbot/tools/bench_backends.py
+"""
+Compare single-row latency, batch throughput and agreement of the inference
+backends in ml_interface (sklearn, flat, flat32).
+
+Run from the chatbot directory:
+    python -m tools.bench_backends [rows]
+"""
+import sys
+import time
+
+import numpy as np
+
+import ml_interface
+from ml_interface import load_model, load_dataset, get_model_features, predict_from_model, predict_many
+
+# Compare against the sklearn pipeline itself, not the memory-mapped artifact
+ml_interface.MODEL_ARTIFACT_DIR = ""
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    if load_model() is None or load_dataset() is None:
+        print("Model or dataset not available")
+        return 1
+
+    records = load_dataset()[get_model_features()].to_dict("records")
+    reference = None
+
+    print(f"{'backend':<8} {'single ms':>10} {'batch rows/s':>13} {'max abs diff':>13}")
+    for backend in ml_interface.INFERENCE_BACKENDS:
+        ml_interface.set_inference_backend(backend)
+
+        started = time.perf_counter()
+        for record in records[:n_rows]:
+            predict_from_model(record)
+        single_ms = (time.perf_counter() - started) / n_rows * 1000.0
+
+        started = time.perf_counter()
+        results = predict_many(records)
+        rows_per_s = len(records) / (time.perf_counter() - started)
+
+        preds = np.array([r["prediction"] for r in results])
+        if reference is None:
+            reference = preds
+        diff = float(np.max(np.abs(preds - reference)))
+        print(f"{ml_interface.get_inference_backend():<8} {single_ms:>10.3f} {rows_per_s:>13.0f} {diff:>13.6g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# chatbot/tools/bench_dataset.py
+"""
+Compare loading the dataset by parsing the CSV with loading it from the
+typed column cache: load time, in-memory footprint of the frame, resident
+memory added by the load in a fresh process, and that both give the same
+values.
+
+Run from the chatbot directory:
+    python -m tools.bench_dataset [repeats]
+"""
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import build_cache, cache_dir, load_dataset_cached
+from ml_interface import CSV_PATH
+
+# Loads the dataset one way in a fresh interpreter (pandas already imported)
+# and prints the resident memory the load added, in KiB
+_RSS_DELTA = """
+import sys
+import pandas as pd
+from dataset_cache import load_dataset_cached
+
+def rss():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+kind, csv, root = sys.argv[1:4]
+before = rss()
+frame = pd.read_csv(csv) if kind == "csv" else load_dataset_cached(csv, root)
+frame.sum(numeric_only=True)
+print(rss() - before)
+"""
+
+
+def _timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(times)
+
+
+def _rss_delta(kind, root):
+    try:
+        out = subprocess.run([sys.executable, "-c", _RSS_DELTA, kind, CSV_PATH, root],
+                             capture_output=True, text=True, check=True).stdout.split()
+        return int(out[-1]) / 1024.0
+    except (subprocess.CalledProcessError, IndexError, ValueError):
+        return float("nan")
+
+
+def _same_values(a, b):
+    for col in a.columns:
+        if a[col].dtype.kind in "if":
+            if not np.array_equal(a[col].to_numpy(dtype=np.float64), b[col].to_numpy(dtype=np.float64), equal_nan=True):
+                return False
+        elif list(a[col].astype(str)) != list(b[col].astype(str)):
+            return False
+    return True
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    with tempfile.TemporaryDirectory() as root:
+        build_ms = _timed(lambda: build_cache(CSV_PATH, cache_dir(CSV_PATH, root) + "-bench"), 1)
+        csv_ms = _timed(lambda: pd.read_csv(CSV_PATH), repeats)
+        load_dataset_cached(CSV_PATH, root)
+        cache_ms = _timed(lambda: load_dataset_cached(CSV_PATH, root), repeats)
+
+        csv_frame = pd.read_csv(CSV_PATH)
+        cached_frame = load_dataset_cached(CSV_PATH, root)
+        csv_mb = csv_frame.memory_usage(deep=True).sum() / 1e6
+        cached_mb = cached_frame.memory_usage(deep=True).sum() / 1e6
+        csv_rss, cache_rss = _rss_delta("csv", root), _rss_delta("cache", root)
+
+        print(f"rows: {len(csv_frame)}, cache built once in {build_ms:.1f} ms")
+        print(f"{'path':<6} {'load ms':>8} {'frame MB':>9} {'RSS added MiB':>14}")
+        print(f"{'csv':<6} {csv_ms:>8.1f} {csv_mb:>9.2f} {csv_rss:>14.1f}")
+        print(f"{'cache':<6} {cache_ms:>8.1f} {cached_mb:>9.2f} {cache_rss:>14.1f}")
+        print("dtypes: " + ", ".join(f"{c}={t}" for c, t in cached_frame.dtypes.astype(str).items()))
+        same = _same_values(csv_frame, cached_frame)
+        print(f"values identical: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# chatbot/tools/bench_executor.py
+"""
+Throughput and latency of single-row predictions with 1-64 concurrent
+clients, comparing:
+- unpinned: the regressor as pickled (n_jobs=-1), called from every client
+  thread directly;
+- pinned:   n_jobs pinned to 1, still called from every client directly;
+- executor: pinned and run on the bounded inference pool.
+Then the time of one large batch run as a single task and split across the
+pool.
+
+Run from the chatbot directory:
+    python -m tools.bench_executor [--backend sklearn|flat] [--seconds 1.5] [--threads N]
+"""
+import argparse
+import copy
+import sys
+import threading
+import time
+
+import numpy as np
+
+import ml_interface
+from forest_engine import FlatForest
+from inference_executor import InferenceExecutor, default_threads, pin_n_jobs
+from model_registry import load_version
+
+CLIENTS = [1, 2, 4, 8, 16, 32, 64]
+
+
+def _drive(predict, rows, clients, seconds):
+    """Run `clients` threads calling predict(row) for `seconds`; (req/s, p50 ms, p99 ms)"""
+    latencies = [[] for _ in range(clients)]
+    stop = threading.Event()
+    start = threading.Barrier(clients + 1)
+
+    def _client(out, offset):
+        start.wait()
+        i = offset
+        while not stop.is_set():
+            row = rows[i % len(rows)]
+            began = time.perf_counter()
+            predict(row)
+            out.append(time.perf_counter() - began)
+            i += 1
+
+    threads = [threading.Thread(target=_client, args=(latencies[c], c * 97)) for c in range(clients)]
+    for t in threads:
+        t.start()
+    start.wait()
+    began = time.perf_counter()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    merged = np.sort(np.concatenate([np.asarray(l) for l in latencies])) * 1000.0
+    return len(merged) / elapsed, merged[len(merged) // 2], merged[int(len(merged) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["sklearn", "flat"], default="sklearn")
+    parser.add_argument("--seconds", type=float, default=1.5)
+    parser.add_argument("--threads", type=int, default=0, help="pool threads (0 = one per CPU)")
+    args = parser.parse_args()
+
+    version = load_version(ml_interface.MODEL_PATH)  # the pickle, pinned on load
+    if version is None or version.encoder is None:
+        print("Needs the pickled pipeline with a compilable encoder")
+        return 1
+    pinned = version.regressor
+    unpinned = copy.copy(pinned)
+    unpinned.set_params(n_jobs=-1)
+    if args.backend == "flat":
+        pinned = unpinned = FlatForest.from_estimator(version.regressor)
+
+    frame = ml_interface.load_dataset()
+    features = version.features
+    X = version.encoder.encode_many(frame[features].to_dict("records"))
+    rows = [X[i:i + 1] for i in range(min(len(X), 2000))]
+
+    threads = args.threads or default_threads()
+    executor = InferenceExecutor(threads=threads)
+    print(f"{default_threads()} CPU(s), pool of {threads} thread(s), backend {args.backend}, "
+          f"{args.seconds:.1f}s per cell; pinned on load: {pin_n_jobs(version.model) or 'already pinned'}")
+    modes = [
+        ("unpinned", lambda row: unpinned.predict(row)),
+        ("pinned", lambda row: pinned.predict(row)),
+        ("executor", lambda row: executor.run(pinned.predict, row)),
+    ]
+
+    print(f"{'clients':>7} " + " ".join(f"{name + ' req/s':>15} {'p50':>7} {'p99':>7}" for name, _ in modes))
+    for clients in CLIENTS:
+        cells = [_drive(predict, rows, clients, args.seconds) for _, predict in modes]
+        print(f"{clients:>7} " + " ".join(f"{rps:>15.0f} {p50:>7.2f} {p99:>7.2f}" for rps, p50, p99 in cells))
+
+    batch = X[:2000]
+    single = InferenceExecutor(threads=threads, split_rows=len(batch) + 1)
+    for name, ex in [("one task", single), (f"split x{min(threads, len(batch))}", executor)]:
+        times = []
+        for _ in range(5):
+            began = time.perf_counter()
+            ex.run(pinned.predict, batch)
+            times.append((time.perf_counter() - began) * 1000.0)
+        print(f"batch of {len(batch)} rows, {name}: {np.median(times):.1f} ms")
+    same = np.array_equal(single.run(pinned.predict, batch), executor.run(pinned.predict, batch))
+    print(f"split results identical: {same}")
+    print(executor.metrics())
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
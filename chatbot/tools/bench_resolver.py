@@ -0,0 +1,119 @@
+# chatbot/tools/bench_resolver.py
+"""
+Compare the precomputed category resolver with the previous difflib-based
+categorical path of clean_user_value: accuracy on labelled inputs (exact,
+typos, synonyms, junk that should be rejected) and time per call.
+
+Run from the chatbot directory:
+    python -m tools.bench_resolver [repeats]
+"""
+import difflib
+import re
+import sys
+import time
+
+from category_resolver import CategoryResolver
+
+CATEGORIES = {
+    "Skills_Required": ['Web Dev', 'Data Science', 'Graphic Design', 'Writing', 'Mobile Dev', 'Marketing', 'Other'],
+    "Location": ['USA', 'India', 'Europe', 'Other'],
+    "Client_History": ['New', 'Repeat'],
+    "Urgency": ['Low', 'Normal', 'High'],
+    "Complexity": ['Low', 'Medium', 'High'],
+}
+
+# (variable, input, expected option or None for "should be rejected")
+CASES = [
+    ("Skills_Required", "Web Dev", "Web Dev"),
+    ("Skills_Required", "web devv", "Web Dev"),
+    ("Skills_Required", "frontend", "Web Dev"),
+    ("Skills_Required", "data sceince", "Data Science"),
+    ("Skills_Required", "ML", "Data Science"),
+    ("Skills_Required", "machine learning", "Data Science"),
+    ("Skills_Required", "graphic desing", "Graphic Design"),
+    ("Skills_Required", "logo", "Graphic Design"),
+    ("Skills_Required", "copywriting", "Writing"),
+    ("Skills_Required", "android", "Mobile Dev"),
+    ("Skills_Required", "mobile dev", "Mobile Dev"),
+    ("Skills_Required", "seo", "Marketing"),
+    ("Skills_Required", "e", None),
+    ("Skills_Required", "xyz", None),
+    ("Skills_Required", "banana", None),
+    ("Location", "USA", "USA"),
+    ("Location", "US", "USA"),
+    ("Location", "united states", "USA"),
+    ("Location", "Indai", "India"),
+    ("Location", "EU", "Europe"),
+    ("Location", "germany", "Europe"),
+    ("Location", "mars", None),
+    ("Client_History", "repeat", "Repeat"),
+    ("Client_History", "returning", "Repeat"),
+    ("Client_History", "first time", "New"),
+    ("Client_History", "dunno", None),
+    ("Urgency", "high", "High"),
+    ("Urgency", "urgent", "High"),
+    ("Urgency", "asap", "High"),
+    ("Urgency", "normall", "Normal"),
+    ("Urgency", "lo", None),
+    ("Complexity", "Medum", "Medium"),
+    ("Complexity", "simple", "Low"),
+    ("Complexity", "hard", "High"),
+    ("Complexity", "q", None),
+]
+
+_FILLER = re.compile(r'\b(?:maybe|around|approximately|approx|about|roughly|i think|i\'m thinking|probably|not sure|kind of|kinda|value|years|yrs|yr)\b', flags=re.I)
+
+
+def legacy_resolve(variable, value):
+    """The categorical branch of clean_user_value before the resolver"""
+    val = _FILLER.sub(' ', str(value).strip()).strip()
+    options = CATEGORIES[variable]
+    cleaned = re.sub(r'\s+', ' ', re.sub(r'[^A-Za-z0-9 ]+', ' ', val)).strip()
+    for option in options:
+        if cleaned.lower() == option.lower():
+            return option
+    lower_options = [opt.lower() for opt in options]
+    matches = difflib.get_close_matches(cleaned.lower(), lower_options, n=1, cutoff=0.6)
+    if matches:
+        return options[lower_options.index(matches[0])]
+    tokens = cleaned.lower().split()
+    for option in options:
+        if any(token in option.lower() for token in tokens):
+            return option
+    return None
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    started = time.perf_counter()
+    resolver = CategoryResolver(CATEGORIES)
+    build_ms = (time.perf_counter() - started) * 1000.0
+
+    paths = {
+        "difflib": legacy_resolve,
+        "resolver": lambda variable, value: resolver.resolve(variable, value)[0],
+    }
+    print(f"resolver index built in {build_ms:.1f} ms\n")
+    print(f"{'path':<9} {'correct':>8} {'false accept':>13} {'missed':>7} {'us/call':>8}")
+    for name, fn in paths.items():
+        correct = false_accept = missed = 0
+        for variable, value, expected in CASES:
+            got = fn(variable, value)
+            if got == expected:
+                correct += 1
+            elif expected is None:
+                false_accept += 1
+            else:
+                missed += 1
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for variable, value, _ in CASES:
+                fn(variable, value)
+        per_call = (time.perf_counter() - started) / (repeats * len(CASES)) * 1e6
+        print(f"{name:<9} {correct:>5}/{len(CASES):<2} {false_accept:>13} {missed:>7} {per_call:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
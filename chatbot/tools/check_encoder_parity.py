@@ -0,0 +1,40 @@
+# chatbot/tools/check_encoder_parity.py
+"""
+Check that the compiled feature encoder reproduces the full sklearn pipeline
+bit for bit on every row of the training dataset.
+
+Run from the chatbot directory:
+    python -m tools.check_encoder_parity
+"""
+import sys
+import time
+
+from feature_encoder import verify_parity
+import ml_interface
+from ml_interface import load_model, load_dataset, get_model_features
+
+# Compare against the sklearn pipeline itself, not the memory-mapped artifact
+ml_interface.MODEL_ARTIFACT_DIR = ""
+
+
+def main():
+    model = load_model()
+    dataset = load_dataset()
+    if model is None or dataset is None:
+        print("Model or dataset not available")
+        return 1
+
+    frame = dataset[get_model_features()]
+    started = time.perf_counter()
+    report = verify_parity(model, frame)
+    elapsed = time.perf_counter() - started
+
+    print(f"Rows checked: {report['rows']}")
+    print(f"Mismatches:   {report['mismatches']}")
+    print(f"Max abs diff: {report['max_abs_diff']}")
+    print(f"Elapsed:      {elapsed:.2f}s")
+    return 0 if report["mismatches"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# chatbot/tools/check_hot_reload.py
+"""
+Exercise the model registry's hot reload on a scratch copy of the pickle:
+- a request holding the current version keeps predicting with it while a
+  changed model is loaded and swapped in;
+- predictions keep being served (and timed) throughout the reload;
+- a corrupt file and a model that predicts NaN are both rejected and the
+  current version keeps serving.
+
+Run from the chatbot directory:
+    python -m tools.check_hot_reload
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import joblib
+import numpy as np
+
+import ml_interface
+from model_registry import ModelRegistry
+
+
+def _write(pipeline, path):
+    """Write a model the way a deploy would: to a temp file, renamed into place"""
+    tmp = path + ".tmp"
+    joblib.dump(pipeline, tmp)
+    os.replace(tmp, path)
+
+
+def _settle(registry):
+    """Two polls: the first sees the change, the second loads it"""
+    registry.check()
+    return registry.check()
+
+
+def main():
+    failures = []
+    probe = ml_interface.PROBE_RECORD
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "model_pipeline.pkl")
+        shutil.copy(ml_interface.MODEL_PATH, path)
+        registry = ModelRegistry(path, None, validate=ml_interface._validate_version, interval=0)
+
+        old = registry.current()
+        old_value = old.predict_one(probe, "flat")
+        print(f"serving {old.version_id}: {old_value:.4f}")
+
+        # A retrained model: every leaf of the first tree scaled up
+        pipeline = joblib.load(path)
+        pipeline.steps[-1][1].estimators_[0].tree_.value[:] *= 2.0
+        _write(pipeline, path)
+
+        # Keep predicting from another thread while the reload runs
+        latencies, stop = [], threading.Event()
+
+        def _client():
+            while not stop.is_set():
+                started = time.perf_counter()
+                registry.current().predict_one(probe, "flat")
+                latencies.append((time.perf_counter() - started) * 1000.0)
+
+        client = threading.Thread(target=_client)
+        client.start()
+        started = time.perf_counter()
+        swapped = _settle(registry)
+        reload_s = time.perf_counter() - started
+        stop.set()
+        client.join()
+
+        new = registry.current()
+        new_value = new.predict_one(probe, "flat")
+        print(f"reload: swapped={swapped} in {reload_s:.2f}s, now serving {new.version_id}: {new_value:.4f}")
+        print(f"{len(latencies)} predictions during the reload, max {max(latencies):.2f} ms, "
+              f"median {float(np.median(latencies)):.3f} ms")
+        if not swapped or new.version_id == old.version_id or new_value == old_value:
+            failures.append("changed model was not swapped in")
+        if old.predict_one(probe, "flat") != old_value:
+            failures.append("in-flight version changed under its holder")
+
+        with open(path, "wb") as f:
+            f.write(b"not a pickle")
+        if _settle(registry) or registry.current() is not new:
+            failures.append("corrupt file replaced the current version")
+        print(f"corrupt file: kept {registry.current().version_id} ({registry.last_error})")
+
+        pipeline.steps[-1][1].estimators_[0].tree_.value[:] = np.nan
+        _write(pipeline, path)
+        if _settle(registry) or registry.current() is not new:
+            failures.append("model predicting NaN replaced the current version")
+        print(f"NaN model: kept {registry.current().version_id} ({registry.last_error})")
+        print(registry.stats())
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# chatbot/tools/check_slot_parser.py
+"""
+Check the free-text slot parser against messages with known answers,
+through the same fill_slots call the web chat handler makes.
+
+Run from the chatbot directory:
+    python -m tools.check_slot_parser
+"""
+import sys
+
+from alias_matcher import VARIABLE_ALIASES
+from chatbot_logic import CATEGORIES, clean_user_value
+from slot_parser import fill_slots
+
+# message -> expected {variable: cleaned value}
+CASES = [
+    ("Web Dev, high complexity, budget 2000-4000, 30 days, 15 bidders, USA", {
+        "Skills_Required": "Web Dev", "Complexity": "High", "Client_Budget_Min": 2000,
+        "Client_Budget_Max": 4000, "Duration_Days": 30, "Num_Bidders": 15, "Location": "USA",
+    }),
+    ("budget 1000 to 3000", {"Client_Budget_Min": 1000, "Client_Budget_Max": 3000}),
+    ("$2k to $4k", {"Client_Budget_Min": 2000, "Client_Budget_Max": 4000}),
+    ("min budget 1000 and max budget 3000", {"Client_Budget_Min": 1000, "Client_Budget_Max": 3000}),
+    # Bare min/max bind to the number after them once the budget is mentioned
+    ("budget min 1000 and max 3000", {"Client_Budget_Min": 1000, "Client_Budget_Max": 3000}),
+    ("budget min 1000 max 3000", {"Client_Budget_Min": 1000, "Client_Budget_Max": 3000}),
+    ("budget max 3000 and min 1000", {"Client_Budget_Min": 1000, "Client_Budget_Max": 3000}),
+    ("budget minimum 1000, maximum 3000, 2 weeks", {
+        "Client_Budget_Min": 1000, "Client_Budget_Max": 3000, "Duration_Days": 14,
+    }),
+    ("budget 1000-3000, min 5 years experience", {
+        "Client_Budget_Min": 1000, "Client_Budget_Max": 3000, "Freelancer_Exp_Years": 5,
+    }),
+    ("min 5 years experience", {"Freelancer_Exp_Years": 5}),
+    ("max 3000", {}),
+    ("90% success, repeat client, low urgency", {
+        "Freelancer_Success_Rate": 90, "Client_History": "Repeat", "Urgency": "Low",
+    }),
+]
+
+
+def main():
+    failures = 0
+    for message, expected in CASES:
+        values, errors = fill_slots(message, CATEGORIES, clean_user_value, VARIABLE_ALIASES)
+        ok = values == expected and not errors
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {message!r}")
+        if not ok:
+            print(f"     expected {expected}")
+            print(f"     got      {values} {errors or ''}")
+    print(f"{len(CASES) - failures}/{len(CASES)} messages parsed as expected")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# chatbot/tools/convert_model.py
+"""
+Convert the pickled pipeline into the memory-mapped model artifact that
+ml_interface.load_model prefers, check that the artifact predicts exactly
+like the pipeline on the training dataset, and compare cold loads of both
+(fresh process each: load time and resident memory).
+
+Run from the chatbot directory:
+    python -m tools.convert_model [--model PATH] [--out DIR] [--dtypes float64,float32] [--no-check]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from model_artifact import DTYPES, load_artifact, save_artifact
+from ml_interface import MODEL_PATH, MODEL_ARTIFACT_DIR, CSV_PATH
+
+# Loads a model in a fresh interpreter, predicts one row and prints
+# "<seconds> <rss KiB>"
+_COLD_LOAD = """
+import sys, time
+started = time.perf_counter()
+kind, path, csv = sys.argv[1:4]
+if kind == "pickle":
+    import joblib
+    model = joblib.load(path)
+else:
+    from model_artifact import load_artifact
+    model = load_artifact(path)
+import pandas as pd
+row = pd.read_csv(csv, nrows=1)[list(model.feature_names_in_)]
+model.predict(row)
+elapsed = time.perf_counter() - started
+rss = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1])
+print(elapsed, rss)
+"""
+
+
+def cold_load(kind, path):
+    """(seconds, RSS KiB) of loading `path` in a new process, or None"""
+    try:
+        out = subprocess.run([sys.executable, "-c", _COLD_LOAD, kind, path, CSV_PATH],
+                             capture_output=True, text=True, check=True).stdout.split()
+        return float(out[-2]), int(out[-1])
+    except (subprocess.CalledProcessError, IndexError, ValueError) as e:
+        print(f"Cold load of {kind} failed: {e}")
+        return None
+
+
+def check(pipeline, artifact):
+    """Mismatching predictions of the artifact against the pipeline, per dtype"""
+    frame = pd.read_csv(CSV_PATH)[list(pipeline.feature_names_in_)]
+    expected = pipeline.predict(frame)
+    X = artifact.encoder.encode_many(frame.to_dict("records"))
+    report = {}
+    for name in artifact.dtypes:
+        actual = artifact.forest(DTYPES[name]).predict(X)
+        report[name] = (int(np.sum(actual != expected)), float(np.max(np.abs(actual - expected))))
+    return len(frame), report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert model_pipeline.pkl into a memory-mapped artifact")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--out", default=MODEL_ARTIFACT_DIR)
+    parser.add_argument("--dtypes", default=",".join(DTYPES), help="comma-separated: float64,float32")
+    parser.add_argument("--no-check", action="store_true", help="skip the parity check and cold-load comparison")
+    args = parser.parse_args()
+
+    dtypes = [d.strip() for d in args.dtypes.split(",") if d.strip()]
+    unknown = [d for d in dtypes if d not in DTYPES]
+    if unknown or not dtypes:
+        print(f"Unknown dtypes: {', '.join(unknown)}. Expected: {', '.join(DTYPES)}")
+        return 1
+
+    started = time.perf_counter()
+    pipeline = joblib.load(args.model)
+    print(f"Pickle loaded in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    manifest = save_artifact(pipeline, args.out, source_path=args.model, dtypes=dtypes)
+    print(f"Artifact written to {args.out} in {time.perf_counter() - started:.2f}s "
+          f"({manifest['n_trees']} trees, depth {manifest['max_depth']}, {', '.join(dtypes)})")
+    if args.no_check:
+        return 0
+
+    rows, report = check(pipeline, load_artifact(args.out))
+    for name, (mismatches, max_diff) in report.items():
+        print(f"{name}: {mismatches}/{rows} predictions differ from the pipeline (max abs diff {max_diff:.3g})")
+
+    for kind, path in [("pickle", args.model), ("artifact", args.out)]:
+        result = cold_load(kind, path)
+        if result is not None:
+            print(f"Cold load + first prediction ({kind}): {result[0]:.2f}s, RSS {result[1] / 1024.0:.1f} MiB")
+
+    # float64 tables must reproduce sklearn exactly
+    return 0 if report.get("float64", (0, 0.0))[0] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# chatbot/tools/measure_startup.py
+"""
+Measure cold start of the web app in a fresh process: time until the first
+request is accepted (any HTTP answer) and until /readyz reports the model
+and dataset loaded. Without a /readyz route, ready counts as accepted.
+
+Run from the chatbot directory:
+    python -m tools.measure_startup [--runs N] [--port PORT]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+_SERVER = "from app import app; app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"
+
+
+def _status(url):
+    """HTTP status of a GET, or None if nothing answered"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return None
+
+
+def measure(port, timeout):
+    """(seconds to first accepted request, seconds to ready) for one cold start"""
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", _SERVER.format(port=port)],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    accepted = ready = None
+    try:
+        while time.perf_counter() - started < timeout:
+            status = _status(f"{base}/readyz")
+            now = time.perf_counter() - started
+            if status is not None and accepted is None:
+                accepted = now
+            if status in (200, 404):
+                ready = now
+                break
+            time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+    return accepted, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start timing of the chatbot web app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=5090)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    accepted, ready = [], []
+    for _ in range(args.runs):
+        a, r = measure(args.port, args.timeout)
+        if a is None or r is None:
+            print("Server did not come up in time")
+            return 1
+        accepted.append(a)
+        ready.append(r)
+
+    print(f"runs: {args.runs}")
+    print(f"first accepted request: median {statistics.median(accepted):.2f}s (min {min(accepted):.2f}s)")
+    print(f"ready:                  median {statistics.median(ready):.2f}s (min {min(ready):.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
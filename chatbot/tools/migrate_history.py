@@ -0,0 +1,76 @@
+# chatbot/tools/migrate_history.py
+"""
+Bulk-import file-based session history into the SQLite history store.
+
+Reads both legacy <session>.json documents and <session>.log.jsonl event logs
+from the history directory and writes them in batched transactions.
+
+Run from the chatbot directory:
+    python -m tools.migrate_history [--source DIR] [--db PATH] [--batch N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from utils.file_store import read_log_events, legacy_events
+from utils.history_manager import HISTORY_DIR, HISTORY_DB_PATH
+from utils.sqlite_store import SQLiteHistoryStore
+
+_LOG_SUFFIX = ".log.jsonl"
+_SNAPSHOT_SUFFIX = ".snap.json"
+
+
+def iter_sessions(source):
+    """Yield (session_id, events) for every history file under source"""
+    for root, _, files in os.walk(source):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                if name.endswith(_LOG_SUFFIX):
+                    events, _ = read_log_events(path)
+                    session_id = name[:-len(_LOG_SUFFIX)]
+                elif name.endswith(".json") and not name.endswith(_SNAPSHOT_SUFFIX):
+                    session_id = name[:-len(".json")]
+                    with open(path, 'r', encoding='utf-8') as f:
+                        events = legacy_events(json.load(f), session_id)
+                else:
+                    continue
+            except (OSError, ValueError) as e:
+                print(f"[migrate_history] Skipping {path}: {e}")
+                continue
+            meta = next((e for e in events if e.get("type") == "meta"), {})
+            yield meta.get("session_id", session_id), events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=HISTORY_DIR, help="history directory to import")
+    parser.add_argument("--db", default=HISTORY_DB_PATH, help="SQLite database to write")
+    parser.add_argument("--batch", type=int, default=500, help="sessions per transaction")
+    args = parser.parse_args(argv)
+
+    store = SQLiteHistoryStore(args.db)
+    started = time.perf_counter()
+    sessions = 0
+    batch = []
+    for session_id, events in iter_sessions(args.source):
+        # Replace rather than duplicate if the session was imported before
+        store.clear(session_id)
+        batch.append((session_id, events))
+        if len(batch) >= args.batch:
+            store.append_many(batch)
+            sessions += len(batch)
+            batch = []
+    if batch:
+        store.append_many(batch)
+        sessions += len(batch)
+    store.close()
+
+    print(f"Imported {sessions} sessions into {args.db} in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# chatbot/tools/pack_transcripts.py
+"""
+Pack loose main.save_history transcript files (<session>_<timestamp>.json,
+flat or sharded) into the compressed transcript archive, removing each file
+once it is archived. Also lists or prints archived transcripts.
+
+Run from the chatbot directory:
+    python -m tools.pack_transcripts [--dir user_history] [--keep]
+    python -m tools.pack_transcripts --show <session_id>
+    python -m tools.pack_transcripts --count
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from utils.history_manager import TRANSCRIPT_DIR
+from utils.sharding import is_shard_name
+from utils.transcript_archive import TranscriptArchive
+
+
+def iter_loose(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if is_shard_name(d)]
+        for name in sorted(files):
+            if name.endswith(".json"):
+                yield os.path.join(root, name)
+
+
+def pack(archive, directory, keep):
+    packed = 0
+    for path in iter_loose(directory):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[pack_transcripts] Skipping {path}: {e}")
+            continue
+        archive.append(record.get("session_id", os.path.basename(path)[:-len(".json")]), record)
+        if not keep:
+            os.remove(path)
+        packed += 1
+    return packed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=TRANSCRIPT_DIR, help="transcript directory")
+    parser.add_argument("--keep", action="store_true", help="leave the loose files in place")
+    parser.add_argument("--show", metavar="SESSION_ID", help="print the archived transcripts of a session")
+    parser.add_argument("--count", action="store_true", help="stream every segment and count records")
+    args = parser.parse_args(argv)
+
+    archive = TranscriptArchive(args.dir)
+    started = time.perf_counter()
+    if args.show:
+        for record in archive.find(args.show):
+            print(json.dumps(record, indent=2))
+    elif args.count:
+        total = sum(1 for _ in archive.iter_records())
+        print(f"{total} transcripts in {len(archive.segments())} segments ({time.perf_counter() - started:.2f}s)")
+    else:
+        packed = pack(archive, args.dir, args.keep)
+        print(f"Packed {packed} transcripts in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
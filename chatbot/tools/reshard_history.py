@@ -0,0 +1,121 @@
+# chatbot/tools/reshard_history.py
+"""
+Move history files into the hash-sharded layout (or from one shard depth to
+another).
+
+Session logs and snapshots in the history directory are moved under
+<history>/<ab>/..., legacy <session>.json documents are converted to logs,
+and main.save_history transcripts are moved under <user_history>/<ab>/....
+Moves hold the same per-session locks as the running app, so it is safe
+to run while serving.
+
+Run from the chatbot directory:
+    python -m tools.reshard_history [--depth 1] [--rate 500] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+
+from utils.file_store import FileHistoryStore, LOG_SUFFIX, SNAPSHOT_SUFFIX
+from utils.history_manager import HISTORY_DIR, TRANSCRIPT_DIR, SHARD_DEPTH
+from utils.janitor import RateLimiter
+from utils.sharding import shard_dir, is_shard_name
+
+
+def _walk(directory):
+    """Files in directory and its shard subdirectories (not .locks / archive)"""
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if is_shard_name(d)]
+        for name in sorted(files):
+            yield root, name
+
+
+def _remove_empty_shards(directory):
+    for root, dirs, files in os.walk(directory, topdown=False):
+        if root != directory and is_shard_name(os.path.basename(root)) and not os.listdir(root):
+            os.rmdir(root)
+
+
+def _move(source, target, dry_run):
+    if os.path.exists(target):
+        print(f"  skip {source}: {target} already exists")
+        return False
+    if not dry_run:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+    return True
+
+
+def reshard_sessions(directory, depth, limiter, dry_run):
+    store = FileHistoryStore(directory, shard_depth=depth)
+    moved = converted = 0
+    for root, name in list(_walk(directory)):
+        if name.endswith(LOG_SUFFIX):
+            session_id = name[:-len(LOG_SUFFIX)]
+        elif name.endswith(SNAPSHOT_SUFFIX):
+            session_id = name[:-len(SNAPSHOT_SUFFIX)]
+        elif name.endswith(".json") and root == directory:
+            # Pre-log document: the store converts it into a sharded log
+            limiter.acquire()
+            if not dry_run:
+                store.get_inputs(name[:-len(".json")])
+            converted += 1
+            continue
+        else:
+            continue
+
+        target = os.path.join(store.session_dir(session_id), name)
+        if os.path.join(root, name) == target:
+            continue
+        limiter.acquire()
+        with store._locks.hold(session_id):
+            if _move(os.path.join(root, name), target, dry_run):
+                moved += 1
+    store.close()
+    if not dry_run:
+        _remove_empty_shards(directory)
+    return moved, converted
+
+
+def reshard_transcripts(directory, depth, limiter, dry_run):
+    moved = 0
+    if not os.path.isdir(directory):
+        return moved
+    for root, name in list(_walk(directory)):
+        if not name.endswith(".json"):
+            continue
+        # main.save_history names files <session>_<timestamp>.json
+        key = name[:-len(".json")].rsplit("_", 1)[0]
+        target = os.path.join(shard_dir(directory, key, depth), name)
+        if os.path.join(root, name) == target:
+            continue
+        limiter.acquire()
+        if _move(os.path.join(root, name), target, dry_run):
+            moved += 1
+    if not dry_run:
+        _remove_empty_shards(directory)
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default=HISTORY_DIR, help="session history directory")
+    parser.add_argument("--transcripts", default=TRANSCRIPT_DIR, help="main.save_history transcript directory")
+    parser.add_argument("--depth", type=int, default=SHARD_DEPTH, help="shard directory levels")
+    parser.add_argument("--rate", type=float, default=0, help="max file operations per second (0 = unlimited)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without moving it")
+    args = parser.parse_args(argv)
+
+    limiter = RateLimiter(args.rate)
+    started = time.perf_counter()
+    moved, converted = reshard_sessions(args.history, args.depth, limiter, args.dry_run)
+    transcripts = reshard_transcripts(args.transcripts, args.depth, limiter, args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} {moved} session files, converted {converted} legacy sessions, "
+          f"{verb.lower()} {transcripts} transcripts in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# chatbot/tools/stress_admission.py
+"""
+Overload /chat with admission control off and on and compare what happens
+to latency.
+
+The app runs in its own process, with history in a scratch SQLite
+database. Its capacity is measured first with a few back-to-back clients.
+Turns then arrive open-loop at `--overload` times that rate from
+`--sessions` sessions for `--seconds`. Latency is counted from the moment a
+turn was due, so a client stuck behind the backlog is charged for the wait.
+Without admission the backlog and latency keep growing for the whole run;
+with it the excess is shed with 503/429 and the answered turns stay fast.
+Three turns in four enter a value, the fourth asks for a prediction.
+
+Run from the chatbot directory:
+    python -m tools.stress_admission [--overload 2.0] [--seconds 8] [--sessions 64] [--port 5091]
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+_SERVER = ("from app import app; import logging; logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+           "app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)")
+_TURNS = ["Web Dev", "budget 1000-3000", "30 days", "predict"]
+
+
+def _request(port, method, path, body=None, cookie=None, timeout=120):
+    """(status, headers, body) of one request on a fresh connection"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        headers = {"Content-Type": "application/json"}
+        if cookie:
+            headers["Cookie"] = cookie
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def _start_server(port, admission, scratch):
+    env = dict(os.environ, CHATBOT_ADMISSION="1" if admission else "0", CHATBOT_HISTORY_BACKEND="sqlite",
+               CHATBOT_HISTORY_DB=os.path.join(scratch, f"history-{int(admission)}.db"))
+    server = subprocess.Popen([sys.executable, "-c", _SERVER.format(port=port)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if _request(port, "GET", "/readyz", timeout=1)[0] == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not become ready")
+
+
+def _sessions(port, count):
+    """Cookies of `count` fresh sessions"""
+    cookies = []
+    for _ in range(count):
+        headers = _request(port, "GET", "/")[1]
+        cookies.append(headers.get("Set-Cookie", "").split(";")[0])
+    return cookies
+
+
+def _turn(port, i, cookie, due, results, lock):
+    message = _TURNS[i % len(_TURNS)]
+    try:
+        status = _request(port, "POST", "/chat", {"message": message}, cookie)[0]
+    except OSError:
+        status = 0
+    with lock:
+        results.append(("predict" if message == "predict" else "entry", status, (time.perf_counter() - due) * 1000.0))
+
+
+def capacity(port, cookies, seconds=3.0):
+    """Turns per second answered with one back-to-back client per session (up to 8)"""
+    results, lock, stop = [], threading.Lock(), threading.Event()
+
+    def _client(c):
+        i = c
+        while not stop.is_set():
+            _turn(port, i, cookies[c], time.perf_counter(), results, lock)
+            i += 1
+
+    threads = [threading.Thread(target=_client, args=(c,)) for c in range(min(8, len(cookies)))]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return len(results) / seconds
+
+
+def overload(port, cookies, rate, seconds):
+    """[(lane, status, ms)] of turns arriving at `rate` per second, and the seconds until all finished"""
+    results, lock, threads = [], threading.Lock(), []
+    began = time.perf_counter()
+    total = int(rate * seconds)
+    for i in range(total):
+        due = began + i / rate
+        time.sleep(max(0.0, due - time.perf_counter()))
+        t = threading.Thread(target=_turn, args=(port, i, cookies[i % len(cookies)], due, results, lock))
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - began
+
+
+def _report(name, results, elapsed):
+    for lane in ["predict", "entry"]:
+        items = [(status, ms) for l, status, ms in results if l == lane]
+        ok = np.array([ms for status, ms in items if status == 200])
+        shed = sum(1 for status, _ in items if status in (429, 503))
+        p50, p99 = (np.percentile(ok, 50), np.percentile(ok, 99)) if len(ok) else (0.0, 0.0)
+        print(f"{name:<4} {lane:<8} {len(items):>6} {len(ok):>6} {shed:>6} {len(items) - len(ok) - shed:>6} "
+              f"{p50:>9.0f} {p99:>9.0f}")
+    print(f"{name:<4} all turns finished after {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--overload", type=float, default=2.0, help="arrival rate as a multiple of capacity")
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--port", type=int, default=5091)
+    args = parser.parse_args()
+
+    rate = None
+    with tempfile.TemporaryDirectory() as scratch:
+        print(f"{'mode':<4} {'lane':<8} {'sent':>6} {'ok':>6} {'shed':>6} {'failed':>6} {'p50 ms':>9} {'p99 ms':>9}")
+        for name, enabled in [("off", False), ("on", True)]:
+            server = _start_server(args.port, enabled, scratch)
+            try:
+                cookies = _sessions(args.port, args.sessions)
+                if rate is None:
+                    rate = capacity(args.port, cookies) * args.overload
+                    print(f"arrivals at {rate:.0f} turns/s ({args.overload:.1f}x capacity) "
+                          f"from {args.sessions} sessions for {args.seconds:.0f}s")
+                _report(name, *overload(args.port, cookies, rate, args.seconds))
+                if enabled:
+                    print(json.loads(_request(args.port, "GET", "/metrics")[2])["admission"])
+            finally:
+                server.terminate()
+                server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
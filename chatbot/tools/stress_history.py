@@ -0,0 +1,131 @@
+# chatbot/tools/stress_history.py
+"""
+Concurrency stress check for the history stores.
+
+Several processes, each with several threads, write inputs and messages to a
+small set of shared sessions at once (plus a legacy file to migrate), then
+the result is checked: every input and message must be present and every
+log must hold exactly one meta line. Exits non-zero if anything was lost.
+
+Run from the chatbot directory:
+    python -m tools.stress_history [--backend file|sqlite] [--processes 4] [--threads 8] [--writes 200]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from utils.file_store import FileHistoryStore, read_log_events
+from utils.sqlite_store import SQLiteHistoryStore
+
+
+def _open_store(backend, directory):
+    if backend == "sqlite":
+        return SQLiteHistoryStore(os.path.join(directory, "history.db"))
+    return FileHistoryStore(directory, snapshot_every_bytes=4096)
+
+
+def _worker(backend, directory, process_id, threads, writes, sessions):
+    store = _open_store(backend, directory)
+
+    def run(thread_id):
+        for i in range(writes):
+            session_id = f"session-{i % sessions}"
+            variable = f"p{process_id}_t{thread_id}_w{i}"
+            store.append(session_id, [
+                {"type": "input", "variable": variable, "value": i, "timestamp": "t"},
+                {"type": "message", "role": "user", "message": variable, "timestamp": "t"},
+            ])
+            # Reads race the writes (and the legacy migration) too
+            if i % 10 == 0:
+                store.get_inputs(session_id)
+
+    workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    store.close()
+
+
+def _check(backend, directory, processes, threads, writes, sessions):
+    store = _open_store(backend, directory)
+    problems = []
+    for s in range(sessions):
+        session_id = f"session-{s}"
+        expected = {
+            f"p{p}_t{t}_w{i}"
+            for p in range(processes) for t in range(threads) for i in range(writes)
+            if i % sessions == s
+        }
+        if s == 0:
+            expected.add("legacy_input")
+        inputs = store.get_inputs(session_id)
+        missing = expected - set(inputs)
+        if missing:
+            problems.append(f"{session_id}: {len(missing)} inputs lost")
+
+        history = store.full_history(session_id) or {"conversation": []}
+        messages = {m["message"] for m in history["conversation"]}
+        if expected - {"legacy_input"} - messages:
+            problems.append(f"{session_id}: {len(expected - {'legacy_input'} - messages)} messages lost")
+
+        if backend == "file":
+            events, _ = read_log_events(store.log_path(session_id))
+            metas = sum(1 for e in events if e.get("type") == "meta")
+            if metas != 1:
+                problems.append(f"{session_id}: {metas} meta lines")
+    store.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["file", "sqlite"], default="file")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="writes per thread")
+    parser.add_argument("--sessions", type=int, default=4, help="shared sessions written to")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="history-stress-")
+    if args.backend == "file":
+        # A pre-log history file that every worker will try to migrate at once
+        legacy = {"session_id": "session-0", "created_at": "2024-01-01T00:00:00",
+                  "inputs": {"legacy_input": 1}, "conversation": []}
+        with open(os.path.join(directory, "session-0.json"), 'w', encoding='utf-8') as f:
+            json.dump(legacy, f)
+    else:
+        _open_store(args.backend, directory).append("session-0", [
+            {"type": "input", "variable": "legacy_input", "value": 1, "timestamp": "t"}])
+
+    started = time.perf_counter()
+    procs = [
+        multiprocessing.Process(target=_worker, args=(args.backend, directory, p, args.threads, args.writes, args.sessions))
+        for p in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    total = args.processes * args.threads * args.writes
+    print(f"{args.backend}: {total} appends from {args.processes}x{args.threads} writers "
+          f"in {elapsed:.2f}s ({total / elapsed:.0f}/s) -> {directory}")
+
+    problems = _check(args.backend, directory, args.processes, args.threads, args.writes, args.sessions)
+    for problem in problems:
+        print(f"  FAIL {problem}")
+    if problems:
+        return 1
+    print("  OK: no inputs or messages lost")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+# chatbot/utils/file_store.py
+import os
+import json
+import queue
+import re
+import threading
+from datetime import datetime
+
+from utils.locks import StripedFileLock
+from utils.sharding import shard_dir, iter_shard_dirs
+
+# Block size used when reading a log backwards
+_TAIL_BLOCK = 8192
+
+LOG_SUFFIX = ".log.jsonl"
+SNAPSHOT_SUFFIX = ".snap.json"
+
+
+def _safe_id(session_id):
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', str(session_id))
+
+
+def _message(event):
+    return {"role": event.get("role"), "message": event.get("message"), "timestamp": event.get("timestamp")}
+
+
+def read_log_events(path, offset=0):
+    """Parse complete log lines from offset; torn lines are skipped"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    events = []
+    for line in data[:end].splitlines():
+        if line.strip():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events, offset + end
+
+
+def legacy_events(history, session_id):
+    """Translate a pre-log <session>.json document into log events"""
+    created_at = history.get("created_at") or datetime.utcnow().isoformat()
+    updated_at = history.get("last_updated") or created_at
+    events = [{"type": "meta", "session_id": history.get("session_id", session_id), "created_at": created_at}]
+    for item in history.get("conversation", []):
+        events.append(dict(_message(item), type="message"))
+    for variable, value in history.get("inputs", {}).items():
+        events.append({"type": "input", "variable": variable, "value": value, "timestamp": updated_at})
+    return events
+
+
+def history_from_events(events, session_id):
+    """Fold log events into the {session_id, created_at, inputs, conversation} document"""
+    history = {"session_id": session_id, "created_at": None, "inputs": {}, "conversation": []}
+    for event in events:
+        kind = event.get("type")
+        if kind == "meta":
+            history["session_id"] = event.get("session_id", session_id)
+            history["created_at"] = history["created_at"] or event.get("created_at")
+        elif kind == "input":
+            history["inputs"][event["variable"]] = event.get("value")
+            history["last_updated"] = event.get("timestamp")
+        elif kind == "message":
+            history["conversation"].append(_message(event))
+            history["last_updated"] = event.get("timestamp")
+    return history
+
+
+class FileHistoryStore:
+    """
+    One append-only JSON-lines event log per session:
+        {"type": "meta", "session_id": ..., "created_at": ...}
+        {"type": "input", "variable": ..., "value": ..., "timestamp": ...}
+        {"type": "message", "role": ..., "message": ..., "timestamp": ...}
+    plus a snapshot file holding the inputs as of a byte offset into the log,
+    so current state is the snapshot plus a replay of the log tail. Snapshots
+    are refreshed by a background thread.
+
+    Files live in hash-sharded subdirectories (<directory>/ab/<id>.log.jsonl
+    for shard_depth=1) so no single directory grows without bound. Flat
+    files from before sharding are moved into place on first touch;
+    tools/reshard_history.py does it in bulk.
+
+    Every write to a session (append, clear, snapshot, legacy migration)
+    holds that session's striped lock, which is both a thread lock and an
+    advisory file lock, so concurrent requests and worker processes never
+    interleave. Reads take no lock: complete lines are atomic and torn ones
+    are skipped.
+    """
+
+    name = "file"
+
+    def __init__(self, directory, snapshot_every_bytes=16384, lock_stripes=64, shard_depth=1):
+        self.directory = directory
+        self.snapshot_every_bytes = snapshot_every_bytes
+        self.shard_depth = shard_depth
+        os.makedirs(directory, exist_ok=True)
+        self._locks = StripedFileLock(directory, stripes=lock_stripes)
+
+        # Only look for flat (pre-shard or legacy) files if any exist
+        self._has_flat = any(
+            entry.is_file() and entry.name.endswith((LOG_SUFFIX, SNAPSHOT_SUFFIX, ".json"))
+            for entry in os.scandir(directory)
+        )
+
+        self._snapshot_queue = queue.Queue()
+        self._snapshot_pending = set()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_worker = None
+
+    # ---------------- paths ----------------
+    def session_dir(self, session_id):
+        return shard_dir(self.directory, _safe_id(session_id), self.shard_depth)
+
+    def log_path(self, session_id):
+        return os.path.join(self.session_dir(session_id), f"{_safe_id(session_id)}{LOG_SUFFIX}")
+
+    def snapshot_path(self, session_id):
+        return os.path.join(self.session_dir(session_id), f"{_safe_id(session_id)}{SNAPSHOT_SUFFIX}")
+
+    def legacy_path(self, session_id):
+        return os.path.join(self.directory, f"{_safe_id(session_id)}.json")
+
+    def flat_paths(self, session_id):
+        """(log, snapshot) paths from before sharding"""
+        safe = _safe_id(session_id)
+        return (os.path.join(self.directory, f"{safe}{LOG_SUFFIX}"),
+                os.path.join(self.directory, f"{safe}{SNAPSHOT_SUFFIX}"))
+
+    # ---------------- log / snapshot internals ----------------
+    def _log_created_at(self, path):
+        """created_at from the log's leading meta event"""
+        try:
+            with open(path, 'rb') as f:
+                event = json.loads(f.readline())
+            return event.get("created_at") if event.get("type") == "meta" else None
+        except (OSError, ValueError):
+            return None
+
+    def _load_snapshot(self, session_id):
+        path = self.snapshot_path(session_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _replay(self, session_id):
+        """Current state: latest snapshot plus the events logged after it"""
+        path = self.log_path(session_id)
+        if not os.path.exists(path):
+            return None
+        snapshot = self._load_snapshot(session_id)
+        # A snapshot only applies to the log it was taken from (not one
+        # recreated after a reset)
+        if snapshot is None or snapshot.get("created_at") != self._log_created_at(path):
+            snapshot = {"inputs": {}, "offset": 0, "last_updated": None}
+        events, offset = read_log_events(path, snapshot.get("offset", 0))
+        state = {
+            "session_id": snapshot.get("session_id", session_id),
+            "created_at": snapshot.get("created_at"),
+            "inputs": dict(snapshot.get("inputs", {})),
+            "last_updated": snapshot.get("last_updated"),
+            "offset": offset,
+        }
+        for event in events:
+            kind = event.get("type")
+            if kind == "meta":
+                state["session_id"] = event.get("session_id", state["session_id"])
+                state["created_at"] = state["created_at"] or event.get("created_at")
+            elif kind == "input":
+                state["inputs"][event["variable"]] = event.get("value")
+                state["last_updated"] = event.get("timestamp")
+            elif kind == "message":
+                state["last_updated"] = event.get("timestamp")
+        return state
+
+    def write_snapshot(self, session_id):
+        """Persist replayed state atomically (write to a temp file, then rename)"""
+        with self._locks.hold(session_id):
+            state = self._replay(session_id)
+            if state is None:
+                return
+            path = self.snapshot_path(session_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+
+    def _migrate_legacy(self, session_id):
+        """Move flat files into their shard, or convert a pre-log <session>.json file, on first touch"""
+        if not self._has_flat:
+            return
+        flat_log, flat_snapshot = self.flat_paths(session_id)
+        if os.path.exists(flat_log):
+            with self._locks.hold(session_id):
+                if os.path.exists(flat_log) and not os.path.exists(self.log_path(session_id)):
+                    os.makedirs(self.session_dir(session_id), exist_ok=True)
+                    if os.path.exists(flat_snapshot):
+                        os.replace(flat_snapshot, self.snapshot_path(session_id))
+                    os.replace(flat_log, self.log_path(session_id))
+
+        legacy = self.legacy_path(session_id)
+        if not os.path.exists(legacy):
+            return
+        try:
+            with self._locks.hold(session_id):
+                # Another request or worker may have migrated it meanwhile
+                if not os.path.exists(legacy) or os.path.exists(self.log_path(session_id)):
+                    return
+                with open(legacy, 'r', encoding='utf-8') as f:
+                    events = legacy_events(json.load(f), session_id)
+                os.makedirs(self.session_dir(session_id), exist_ok=True)
+                tmp_path = f"{self.log_path(session_id)}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write("".join(json.dumps(event) + "\n" for event in events))
+                os.replace(tmp_path, self.log_path(session_id))
+                os.remove(legacy)
+        except Exception as e:
+            print(f"[file_store] Error migrating legacy history: {e}")
+
+    def _maybe_schedule_snapshot(self, session_id, log_size):
+        """Queue a snapshot refresh once enough log follows the last one"""
+        if log_size < self.snapshot_every_bytes:
+            return
+        snapshot = self._load_snapshot(session_id) or {}
+        if 0 <= log_size - snapshot.get("offset", 0) < self.snapshot_every_bytes:
+            return
+        with self._snapshot_lock:
+            if session_id in self._snapshot_pending:
+                return
+            self._snapshot_pending.add(session_id)
+            if self._snapshot_worker is None:
+                self._snapshot_worker = threading.Thread(target=self._snapshot_loop, name="history-compactor", daemon=True)
+                self._snapshot_worker.start()
+        self._snapshot_queue.put(session_id)
+
+    def _snapshot_loop(self):
+        while True:
+            session_id = self._snapshot_queue.get()
+            with self._snapshot_lock:
+                self._snapshot_pending.discard(session_id)
+            try:
+                self.write_snapshot(session_id)
+            except Exception as e:
+                print(f"[file_store] Error compacting history: {e}")
+
+    # ---------------- store API ----------------
+    def append(self, session_id, events):
+        """Append events with a single O_APPEND write under the session lock"""
+        self._migrate_legacy(session_id)
+        path = self.log_path(session_id)
+        with self._locks.hold(session_id):
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                events = [{"type": "meta", "session_id": session_id, "created_at": datetime.utcnow().isoformat()}] + list(events)
+            data = "".join(json.dumps(event) + "\n" for event in events).encode("utf-8")
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        self._maybe_schedule_snapshot(session_id, size)
+
+    def append_many(self, batch):
+        """Append [(session_id, events)]; one write per session"""
+        grouped = {}
+        for session_id, events in batch:
+            grouped.setdefault(session_id, []).extend(events)
+        for session_id, events in grouped.items():
+            self.append(session_id, events)
+
+    def get_inputs(self, session_id):
+        self._migrate_legacy(session_id)
+        state = self._replay(session_id)
+        return state["inputs"] if state else {}
+
+    def version(self, session_id):
+        """Token that changes whenever the session's log does (None if it has none)"""
+        try:
+            st = os.stat(self.log_path(session_id))
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def clear(self, session_id):
+        removed = False
+        with self._locks.hold(session_id):
+            paths = [self.log_path(session_id), self.snapshot_path(session_id), self.legacy_path(session_id)]
+            for path in paths + (list(self.flat_paths(session_id)) if self._has_flat else []):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed = True
+        return removed
+
+    def recent_messages(self, session_id, limit=10):
+        """Last `limit` messages, reading the log backwards"""
+        self._migrate_legacy(session_id)
+        path = self.log_path(session_id)
+        if not os.path.exists(path) or limit <= 0:
+            return []
+
+        messages = []
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            carry = b""
+            while position > 0 and len(messages) < limit:
+                read_size = min(_TAIL_BLOCK, position)
+                position -= read_size
+                f.seek(position)
+                lines = (f.read(read_size) + carry).split(b"\n")
+                # The first piece may be the end of a line that starts earlier
+                carry = lines.pop(0) if position > 0 else b""
+                for line in reversed(lines):
+                    if not line.strip():
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue  # torn write
+                    if event.get("type") == "message":
+                        messages.append(_message(event))
+                        if len(messages) >= limit:
+                            break
+        return list(reversed(messages))
+
+    def full_history(self, session_id):
+        self._migrate_legacy(session_id)
+        path = self.log_path(session_id)
+        if not os.path.exists(path):
+            return None
+        events, _ = read_log_events(path)
+        return history_from_events(events, session_id)
+
+    # ---------------- retention ----------------
+    def stale_sessions(self, cutoff):
+        """Yield ids of sessions whose log was last written before `cutoff` (epoch seconds)"""
+        for directory in iter_shard_dirs(self.directory, self.shard_depth):
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if not entry.name.endswith(LOG_SUFFIX):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        yield entry.name[:-len(LOG_SUFFIX)]
+                except FileNotFoundError:
+                    continue
+
+    def expire_sessions(self, session_ids, cutoff, keep=None):
+        """
+        Remove sessions still untouched since `cutoff`, passing each full
+        history to `keep` first (for archiving). Returns the ids removed.
+        """
+        expired = []
+        for session_id in session_ids:
+            with self._locks.hold(session_id):
+                path = self.log_path(session_id)
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue  # written to since it was listed
+                except FileNotFoundError:
+                    continue
+                if keep is not None:
+                    keep(self.full_history(session_id))
+                for stale in [path, self.snapshot_path(session_id)]:
+                    if os.path.exists(stale):
+                        os.remove(stale)
+            expired.append(session_id)
+        return expired
+
+    def close(self):
+        self._locks.close()
@@ -1,60 +1,222 @@
 # chatbot/utils/history_manager.py
+import atexit
 import os
-import json
+import threading
 from datetime import datetime
-import re
+
+from utils.file_store import FileHistoryStore
+from utils.janitor import HistoryJanitor
+from utils.locks import StripedFileLock, StripedLock
+from utils.session_cache import CachedHistoryStore
+from utils.sqlite_store import SQLiteHistoryStore
+from utils.transcript_archive import TranscriptArchive
 
 # Create history directory
 HISTORY_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "history")
 os.makedirs(HISTORY_DIR, exist_ok=True)
 
+# Completed-prediction transcripts written by main.save_history, in rotating
+# gzip segments that the janitor expires whole
+TRANSCRIPT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "user_history")
+TRANSCRIPTS = TranscriptArchive(
+    TRANSCRIPT_DIR,
+    max_segment_bytes=int(float(os.environ.get("CHATBOT_TRANSCRIPT_SEGMENT_MB", "16")) * 1024 * 1024),
+    max_segment_age=float(os.environ.get("CHATBOT_TRANSCRIPT_SEGMENT_HOURS", "24")) * 3600.0,
+)
+
+# Storage backend: "file" (one append-only log per session) or "sqlite"
+HISTORY_BACKEND = os.environ.get("CHATBOT_HISTORY_BACKEND", "file")
+HISTORY_DB_PATH = os.environ.get("CHATBOT_HISTORY_DB", os.path.join(HISTORY_DIR, "history.db"))
+
+# Refresh a session's snapshot once this many log bytes follow it (file backend)
+SNAPSHOT_EVERY_BYTES = int(os.environ.get("CHATBOT_HISTORY_SNAPSHOT_BYTES", "16384"))
+
+# Levels of two-hex-character shard directories (file backend and transcripts)
+SHARD_DEPTH = int(os.environ.get("CHATBOT_HISTORY_SHARD_DEPTH", "1"))
+
+# Retention: sessions untouched for HISTORY_TTL_HOURS are archived (or
+# deleted in "expire" mode) by a background janitor; 0 disables it
+HISTORY_TTL_HOURS = float(os.environ.get("CHATBOT_HISTORY_TTL_HOURS", "168"))
+JANITOR_MODE = os.environ.get("CHATBOT_HISTORY_JANITOR_MODE", "archive")
+JANITOR_INTERVAL = float(os.environ.get("CHATBOT_HISTORY_JANITOR_INTERVAL", "600"))
+JANITOR_OPS_PER_SECOND = float(os.environ.get("CHATBOT_HISTORY_JANITOR_OPS", "200"))
+ARCHIVE_DIR = os.path.join(HISTORY_DIR, "archive")
+
+# In-memory session cache in front of the store (0 disables it)
+SESSION_CACHE_SIZE = int(os.environ.get("CHATBOT_SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.environ.get("CHATBOT_SESSION_CACHE_TTL", "1800"))
+
+# When cached writes reach the store: "sync" (write-through), "batched"
+# (group commit, the request waits for its batch) or "async" (write-behind)
+HISTORY_DURABILITY = os.environ.get("CHATBOT_HISTORY_DURABILITY", "batched")
+HISTORY_FLUSH_INTERVAL_MS = float(os.environ.get("CHATBOT_HISTORY_FLUSH_INTERVAL_MS", "50"))
+HISTORY_FLUSH_BATCH = int(os.environ.get("CHATBOT_HISTORY_FLUSH_BATCH", "256"))
+
+# Pre-fork workers (serve.py) share the store and a session's turns may land
+# on any of them: turns are serialized across processes, and every write must
+# reach the store before its turn ends so the next worker's cache sees it
+PREFORK = os.environ.get("CHATBOT_PREFORK") == "1"
+if PREFORK and HISTORY_DURABILITY == "async":
+    print("[history_manager] Async history durability is single-process only; using 'batched' for pre-fork workers")
+    HISTORY_DURABILITY = "batched"
+
+_store = None
+_store_lock = threading.Lock()
+_janitor = None
+
+# Serializes whole chat turns per session (double-clicks, client retries),
+# across worker processes too when pre-forked. The lock files get their own
+# directory: flock on the store's lock files would deadlock with its writes.
+_LOCK_STRIPES = int(os.environ.get("CHATBOT_SESSION_LOCK_STRIPES", "256"))
+if PREFORK:
+    _turn_locks = StripedFileLock(os.path.join(HISTORY_DIR, "turns"), stripes=_LOCK_STRIPES)
+else:
+    _turn_locks = StripedLock(_LOCK_STRIPES)
+
+def session_lock(session_id):
+    """Context manager held for the duration of one request on a session"""
+    return _turn_locks.hold(session_id)
+
+def create_store(backend=None, cached=True):
+    """Instantiate a history store by backend name, behind the session cache unless disabled"""
+    backend = backend or HISTORY_BACKEND
+    if backend == "file":
+        store = FileHistoryStore(HISTORY_DIR, snapshot_every_bytes=SNAPSHOT_EVERY_BYTES, shard_depth=SHARD_DEPTH)
+    elif backend == "sqlite":
+        store = SQLiteHistoryStore(HISTORY_DB_PATH)
+    else:
+        raise ValueError(f"Unknown history backend: {backend}. Expected 'file' or 'sqlite'.")
+    if cached and SESSION_CACHE_SIZE > 0:
+        store = CachedHistoryStore(
+            store,
+            max_sessions=SESSION_CACHE_SIZE,
+            idle_ttl=SESSION_CACHE_TTL,
+            durability=HISTORY_DURABILITY,
+            flush_interval=HISTORY_FLUSH_INTERVAL_MS / 1000.0,
+            batch_size=HISTORY_FLUSH_BATCH,
+        )
+    return store
+
+def get_store():
+    """The process-wide history store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+def set_store(store):
+    """Swap the history store (e.g. for a different backend)"""
+    global _store
+    with _store_lock:
+        previous, _store = _store, store
+    if previous is not None and previous is not store:
+        previous.close()
+
+def flush_history(timeout=None):
+    """Write any queued history to the store; returns False on timeout"""
+    store = _store
+    if store is None or not hasattr(store, "flush"):
+        return True
+    try:
+        return store.flush(timeout)
+    except Exception as e:
+        print(f"[history_manager] Error flushing history: {e}")
+        return False
+
+def start_janitor():
+    """Start the background retention janitor once per process (no-op if disabled)"""
+    global _janitor
+    if HISTORY_TTL_HOURS <= 0:
+        return None
+    with _store_lock:
+        if _janitor is not None:
+            return _janitor
+    store = get_store()
+    cache = store if isinstance(store, CachedHistoryStore) else None
+    with _store_lock:
+        if _janitor is None:
+            _janitor = HistoryJanitor(
+                cache.backing if cache else store,
+                ttl=HISTORY_TTL_HOURS * 3600.0,
+                mode=JANITOR_MODE,
+                archive_dir=ARCHIVE_DIR,
+                interval=JANITOR_INTERVAL,
+                ops_per_second=JANITOR_OPS_PER_SECOND,
+                file_dirs=[TRANSCRIPT_DIR],
+                archives=[TRANSCRIPTS],
+                on_expire=cache.invalidate if cache else None,
+            ).start()
+    return _janitor
+
+def close_store():
+    """Flush and close the history store (registered to run at exit)"""
+    global _store, _janitor
+    with _store_lock:
+        janitor, _janitor = _janitor, None
+    if janitor is not None:
+        janitor.stop(timeout=5)
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        try:
+            store.close()
+        except Exception as e:
+            print(f"[history_manager] Error closing history store: {e}")
+
+atexit.register(close_store)
+
+def get_history_stats():
+    """Session cache and janitor counters"""
+    store = _store
+    return {
+        "session_cache": store.stats() if store is not None and hasattr(store, "stats") else None,
+        "janitor": _janitor.stats() if _janitor is not None else None,
+    }
+
 def save_user_input(session_id, variable, value):
     """
     Save user input for a specific variable in the session history
     """
     try:
-        safe_session_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(session_id))
-        history_file = os.path.join(HISTORY_DIR, f"{safe_session_id}.json")
-        
-        # Load existing history or create new
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        else:
-            history = {
-                "session_id": session_id,
-                "created_at": datetime.utcnow().isoformat(),
-                "inputs": {},
-                "conversation": []
-            }
-        
-        # Update inputs
-        history["inputs"][variable] = value
-        history["last_updated"] = datetime.utcnow().isoformat()
-        
-        # Save back to file
-        with open(history_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2)
-            
+        get_store().append(session_id, [{
+            "type": "input",
+            "variable": variable,
+            "value": value,
+            "timestamp": datetime.utcnow().isoformat()
+        }])
         return True
     except Exception as e:
         print(f"[history_manager] Error saving input: {e}")
         return False
 
+def save_user_inputs(session_id, values, messages=()):
+    """
+    Save several {variable: value} inputs with one write, along with any
+    (role, message) conversation entries that go with them
+    """
+    try:
+        timestamp = datetime.utcnow().isoformat()
+        get_store().append(session_id, [
+            {"type": "input", "variable": variable, "value": value, "timestamp": timestamp}
+            for variable, value in values.items()
+        ] + [
+            {"type": "message", "role": role, "message": message, "timestamp": timestamp}
+            for role, message in messages
+        ])
+        return True
+    except Exception as e:
+        print(f"[history_manager] Error saving inputs: {e}")
+        return False
+
 def get_user_history(session_id):
     """
     Get all collected inputs for a session
     Returns dictionary of collected inputs
     """
     try:
-        safe_session_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(session_id))
-        history_file = os.path.join(HISTORY_DIR, f"{safe_session_id}.json")
-        
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-                return history.get("inputs", {})
-        return {}
+        return get_store().get_inputs(session_id)
     except Exception as e:
         print(f"[history_manager] Error loading history: {e}")
         return {}
@@ -64,33 +226,12 @@ def save_conversation(session_id, role, message):
     Save conversation message to history
     """
     try:
-        safe_session_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(session_id))
-        history_file = os.path.join(HISTORY_DIR, f"{safe_session_id}.json")
-        
-        # Load existing history or create new
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        else:
-            history = {
-                "session_id": session_id,
-                "created_at": datetime.utcnow().isoformat(),
-                "inputs": {},
-                "conversation": []
-            }
-        
-        # Add conversation message
-        history["conversation"].append({
+        get_store().append(session_id, [{
+            "type": "message",
             "role": role,
             "message": message,
             "timestamp": datetime.utcnow().isoformat()
-        })
-        history["last_updated"] = datetime.utcnow().isoformat()
-        
-        # Save back to file
-        with open(history_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2)
-            
+        }])
         return True
     except Exception as e:
         print(f"[history_manager] Error saving conversation: {e}")
@@ -101,29 +242,27 @@ def clear_history(session_id):
     Clear history for a session
     """
     try:
-        safe_session_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(session_id))
-        history_file = os.path.join(HISTORY_DIR, f"{safe_session_id}.json")
-        
-        if os.path.exists(history_file):
-            os.remove(history_file)
-            return True
-        return False
+        return get_store().clear(session_id)
     except Exception as e:
         print(f"[history_manager] Error clearing history: {e}")
         return False
 
+def get_recent_conversation(session_id, limit=10):
+    """
+    Get the last `limit` conversation messages without reading the whole history
+    """
+    try:
+        return get_store().recent_messages(session_id, limit)
+    except Exception as e:
+        print(f"[history_manager] Error reading recent conversation: {e}")
+        return []
+
 def get_full_history(session_id):
     """
     Get complete history including conversation
     """
     try:
-        safe_session_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(session_id))
-        history_file = os.path.join(HISTORY_DIR, f"{safe_session_id}.json")
-        
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        return get_store().full_history(session_id)
     except Exception as e:
         print(f"[history_manager] Error loading full history: {e}")
         return None
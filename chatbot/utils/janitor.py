@@ -0,0 +1,213 @@
+# chatbot/utils/janitor.py
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from utils.sharding import is_shard_name
+
+JANITOR_MODES = ["expire", "archive"]
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` operations per second, in bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def acquire(self, n=1):
+        if self.rate <= 0:
+            return  # unlimited
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= min(n, self.burst):
+                self._tokens -= n
+                return
+            time.sleep((min(n, self.burst) - self._tokens) / self.rate)
+
+
+def append_archive(archive_dir, record, prefix="history"):
+    """Append one record to today's <prefix>-YYYYMMDD.jsonl.gz (one gzip member per record)"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{prefix}-{datetime.utcnow().strftime('%Y%m%d')}.jsonl.gz")
+    data = gzip.compress((json.dumps(record) + "\n").encode("utf-8"))
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def append_archive_file(archive_dir, path, prefix="history"):
+    """Append a file of gzip members (a transcript segment) to today's <prefix>-YYYYMMDD.jsonl.gz"""
+    os.makedirs(archive_dir, exist_ok=True)
+    target = os.path.join(archive_dir, f"{prefix}-{datetime.utcnow().strftime('%Y%m%d')}.jsonl.gz")
+    # Concatenated gzip members are still one valid gzip stream
+    with open(path, 'rb') as src, open(target, 'ab') as dst:
+        shutil.copyfileobj(src, dst)
+
+
+class HistoryJanitor:
+    """
+    Background retention for session history.
+
+    Every `interval` seconds, sessions (and transcript files in
+    `file_dirs`) untouched for `ttl` seconds are removed in batches of
+    `batch_size`; in "archive" mode each one is first appended to a
+    compressed archive under `archive_dir`. Transcript archives in
+    `archives` are expired a whole closed segment at a time. I/O is paced by
+    a token bucket (`ops_per_second`) so a large backlog never competes with
+    requests.
+    """
+
+    def __init__(self, store, ttl, mode="archive", archive_dir=None, interval=600.0,
+                 ops_per_second=200.0, batch_size=100, file_dirs=None, archives=None, on_expire=None):
+        if mode not in JANITOR_MODES:
+            raise ValueError(f"Unknown janitor mode: {mode}. Expected one of: {', '.join(JANITOR_MODES)}")
+        if mode == "archive" and not archive_dir:
+            raise ValueError("archive mode needs an archive_dir")
+        self.store = store
+        self.ttl = float(ttl)
+        self.mode = mode
+        self.archive_dir = archive_dir
+        self.interval = float(interval)
+        self.batch_size = max(1, int(batch_size))
+        self.file_dirs = list(file_dirs or [])
+        self.archives = list(archives or [])
+        self.on_expire = on_expire
+        self.limiter = RateLimiter(ops_per_second)
+
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.sessions_expired = 0
+        self.files_expired = 0
+        self.segments_expired = 0
+        self.errors = 0
+        self.last_run = None
+
+    # ---------------- sweeps ----------------
+    def _keep_session(self, history):
+        if self.mode == "archive" and history is not None:
+            append_archive(self.archive_dir, history, prefix="history")
+
+    def sweep_sessions(self, cutoff):
+        expired = 0
+        batch = []
+        for session_id in self.store.stale_sessions(cutoff):
+            batch.append(session_id)
+            if len(batch) >= self.batch_size:
+                expired += self._expire_batch(batch, cutoff)
+                batch = []
+            if self._stop.is_set():
+                break
+        if batch:
+            expired += self._expire_batch(batch, cutoff)
+        return expired
+
+    def _expire_batch(self, batch, cutoff):
+        self.limiter.acquire(len(batch))
+        expired = self.store.expire_sessions(batch, cutoff, keep=self._keep_session)
+        if self.on_expire is not None:
+            for session_id in expired:
+                self.on_expire(session_id)
+        return len(expired)
+
+    def sweep_files(self, directory, cutoff):
+        """Expire or archive *.json transcript files (flat or sharded) under directory"""
+        expired = 0
+        for root, dirs, files in os.walk(directory):
+            # Only descend into shard directories
+            dirs[:] = [d for d in dirs if is_shard_name(d)]
+            for name in files:
+                if not name.endswith(".json") or self._stop.is_set():
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                    self.limiter.acquire()
+                    if self.mode == "archive":
+                        with open(path, 'r', encoding='utf-8') as f:
+                            record = json.load(f)
+                        append_archive(self.archive_dir, record, prefix="transcripts")
+                    os.remove(path)
+                    expired += 1
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError) as e:
+                    self.errors += 1
+                    print(f"[janitor] Error expiring {path}: {e}")
+        return expired
+
+    def _keep_segment(self, path):
+        self.limiter.acquire()
+        if self.mode == "archive":
+            append_archive_file(self.archive_dir, path, prefix="transcripts")
+
+    def sweep_segments(self, archive, cutoff):
+        """Expire or archive closed transcript segments last written before the cutoff"""
+        try:
+            return archive.expire_segments(cutoff, keep=self._keep_segment, stop=self._stop.is_set)
+        except OSError as e:
+            self.errors += 1
+            print(f"[janitor] Error expiring transcript segments in {archive.directory}: {e}")
+            return 0
+
+    def run_once(self, now=None):
+        """One full pass; returns (sessions, files) removed (segments count as files)"""
+        cutoff = (now if now is not None else time.time()) - self.ttl
+        sessions = files = 0
+        try:
+            sessions = self.sweep_sessions(cutoff)
+        except Exception as e:
+            self.errors += 1
+            print(f"[janitor] Error expiring sessions: {e}")
+        for directory in self.file_dirs:
+            files += self.sweep_files(directory, cutoff)
+        segments = sum(self.sweep_segments(archive, cutoff) for archive in self.archives)
+        self.runs += 1
+        self.sessions_expired += sessions
+        self.files_expired += files
+        self.segments_expired += segments
+        files += segments
+        self.last_run = datetime.utcnow().isoformat()
+        return sessions, files
+
+    # ---------------- thread ----------------
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="history-janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "ttl_seconds": self.ttl,
+            "runs": self.runs,
+            "sessions_expired": self.sessions_expired,
+            "files_expired": self.files_expired,
+            "segments_expired": self.segments_expired,
+            "errors": self.errors,
+            "last_run": self.last_run,
+        }
@@ -0,0 +1,117 @@
+# chatbot/utils/locks.py
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+
+def stripe_of(key, stripes):
+    """Stable stripe index for a key (the same in every process)"""
+    return zlib.crc32(str(key).encode("utf-8")) % stripes
+
+
+class StripedLock:
+    """
+    A fixed pool of re-entrant locks; a key always maps to the same one, so
+    work on one session is serialized while other sessions (almost always
+    on other stripes) run in parallel.
+    """
+
+    def __init__(self, stripes=256):
+        self.stripes = stripes
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def for_key(self, key):
+        return self._locks[stripe_of(key, self.stripes)]
+
+    @contextmanager
+    def hold(self, key):
+        with self.for_key(key):
+            yield
+
+
+def _lock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class StripedFileLock:
+    """
+    Striped locks that also hold across processes (several gunicorn workers
+    sharing one history directory).
+
+    Each stripe is a thread lock plus an advisory lock on one of `stripes`
+    lock files under `<directory>/.locks`; the number of lock files stays
+    fixed however many sessions exist. Uses fcntl.flock on POSIX and
+    msvcrt.locking on Windows; without either only the in-process lock is
+    taken.
+    """
+
+    def __init__(self, directory, stripes=64):
+        self.directory = os.path.join(directory, ".locks")
+        self.stripes = stripes
+        self._threads = StripedLock(stripes)
+        self._fds = {}
+        self._pid = os.getpid()
+        self._depth = [0] * stripes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _fd(self, stripe):
+        # A forked child shares its parent's open file descriptions, and
+        # flock is per description, so reopen the files after a fork
+        if os.getpid() != self._pid:
+            self._fds = {}
+            self._pid = os.getpid()
+        fd = self._fds.get(stripe)
+        if fd is None:
+            path = os.path.join(self.directory, f"{stripe:03d}.lock")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._fds[stripe] = fd
+        return fd
+
+    @contextmanager
+    def hold(self, key):
+        stripe = stripe_of(key, self.stripes)
+        with self._threads.for_key(key):
+            # Re-entrant: only the outermost hold takes the file lock
+            outermost = self._depth[stripe] == 0
+            self._depth[stripe] += 1
+            try:
+                if outermost:
+                    fd = self._fd(stripe)
+                    _lock_fd(fd)
+                try:
+                    yield
+                finally:
+                    if outermost:
+                        _unlock_fd(fd)
+            finally:
+                self._depth[stripe] -= 1
+
+    def close(self):
+        for fd in self._fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = {}
@@ -0,0 +1,347 @@
+# chatbot/utils/session_cache.py
+import threading
+import time
+from collections import OrderedDict, deque
+
+DURABILITY_MODES = ["sync", "batched", "async"]
+
+
+class _PendingOp:
+    """One queued write; `done` is set once the backing store has it"""
+
+    __slots__ = ("kind", "session_id", "events", "seq", "done", "error")
+
+    def __init__(self, kind, session_id, events, seq):
+        self.kind = kind
+        self.session_id = session_id
+        self.events = events
+        self.seq = seq
+        self.done = threading.Event()
+        self.error = None
+
+
+class CachedHistoryStore:
+    """
+    In-process cache of session inputs in front of a history store, with
+    write-behind persistence.
+
+    Active sessions are kept in an LRU (bounded size, evicted after `idle_ttl`
+    seconds without access), so a chat turn reads its state from memory.
+    Writes update the cache immediately and reach the backing store according
+    to `durability`:
+
+    - "sync":    written through on the caller's thread
+    - "batched": queued; the caller waits until the background flusher has
+                 committed the batch containing it (group commit)
+    - "async":   queued; the caller returns at once and the flusher commits
+                 every `flush_interval` seconds or `batch_size` writes
+
+    Sessions with unflushed writes are never evicted, so a cache miss can
+    always be served from the backing store. Reads that need the full
+    conversation flush first.
+
+    Other processes (pre-fork workers, tools) may write the same store, so
+    a cached entry is only trusted while the backing store's version token
+    for the session (log size/mtime, or SQLite last_updated) still matches
+    the one it was loaded or last flushed at; otherwise it is reloaded.
+    Entries with unflushed writes of our own are trusted as they are. The
+    token is refreshed after each flush, which assumes no other process
+    writes the session between our write and that refresh: true for "sync"
+    and "batched" while turns hold a cross-process session lock, but not
+    for "async", which is therefore for single-process use only.
+    """
+
+    def __init__(self, backing, max_sessions=10000, idle_ttl=1800.0, durability="batched",
+                 flush_interval=0.05, batch_size=256):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}. Expected one of: {', '.join(DURABILITY_MODES)}")
+        self.backing = backing
+        self.name = f"cached-{backing.name}"
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_ttl = float(idle_ttl)
+        self.durability = durability
+        self.flush_interval = float(flush_interval)
+        self.batch_size = max(1, int(batch_size))
+
+        self._entries = OrderedDict()   # session_id -> {"inputs": dict, "version": token, "last_access": float}
+        self._dirty = {}                # session_id -> unflushed op count
+        self._lock = threading.Lock()
+
+        self._queue = deque()
+        self._queue_cond = threading.Condition(self._lock)
+        self._flushed_cond = threading.Condition(self._lock)
+        self._next_seq = 0
+        self._flushed_seq = 0
+        self._stopped = False
+        self._flusher = None
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.flush_errors = 0
+
+        if durability != "sync":
+            self._flusher = threading.Thread(target=self._flush_loop, name="history-flusher", daemon=True)
+            self._flusher.start()
+
+    # ---------------- cache ----------------
+    def _evict(self, now):
+        """Drop idle and over-capacity clean entries (lock held)"""
+        for session_id in list(self._entries):
+            entry = self._entries[session_id]
+            over_capacity = len(self._entries) > self.max_sessions
+            idle = now - entry["last_access"] > self.idle_ttl
+            if not over_capacity and not idle:
+                break  # LRU order: everything after this is newer
+            if self._dirty.get(session_id):
+                continue
+            del self._entries[session_id]
+            self.evictions += 1
+
+    def _version(self, session_id):
+        """The backing store's version token for a session (None if it keeps none)"""
+        version = getattr(self.backing, "version", None)
+        return version(session_id) if version is not None else None
+
+    def _touch(self, session_id, entry, now):
+        """Count a hit and mark the entry recently used (lock held)"""
+        self.hits += 1
+        entry["last_access"] = now
+        self._entries.move_to_end(session_id)
+        return entry
+
+    def _entry(self, session_id):
+        """
+        Cached entry, loading it from the backing store on a miss (lock not
+        held: the version check and the load run outside it, so store I/O
+        for one session never blocks the others or the flusher)
+        """
+        now = time.monotonic()
+        with self._lock:
+            seen = self._entries.get(session_id)
+            # Unflushed writes mean the cached copy is still the newest state
+            if seen is not None and self._dirty.get(session_id):
+                return self._touch(session_id, seen, now)
+            cached_version = seen["version"] if seen is not None else None
+            fresh = seen is not None and now - seen["last_access"] <= self.idle_ttl
+
+        # Token first: a write landing during the load makes it mismatch later
+        version = self._version(session_id)
+        if fresh and version == cached_version:
+            with self._lock:
+                if self._entries.get(session_id) is seen:
+                    return self._touch(session_id, seen, now)
+            # Replaced meanwhile: fall through and settle it below
+        inputs = dict(self.backing.get_inputs(session_id))
+
+        with self._lock:
+            current = self._entries.get(session_id)
+            if current is not seen and current is not None:
+                # Written or loaded by another thread while we read: newer
+                return self._touch(session_id, current, now)
+            if current is not None and self._dirty.get(session_id):
+                return self._touch(session_id, current, now)
+            if fresh:
+                self.stale += 1  # written behind the cache, e.g. by another worker
+            self.misses += 1
+            entry = {"inputs": inputs, "version": version, "last_access": now}
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            self._evict(now)
+            return entry
+
+    # ---------------- write-behind ----------------
+    def _submit(self, kind, session_id, events=None):
+        """Queue a write (lock held); returns the op"""
+        self._next_seq += 1
+        op = _PendingOp(kind, session_id, events, self._next_seq)
+        self._dirty[session_id] = self._dirty.get(session_id, 0) + 1
+        self._queue.append(op)
+        self._queue_cond.notify()
+        return op
+
+    def _wait(self, op):
+        op.done.wait()
+        if op.error is not None:
+            raise op.error
+
+    def _apply(self, ops):
+        """Write ops to the backing store in order, batching consecutive appends"""
+        i = 0
+        while i < len(ops):
+            if ops[i].kind == "clear":
+                try:
+                    self.backing.clear(ops[i].session_id)
+                except Exception as e:
+                    ops[i].error = e
+                i += 1
+                continue
+            group = []
+            while i < len(ops) and ops[i].kind == "append":
+                group.append(ops[i])
+                i += 1
+            try:
+                self.backing.append_many([(op.session_id, op.events) for op in group])
+            except Exception as e:
+                for op in group:
+                    op.error = e
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._stopped:
+                    self._queue_cond.wait()
+                if not self._queue and self._stopped:
+                    return
+            # Async mode lingers so writes accumulate into bigger transactions;
+            # batched mode commits whatever queued while the last batch ran
+            if self.durability == "async" and not self._stopped:
+                time.sleep(self.flush_interval)
+
+            with self._lock:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+            self._apply(batch)
+            # New version tokens for the sessions written, taken before any
+            # waiting turn is released (see the class docstring)
+            versions = {op.session_id: self._version(op.session_id) for op in batch if op.error is None}
+
+            with self._lock:
+                for op in batch:
+                    remaining = self._dirty.get(op.session_id, 0) - 1
+                    if remaining > 0:
+                        self._dirty[op.session_id] = remaining
+                    else:
+                        self._dirty.pop(op.session_id, None)
+                    if op.error is not None:
+                        self.flush_errors += 1
+                        print(f"[session_cache] Error flushing history: {op.error}")
+                        # Once nothing else is queued for the session, force
+                        # the next read back to the backing store
+                        if op.session_id not in self._dirty:
+                            self._entries.pop(op.session_id, None)
+                    elif op.session_id not in self._dirty and op.session_id in self._entries:
+                        self._entries[op.session_id]["version"] = versions[op.session_id]
+                self.flushes += 1
+                self.flushed_ops += len(batch)
+                self._flushed_seq = max(self._flushed_seq, batch[-1].seq)
+                self._flushed_cond.notify_all()
+            for op in batch:
+                op.done.set()
+
+    def flush(self, timeout=None):
+        """Block until every write queued so far has reached the backing store"""
+        if self._flusher is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            target = self._next_seq
+            while self._flushed_seq < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._flushed_cond.wait(remaining)
+        return True
+
+    # ---------------- store API ----------------
+    def append(self, session_id, events):
+        if self.durability == "sync":
+            # Write through first so a failed write never reaches the cache;
+            # the cached entry is only updated if nobody else wrote meanwhile
+            entry = self._entry(session_id)
+            with self._lock:
+                before = entry["version"]
+            self.backing.append(session_id, events)
+            after = self._version(session_id)
+            with self._lock:
+                if self._entries.get(session_id) is not entry or entry["version"] != before:
+                    self._entries.pop(session_id, None)
+                    return
+                for event in events:
+                    if event.get("type") == "input":
+                        entry["inputs"][event["variable"]] = event.get("value")
+                entry["version"] = after
+            return
+
+        entry = self._entry(session_id)
+        with self._lock:
+            # Evicted or replaced since it was read: write to what is cached now
+            entry = self._entries.setdefault(session_id, entry)
+            for event in events:
+                if event.get("type") == "input":
+                    entry["inputs"][event["variable"]] = event.get("value")
+            op = self._submit("append", session_id, list(events))
+
+        if self.durability == "batched":
+            self._wait(op)
+
+    def append_many(self, batch):
+        for session_id, events in batch:
+            self.append(session_id, events)
+
+    def get_inputs(self, session_id):
+        entry = self._entry(session_id)
+        with self._lock:
+            return dict(entry["inputs"])
+
+    def clear(self, session_id):
+        if self.durability == "sync":
+            removed = self.backing.clear(session_id)
+            with self._lock:
+                self._entries.pop(session_id, None)
+            return removed
+
+        with self._lock:
+            self._entries[session_id] = {"inputs": {}, "version": None, "last_access": time.monotonic()}
+            self._entries.move_to_end(session_id)
+            op = self._submit("clear", session_id)
+
+        if self.durability == "batched":
+            self._wait(op)
+        return True
+
+    def invalidate(self, session_id):
+        """Forget a cached session (e.g. after it was expired behind the cache)"""
+        with self._lock:
+            if not self._dirty.get(session_id):
+                self._entries.pop(session_id, None)
+
+    def recent_messages(self, session_id, limit=10):
+        self.flush()
+        return self.backing.recent_messages(session_id, limit)
+
+    def full_history(self, session_id):
+        self.flush()
+        return self.backing.full_history(session_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "durability": self.durability,
+                "sessions": len(self._entries),
+                "max_sessions": self.max_sessions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "pending_writes": len(self._queue),
+                "dirty_sessions": len(self._dirty),
+                "flushes": self.flushes,
+                "flushed_writes": self.flushed_ops,
+                "flush_errors": self.flush_errors,
+            }
+
+    def close(self):
+        """Flush pending writes, stop the flusher and close the backing store"""
+        self.flush()
+        with self._lock:
+            self._stopped = True
+            self._queue_cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.backing.close()
@@ -0,0 +1,35 @@
+# chatbot/utils/sharding.py
+import hashlib
+import os
+import re
+
+_SHARD_NAME = re.compile(r'^[0-9a-f]{2}$')
+
+
+def shard_parts(key, depth):
+    """Two hex characters of the key's hash per directory level"""
+    digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()
+    return [digest[2 * i:2 * i + 2] for i in range(depth)]
+
+
+def shard_dir(directory, key, depth):
+    """Directory that holds `key`'s files: <directory>/ab/cd/... (depth levels)"""
+    return os.path.join(directory, *shard_parts(key, depth))
+
+
+def is_shard_name(name):
+    return bool(_SHARD_NAME.match(name))
+
+
+def iter_shard_dirs(directory, depth):
+    """Existing leaf shard directories under directory"""
+    if depth <= 0:
+        if os.path.isdir(directory):
+            yield directory
+        return
+    try:
+        entries = sorted(e.name for e in os.scandir(directory) if e.is_dir() and is_shard_name(e.name))
+    except FileNotFoundError:
+        return
+    for name in entries:
+        yield from iter_shard_dirs(os.path.join(directory, name), depth - 1)
@@ -0,0 +1,206 @@
+# chatbot/utils/sqlite_store.py
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id   TEXT PRIMARY KEY,
+    created_at   TEXT NOT NULL,
+    last_updated TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_last_updated ON sessions (last_updated);
+CREATE TABLE IF NOT EXISTS inputs (
+    session_id TEXT NOT NULL,
+    variable   TEXT NOT NULL,
+    value      TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (session_id, variable)
+);
+CREATE INDEX IF NOT EXISTS inputs_session_time ON inputs (session_id, updated_at);
+CREATE TABLE IF NOT EXISTS conversation (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role       TEXT,
+    message    TEXT,
+    timestamp  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversation_session_time ON conversation (session_id, timestamp, id);
+"""
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the prepared form
+_UPSERT_SESSION = (
+    "INSERT INTO sessions (session_id, created_at, last_updated) VALUES (?, ?, ?) "
+    "ON CONFLICT(session_id) DO UPDATE SET last_updated = excluded.last_updated"
+)
+_UPSERT_INPUT = (
+    "INSERT INTO inputs (session_id, variable, value, updated_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(session_id, variable) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at"
+)
+_INSERT_MESSAGE = "INSERT INTO conversation (session_id, role, message, timestamp) VALUES (?, ?, ?, ?)"
+_SELECT_INPUTS = "SELECT variable, value FROM inputs WHERE session_id = ?"
+_SELECT_SESSION = "SELECT session_id, created_at, last_updated FROM sessions WHERE session_id = ?"
+_SELECT_RECENT = (
+    "SELECT role, message, timestamp FROM conversation WHERE session_id = ? "
+    "ORDER BY timestamp DESC, id DESC LIMIT ?"
+)
+_SELECT_VERSION = (
+    "SELECT last_updated, (SELECT MAX(id) FROM conversation WHERE session_id = ?) "
+    "FROM sessions WHERE session_id = ?"
+)
+_SELECT_STALE = "SELECT session_id FROM sessions WHERE last_updated < ? ORDER BY last_updated"
+_SELECT_CONVERSATION = (
+    "SELECT role, message, timestamp FROM conversation WHERE session_id = ? ORDER BY timestamp, id"
+)
+
+
+class SQLiteHistoryStore:
+    """
+    Session history in one SQLite database in WAL mode, so readers never
+    block the writer. Each thread gets its own connection from a small pool;
+    every append (or batch of appends) is a single transaction.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        """Per-thread connection, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0,
+                                   check_same_thread=False, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _write(self, conn, session_id, events):
+        now = datetime.utcnow().isoformat()
+        created_at = now
+        last_updated = None
+        inputs, messages = [], []
+        for event in events:
+            kind = event.get("type")
+            if kind == "meta":
+                created_at = event.get("created_at") or created_at
+            elif kind == "input":
+                timestamp = event.get("timestamp") or now
+                inputs.append((session_id, event["variable"], json.dumps(event.get("value")), timestamp))
+                last_updated = timestamp
+            elif kind == "message":
+                timestamp = event.get("timestamp") or now
+                messages.append((session_id, event.get("role"), event.get("message"), timestamp))
+                last_updated = timestamp
+        conn.execute(_UPSERT_SESSION, (session_id, created_at, last_updated or created_at))
+        if inputs:
+            conn.executemany(_UPSERT_INPUT, inputs)
+        if messages:
+            conn.executemany(_INSERT_MESSAGE, messages)
+
+    def append(self, session_id, events):
+        conn = self._connection()
+        with conn:
+            self._write(conn, session_id, events)
+
+    def append_many(self, batch):
+        """Write [(session_id, events)] in one transaction"""
+        conn = self._connection()
+        with conn:
+            for session_id, events in batch:
+                self._write(conn, session_id, events)
+
+    def get_inputs(self, session_id):
+        rows = self._connection().execute(_SELECT_INPUTS, (session_id,)).fetchall()
+        return {variable: json.loads(value) for variable, value in rows}
+
+    def version(self, session_id):
+        """Token that changes whenever the session is written (None if it doesn't exist)"""
+        row = self._connection().execute(_SELECT_VERSION, (session_id, session_id)).fetchone()
+        return tuple(row) if row else None
+
+    def clear(self, session_id):
+        conn = self._connection()
+        with conn:
+            removed = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            conn.execute("DELETE FROM inputs WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM conversation WHERE session_id = ?", (session_id,))
+        return removed > 0
+
+    def recent_messages(self, session_id, limit=10):
+        if limit <= 0:
+            return []
+        rows = self._connection().execute(_SELECT_RECENT, (session_id, limit)).fetchall()
+        return [{"role": r, "message": m, "timestamp": t} for r, m, t in reversed(rows)]
+
+    def full_history(self, session_id):
+        conn = self._connection()
+        session = conn.execute(_SELECT_SESSION, (session_id,)).fetchone()
+        if session is None:
+            return None
+        conversation = conn.execute(_SELECT_CONVERSATION, (session_id,)).fetchall()
+        return {
+            "session_id": session[0],
+            "created_at": session[1],
+            "last_updated": session[2],
+            "inputs": self.get_inputs(session_id),
+            "conversation": [{"role": r, "message": m, "timestamp": t} for r, m, t in conversation],
+        }
+
+    # ---------------- retention ----------------
+    def stale_sessions(self, cutoff):
+        """Yield ids of sessions last updated before `cutoff` (epoch seconds)"""
+        cutoff_iso = datetime.utcfromtimestamp(cutoff).isoformat()
+        rows = self._connection().execute(_SELECT_STALE, (cutoff_iso,)).fetchall()
+        for (session_id,) in rows:
+            yield session_id
+
+    def expire_sessions(self, session_ids, cutoff, keep=None):
+        """
+        Remove sessions still untouched since `cutoff` in one transaction,
+        passing each full history to `keep` first. Returns the ids removed.
+        """
+        cutoff_iso = datetime.utcfromtimestamp(cutoff).isoformat()
+        conn = self._connection()
+        expired = []
+        with conn:
+            for session_id in session_ids:
+                row = conn.execute("SELECT last_updated FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                if row is None or (row[0] or "") >= cutoff_iso:
+                    continue
+                if keep is not None:
+                    keep(self.full_history(session_id))
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM inputs WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM conversation WHERE session_id = ?", (session_id,))
+                expired.append(session_id)
+        return expired
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+        self._local = threading.local()
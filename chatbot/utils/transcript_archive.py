@@ -0,0 +1,239 @@
+# chatbot/utils/transcript_archive.py
+import gzip
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx.jsonl"
+
+_SEGMENT_NAME = re.compile(r'^transcripts-(\d{8}T\d{6})-\d+-\d+\.jsonl\.gz$')
+
+# Shared by every archive in the process so segment and record ids never repeat
+_counter = itertools.count()
+
+
+class TranscriptArchive:
+    """
+    Append-only archive of completed prediction transcripts.
+
+    Records go into gzip JSON-lines segments, one gzip member per record, so
+    any record can be decompressed on its own given its byte range while the
+    whole segment still reads as one stream with gzip.open. Each segment has
+    a sidecar index (<segment>.idx.jsonl) of
+        {"id", "session_id", "timestamp", "offset", "length"}
+    and a segment is closed once it reaches `max_segment_bytes` or
+    `max_segment_age` seconds. Every process writes its own segments (the
+    pid is in the name), so writers never contend on a file.
+
+    Retention works on whole segments (expire_segments). Readers in every
+    process forget a segment once its files are gone.
+    """
+
+    def __init__(self, directory, max_segment_bytes=16 * 1024 * 1024, max_segment_age=86400.0):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_opened = 0.0
+        self._segment_size = 0
+        self._pid = None
+
+        # id -> entry and session_id -> [id], refreshed from the index files
+        self._by_id = {}
+        self._by_session = {}
+        self._index_offsets = {}
+
+    # ---------------- writing ----------------
+    def _open_segment(self):
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        while True:
+            name = f"transcripts-{stamp}-{os.getpid()}-{next(_counter)}{SEGMENT_SUFFIX}"
+            self._segment = os.path.join(self.directory, name)
+            if not os.path.exists(self._segment):
+                break
+        self._segment_opened = time.time()
+        self._segment_size = 0
+        self._pid = os.getpid()
+
+    def _needs_rotation(self):
+        return (
+            self._segment is None
+            or self._pid != os.getpid()  # forked: the parent owns that segment
+            or self._segment_size >= self.max_segment_bytes
+            or time.time() - self._segment_opened >= self.max_segment_age
+        )
+
+    def append(self, session_id, record):
+        """Archive one transcript; returns its unique id"""
+        timestamp = datetime.utcnow().isoformat()
+        with self._lock:
+            if self._needs_rotation():
+                self._open_segment()
+            transcript_id = f"{session_id}-{timestamp}-{os.getpid()}-{next(_counter)}"
+            data = gzip.compress((json.dumps(dict(record, transcript_id=transcript_id)) + "\n").encode("utf-8"))
+
+            fd = os.open(self._segment, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            entry = {
+                "id": transcript_id,
+                "session_id": str(session_id),
+                "timestamp": timestamp,
+                "offset": self._segment_size,
+                "length": len(data),
+            }
+            self._segment_size += len(data)
+            with open(_index_path(self._segment), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+        return transcript_id
+
+    # ---------------- retention ----------------
+    def _is_closed(self, segment):
+        """True once no process will append to the segment again"""
+        if self._pid == os.getpid() and segment == self._segment:
+            return False
+        # Writers rotate by age, so a segment opened longer ago than that is
+        # rotated away from before anything else is written to it
+        opened = datetime.strptime(_SEGMENT_NAME.match(os.path.basename(segment)).group(1), '%Y%m%dT%H%M%S')
+        return (datetime.utcnow() - opened).total_seconds() >= self.max_segment_age
+
+    def expire_segments(self, cutoff, keep=None, stop=None):
+        """
+        Remove closed segments (and their indexes) last written before the
+        cutoff timestamp; keep(segment_path) runs first, e.g. to archive it
+        Returns: number of segments removed
+        """
+        expired = 0
+        for segment in self.segments():
+            if stop is not None and stop():
+                break
+            index_path = _index_path(segment)
+            with self._lock:
+                if not self._is_closed(segment):
+                    continue
+            try:
+                written = os.path.getmtime(segment)
+                if os.path.exists(index_path):
+                    written = max(written, os.path.getmtime(index_path))
+                if written >= cutoff:
+                    continue
+                # Claim it: every worker's janitor may be sweeping, and only
+                # the one whose rename succeeds keeps and removes it
+                claimed = segment + ".expiring"
+                os.rename(segment, claimed)
+            except FileNotFoundError:
+                continue  # expired by another process meanwhile
+            if keep is not None:
+                try:
+                    keep(claimed)
+                except Exception:
+                    os.rename(claimed, segment)  # leave it for the next sweep
+                    raise
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            os.remove(claimed)
+            with self._lock:
+                self._forget(index_path)
+            expired += 1
+        return expired
+
+    def _forget(self, index_path):
+        """Drop what was read from a segment's index (lock held)"""
+        if self._index_offsets.pop(index_path, None) is None:
+            return
+        segment = os.path.basename(index_path)[:-len(INDEX_SUFFIX)] + SEGMENT_SUFFIX
+        gone = [i for i, entry in self._by_id.items() if entry["segment"] == segment]
+        for transcript_id in gone:
+            entry = self._by_id.pop(transcript_id)
+            ids = self._by_session.get(entry["session_id"])
+            if ids is not None:
+                ids.remove(transcript_id)
+                if not ids:
+                    del self._by_session[entry["session_id"]]
+
+    # ---------------- reading ----------------
+    def segments(self):
+        """Segment paths, oldest first"""
+        names = [n for n in os.listdir(self.directory) if _SEGMENT_NAME.match(n)]
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    def _refresh_index(self):
+        """Read index lines appended since the last refresh (by any process)"""
+        segments = self.segments()
+        # Segments expired since the last refresh (possibly by another process)
+        current = {_index_path(segment) for segment in segments}
+        for index_path in [p for p in self._index_offsets if p not in current]:
+            self._forget(index_path)
+        for segment in segments:
+            index_path = _index_path(segment)
+            offset = self._index_offsets.get(index_path, 0)
+            try:
+                with open(index_path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entry["segment"] = os.path.basename(segment)
+                self._by_id[entry["id"]] = entry
+                self._by_session.setdefault(entry["session_id"], []).append(entry["id"])
+            self._index_offsets[index_path] = offset + end
+
+    def _read(self, entry):
+        """The record an index entry points at, or None if its segment has expired"""
+        try:
+            with open(os.path.join(self.directory, entry["segment"]), 'rb') as f:
+                f.seek(entry["offset"])
+                return json.loads(gzip.decompress(f.read(entry["length"])))
+        except FileNotFoundError:
+            return None
+
+    def get(self, transcript_id):
+        """One transcript by id (a seek and a single-member decompress)"""
+        with self._lock:
+            entry = self._by_id.get(transcript_id)
+            if entry is None:
+                self._refresh_index()
+                entry = self._by_id.get(transcript_id)
+        return self._read(entry) if entry else None
+
+    def find(self, session_id):
+        """Every transcript archived for a session, oldest first"""
+        with self._lock:
+            self._refresh_index()
+            entries = [self._by_id[i] for i in self._by_session.get(str(session_id), [])]
+        records = [self._read(entry) for entry in entries]
+        return [record for record in records if record is not None]
+
+    def iter_records(self):
+        """Stream every transcript, segment by segment, for bulk analysis"""
+        for segment in self.segments():
+            try:
+                with gzip.open(segment, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+            except FileNotFoundError:
+                continue  # expired meanwhile
+            except (OSError, EOFError) as e:
+                # The newest segment may end in a record still being written
+                print(f"[transcript_archive] Stopped reading {segment}: {e}")
+
+
+def _index_path(segment):
+    return segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX